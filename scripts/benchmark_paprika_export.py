@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Compare the Paprika serializer with the former Jinja template renderer.
+
+Renders the example recipe from the test fixtures many times with a synthetic
+cover photo and prints the time per recipe for both implementations. The old
+renderer is kept here verbatim so the numbers can be reproduced:
+
+    uv run python scripts/benchmark_paprika_export.py --recipes 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import os
+import re
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from jinja2 import Template
+
+from kptncook.exporter_utils import get_step_text
+from kptncook.image_cache import ImageCache
+from kptncook.models import Recipe, localized_fallback
+from kptncook.paprika import GeneratedData, PaprikaExporter
+
+FIXTURE = Path(__file__).parent.parent / "tests" / "fixtures" / "kptncook_example.json"
+
+LEGACY_TEMPLATE = """{
+   "uid":"{{recipe.id.oid}}",
+   "name":"{{localized_fallback(recipe.localized_title)|default('',true)}}",
+   "directions": "{% for step in recipe.steps %}{{get_step_text(step)|default('',true)}}\\n{% endfor %}",
+   "servings":"2",
+   "rating":0,
+   "difficulty":"",
+   "ingredients":"{{ingredients_text}}",
+   "notes":"",
+   "created":"{{dtnow}}",
+   "image_url":null,
+   "cook_time":"{{recipe.cooking_time|default('',true)}}",
+   "prep_time":"{{recipe.preparation_time|default('',true)}}",
+   "source":"Kptncook",
+   "source_url":"",
+   "hash" : "{{hash}}",
+   "photo_hash":null,
+   "photos":[],
+   "photo": "{{cover_filename}}",
+   "nutritional_info":"{% for nutrient, amount in recipe.recipe_nutrition %}{{nutrient}}: {{amount}}\\n{% endfor %}",
+   "photo_data":"{{cover_img}}",
+   "photo_large":null,
+   "categories":["Kptncook"]
+}
+"""
+LEGACY_CONTROL_CHARS = re.compile(r"[\x00-\x08\x0B-\x0C\x0E-\x1F\x7F-\x9F]")
+LEGACY_UNESCAPED_NEWLINE = re.compile(r"(?<!\\)\n")
+
+
+def render_legacy(
+    template: Template, recipe: Recipe, generated: GeneratedData, ingredients: str
+) -> str:
+    recipe_as_json = template.render(
+        recipe=recipe,
+        localized_fallback=localized_fallback,
+        get_step_text=get_step_text,
+        dtnow=generated.dtnow,
+        cover_filename=generated.cover_filename,
+        hash=generated.hash,
+        cover_img=generated.cover_img,
+        ingredients_text=ingredients,
+    )
+    recipe_as_json = LEGACY_CONTROL_CHARS.sub("", recipe_as_json)
+    recipe_as_json = LEGACY_UNESCAPED_NEWLINE.sub(" ", recipe_as_json)
+    json.loads(recipe_as_json)
+    return recipe_as_json
+
+
+def time_per_recipe(render, count: int, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(count):
+            render()
+        timings.append((time.perf_counter() - started) / count)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipes", type=int, default=2000)
+    parser.add_argument("--photo-kib", type=int, default=150)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    recipe = Recipe.model_validate(json.loads(FIXTURE.read_text(encoding="utf-8")))
+    photo = base64.b64encode(os.urandom(args.photo_kib * 1024)).decode("ascii")
+    generated = GeneratedData("cover.jpg", photo, "2026-01-01 12:00:00", "0" * 64)
+    with tempfile.TemporaryDirectory() as home:
+        # Ingredient grouping reads the settings; keep them away from ~/.kptncook.
+        os.environ["KPTNCOOK_HOME"] = home
+        os.environ.setdefault("KPTNCOOK_API_KEY", "benchmark")
+        exporter = PaprikaExporter(
+            image_cache=ImageCache(Path(home), max_size=0, max_age=0)
+        )
+        # The old template expected ingredient lines joined by a JSON escape.
+        ingredients = exporter.get_ingredients_text(recipe.ingredients).replace(
+            "\n", "\\n"
+        )
+        template = Template(LEGACY_TEMPLATE, trim_blocks=True)
+
+        legacy = time_per_recipe(
+            lambda: render_legacy(template, recipe, generated, ingredients),
+            args.recipes,
+            args.repeat,
+        )
+        current = time_per_recipe(
+            lambda: exporter.get_recipe_as_json_string(recipe, generated),
+            args.recipes,
+            args.repeat,
+        )
+
+    print(f"{args.recipes} recipes, {args.photo_kib} KiB photo each")
+    print(f"jinja template + reparse: {legacy * 1e6:9.1f} µs/recipe")
+    print(f"json.dumps serializer:    {current * 1e6:9.1f} µs/recipe")
+    print(f"speedup:                  {legacy / current:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
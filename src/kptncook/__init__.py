@@ -9,7 +9,6 @@ import httpx
 
 from .api import KptnCookClient, _collect_recipe_identifiers, parse_id
 from .cli import (
-    OptionalId,
     app as cli,
     backup_kptncook_favorites,
     delete_recipes,
@@ -55,7 +54,6 @@ __all__ = [
     "__version__",
     "KptnCookClient",
     "MealieApiClient",
-    "OptionalId",
     "_collect_recipe_identifiers",
     "_extract_ingredient_name",
     "_extract_mealie_detail_message",
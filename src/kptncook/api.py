@@ -11,6 +11,7 @@ from .http_client import BaseHttpClient, DEFAULT_REQUEST_TIMEOUT
 from .repositories import RecipeInDb
 
 RECIPE_RESOLUTION_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+RECIPE_RESOLUTION_CHUNK_SIZE = 100
 
 RecipeIdentifier = tuple[Literal["oid", "uid"], str]
 
@@ -296,9 +297,14 @@ class KptnCookClient(BaseHttpClient):
         """
         return self.resolve_recipe_summaries(ids)
 
-    def resolve_recipe_summaries(self, items: Sequence[object]) -> list[RecipeInDb]:
+    def resolve_recipe_summaries(
+        self, items: Sequence[object], *, chunk_size: int | None = None
+    ) -> list[RecipeInDb]:
         """
         Resolve recipe summary payloads or identifiers into full recipes.
+
+        With ``chunk_size`` the identifiers are posted in batches of at most
+        that many entries, which keeps request bodies bounded for large crawls.
         """
         identifiers = _collect_recipe_identifiers(items)
         if not identifiers:
@@ -306,17 +312,19 @@ class KptnCookClient(BaseHttpClient):
         payload = ids_to_payload(identifiers)
         if not payload:
             return []
-        response = self.post(
-            f"/recipes/search?kptnkey={self.api_key}",
-            json=payload,
-            # Favorites backup can resolve large batches, so allow a longer read timeout
-            # without leaving the CLI hanging indefinitely.
-            timeout=RECIPE_RESOLUTION_TIMEOUT,
-        )
-        response.raise_for_status()
-        results = response.json()
-        if results is None:
-            results = []
+        if chunk_size is None or chunk_size <= 0:
+            chunk_size = len(payload)
+        results: list[dict] = []
+        for start in range(0, len(payload), chunk_size):
+            response = self.post(
+                f"/recipes/search?kptnkey={self.api_key}",
+                json=payload[start : start + chunk_size],
+                # Favorites backup can resolve large batches, so allow a longer read
+                # timeout without leaving the CLI hanging indefinitely.
+                timeout=RECIPE_RESOLUTION_TIMEOUT,
+            )
+            response.raise_for_status()
+            results.extend(response.json() or [])
         return [RecipeInDb(date=date.today(), data=data) for data in results]
 
     def get_discovery_screen(
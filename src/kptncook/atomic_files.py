@@ -0,0 +1,62 @@
+"""
+Replace files atomically.
+
+Output is written to a temporary file next to its destination and renamed into
+place, so readers never see a half-written file and an interrupted write leaves
+the previous one untouched. The temporary file is created like any other new
+file, with the permissions the umask allows, rather than the owner-only mode
+``tempfile`` uses, so a replaced file ends up readable the way it would be if it
+had been written directly.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import os
+import secrets
+from collections.abc import Iterator
+from pathlib import Path
+
+
+def create_temporary_file(path: Path) -> Path:
+    """
+    Create an empty temporary file next to ``path`` and return its path.
+    """
+    temp_path = path.with_name(f".{path.name}.{secrets.token_hex(8)}.tmp")
+    # Mode 0o666 is narrowed by the umask, like open(path, "w") would do.
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    os.close(fd)
+    return temp_path
+
+
+@contextlib.contextmanager
+def replacing(path: Path) -> Iterator[Path]:
+    """
+    Yield a temporary path to write to and rename it to ``path`` afterwards.
+
+    Nothing is replaced if the block raises, or if it removed the temporary
+    file to keep the existing one.
+    """
+    temp_path = create_temporary_file(path)
+    try:
+        yield temp_path
+        if temp_path.exists():
+            os.replace(temp_path, path)
+    finally:
+        with contextlib.suppress(OSError):
+            temp_path.unlink(missing_ok=True)
+
+
+def write_atomically(path: Path, content: bytes | str, *, fsync: bool = False) -> None:
+    """
+    Write ``content`` next to ``path`` and rename it into place.
+
+    With ``fsync`` the content is flushed to disk before the rename.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    with replacing(path) as temp_path, temp_path.open("wb") as f:
+        f.write(content)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
@@ -0,0 +1,279 @@
+"""
+Record and replay HTTP traffic.
+
+A cassette is a directory with an ``interactions.jsonl`` index (one line per
+request/response pair) and a ``bodies`` folder holding gzip-compressed
+response bodies named by their SHA-256 digest, so identical payloads (for
+example the same image requested twice) are only stored once.
+
+Requests are matched on method and normalized URL: the ``kptnkey`` query
+parameter is dropped (it is never written to disk), the remaining parameters
+are sorted and timestamp path segments (as used for today's recipes) are
+replaced with a placeholder. Among matching interactions the one with the same
+request body is preferred, otherwise they are served in recorded order. Once
+all matching interactions have been used, the last one is repeated.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Literal
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+
+INTERACTIONS_FILENAME = "interactions.jsonl"
+BODIES_DIRNAME = "bodies"
+REDACTED_QUERY_PARAMS = {"kptnkey"}
+RECORDED_RESPONSE_HEADERS = ("content-type", "location", "etag", "last-modified")
+_TIMESTAMP_SEGMENT = re.compile(r"^\d{9,}(\.\d+)?$")
+
+CassetteMode = Literal["record", "replay"]
+
+
+class CassetteError(Exception):
+    """Raised when a cassette directory cannot be read or written."""
+
+
+class CassetteMissError(httpx.TransportError):
+    """Raised in replay mode when no recorded response matches a request."""
+
+
+def normalize_url(url: httpx.URL | str) -> str:
+    parts = urlsplit(str(url))
+    path = "/".join(
+        "{timestamp}" if _TIMESTAMP_SEGMENT.match(segment) else segment
+        for segment in parts.path.split("/")
+    )
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in REDACTED_QUERY_PARAMS
+    )
+    return urlunsplit((parts.scheme, parts.netloc, path, urlencode(query), ""))
+
+
+def _request_body_digest(request: httpx.Request) -> str | None:
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/"):
+        # Multipart boundaries are random, so the body never matches on replay.
+        return None
+    content = request.read()
+    if not content:
+        return None
+    return hashlib.sha256(content).hexdigest()
+
+
+@dataclass
+class Interaction:
+    method: str
+    url: str
+    request_digest: str | None
+    status_code: int
+    headers: dict[str, str]
+    body_digest: str
+    used: bool = False
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "method": self.method,
+                "url": self.url,
+                "request_digest": self.request_digest,
+                "status_code": self.status_code,
+                "headers": self.headers,
+                "body": self.body_digest,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, line: str) -> Interaction:
+        data = json.loads(line)
+        return cls(
+            method=data["method"],
+            url=data["url"],
+            request_digest=data.get("request_digest"),
+            status_code=data["status_code"],
+            headers=data.get("headers") or {},
+            body_digest=data["body"],
+        )
+
+
+class Cassette:
+    def __init__(self, path: Path, mode: CassetteMode) -> None:
+        self.path = Path(path)
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._interactions: list[Interaction] = []
+        if mode == "record":
+            self._start_recording()
+        else:
+            self._load()
+
+    @property
+    def interactions_path(self) -> Path:
+        return self.path / INTERACTIONS_FILENAME
+
+    @property
+    def bodies_path(self) -> Path:
+        return self.path / BODIES_DIRNAME
+
+    def __len__(self) -> int:
+        return len(self._interactions)
+
+    def _start_recording(self) -> None:
+        try:
+            self.bodies_path.mkdir(parents=True, exist_ok=True)
+            self.interactions_path.write_text("", encoding="utf-8")
+        except OSError as exc:
+            raise CassetteError(
+                f"Could not create cassette {self.path}: {exc}"
+            ) from exc
+
+    def _load(self) -> None:
+        try:
+            lines = self.interactions_path.read_text(encoding="utf-8").splitlines()
+        except OSError as exc:
+            raise CassetteError(f"Could not read cassette {self.path}: {exc}") from exc
+        try:
+            self._interactions = [
+                Interaction.from_json(line) for line in lines if line.strip()
+            ]
+        except (ValueError, KeyError) as exc:
+            raise CassetteError(
+                f"Cassette {self.interactions_path} contains invalid data: {exc}"
+            ) from exc
+
+    def _body_path(self, digest: str) -> Path:
+        return self.bodies_path / f"{digest}.gz"
+
+    def record(self, request: httpx.Request, response: httpx.Response) -> None:
+        body = response.content
+        body_digest = hashlib.sha256(body).hexdigest()
+        interaction = Interaction(
+            method=request.method,
+            url=normalize_url(request.url),
+            request_digest=_request_body_digest(request),
+            status_code=response.status_code,
+            headers={
+                name: response.headers[name]
+                for name in RECORDED_RESPONSE_HEADERS
+                if name in response.headers
+            },
+            body_digest=body_digest,
+        )
+        body_path = self._body_path(body_digest)
+        with self._lock:
+            try:
+                if not body_path.exists():
+                    body_path.write_bytes(gzip.compress(body, mtime=0))
+                with self.interactions_path.open("a", encoding="utf-8") as f:
+                    f.write(interaction.to_json() + "\n")
+            except OSError as exc:
+                raise CassetteError(
+                    f"Could not write cassette {self.path}: {exc}"
+                ) from exc
+            self._interactions.append(interaction)
+
+    def _find(self, request: httpx.Request) -> Interaction | None:
+        url = normalize_url(request.url)
+        candidates = [
+            interaction
+            for interaction in self._interactions
+            if interaction.method == request.method and interaction.url == url
+        ]
+        if not candidates:
+            return None
+        unused = [interaction for interaction in candidates if not interaction.used]
+        if not unused:
+            return candidates[-1]
+        digest = _request_body_digest(request)
+        for interaction in unused:
+            if digest is not None and interaction.request_digest == digest:
+                return interaction
+        return unused[0]
+
+    def play(self, request: httpx.Request) -> httpx.Response:
+        with self._lock:
+            interaction = self._find(request)
+            if interaction is None:
+                raise CassetteMissError(
+                    f"No recorded response for {request.method} "
+                    f"{normalize_url(request.url)} in cassette {self.path}",
+                    request=request,
+                )
+            interaction.used = True
+        try:
+            body = gzip.decompress(
+                self._body_path(interaction.body_digest).read_bytes()
+            )
+        except OSError as exc:
+            raise CassetteMissError(
+                f"Cassette {self.path} is missing body {interaction.body_digest}",
+                request=request,
+            ) from exc
+        return httpx.Response(
+            interaction.status_code,
+            headers=interaction.headers,
+            content=body,
+            request=request,
+        )
+
+
+class RecordingTransport(httpx.BaseTransport):
+    def __init__(
+        self, cassette: Cassette, transport: httpx.BaseTransport | None = None
+    ) -> None:
+        self.cassette = cassette
+        self._transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        # Read the request body up front: the inner transport consumes streams.
+        if not request.headers.get("content-type", "").startswith("multipart/"):
+            request.read()
+        response = self._transport.handle_request(request)
+        try:
+            response.read()
+        finally:
+            response.close()
+        self.cassette.record(request, response)
+        # The body was already decoded, so drop headers describing the wire format.
+        headers = [
+            (name, value)
+            for name, value in response.headers.multi_items()
+            if name.lower()
+            not in ("content-encoding", "content-length", "transfer-encoding")
+        ]
+        return httpx.Response(
+            response.status_code,
+            headers=headers,
+            content=response.content,
+            request=request,
+            extensions=response.extensions,
+        )
+
+    def close(self) -> None:
+        # The transport is shared by every client of a CLI run, so a single
+        # client closing must not tear down the connection pool for the others.
+        pass
+
+
+class ReplayTransport(httpx.BaseTransport):
+    def __init__(self, cassette: Cassette) -> None:
+        self.cassette = cassette
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self.cassette.play(request)
+
+
+def cassette_transport(path: Path, mode: CassetteMode) -> httpx.BaseTransport:
+    cassette = Cassette(path, mode)
+    if mode == "record":
+        return RecordingTransport(cassette)
+    return ReplayTransport(cassette)
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import signal
 import sys
+import threading
 from collections.abc import Callable
-from typing import NoReturn, Optional, ParamSpec, TypeVar
+from pathlib import Path
+from typing import NoReturn, ParamSpec, TypeVar
 
 import click
 import typer
@@ -10,8 +13,19 @@ from rich import print as rprint
 from rich.pretty import pprint
 from typer.main import get_command
 
-from kptncook.config import SettingsError, render_settings_error
+from kptncook.cassette import CassetteError, cassette_transport
+from kptncook.config import SettingsError, get_settings, render_settings_error
+from kptncook.daemon import (
+    STATUS_FILENAME as DAEMON_STATUS_FILENAME,
+    DaemonConfigError,
+    DaemonScheduler,
+    WarmResources,
+    parse_daemon_jobs,
+    read_daemon_status,
+)
 from kptncook.env import ENV_PATH, upsert_env_value
+from kptncook.fake_api import DEFAULT_HOST, DEFAULT_PORT, FakeApiConfig, serve_fake_api
+from kptncook.http_client import set_default_transport
 from kptncook.models import localized_fallback
 from kptncook.services.repository import InvalidStoredRecipe
 from kptncook.services.discovery import (
@@ -26,12 +40,22 @@ from kptncook.services.discovery import (
 from kptncook.services.repository import save_recipe_entries
 from kptncook.services.workflows import (
     UserFacingError,
+    DISCOVERY_CRAWL_CONCURRENCY,
+    MEALIE_PURGE_CONCURRENCY,
+    MEALIE_PURGE_RATE,
+    SHARE_URL_CONCURRENCY,
+    MarkdownExportResult,
+    PaprikaExportResult,
+    TandoorExportResult,
     backup_kptncook_favorites as backup_kptncook_favorites_workflow,
+    bulk_import_to_mealie_result as bulk_import_to_mealie_workflow,
+    crawl_discovery_lists,
     delete_recipes_by_selection,
     delete_repository_recipes,
     export_recipes_to_markdown_result as export_recipes_to_markdown_workflow,
     export_recipes_to_paprika_result as export_recipes_to_paprika_workflow,
     export_recipes_to_tandoor_result as export_recipes_to_tandoor_workflow,
+    export_recipes_to_targets,
     get_discovery_list_recipes,
     get_discovery_screen,
     get_kptncook_access_token as get_kptncook_access_token_workflow,
@@ -41,8 +65,11 @@ from kptncook.services.workflows import (
     load_kptncook_recipes_from_repository,
     list_dailies as list_dailies_workflow,
     list_popular_ingredients as list_popular_ingredients_workflow,
+    parse_export_targets,
+    purge_mealie_recipes,
     save_todays_recipes as save_todays_recipes_workflow,
     search_recipe_by_id as search_recipe_by_id_workflow,
+    search_recipes_by_ids as search_recipes_by_ids_workflow,
     sync_with_mealie_result as sync_with_mealie_workflow,
 )
 from kptncook.setup import setup as setup_command
@@ -72,6 +99,40 @@ def _run_or_exit(func: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
         _exit_with_error(str(exc))
 
 
+@app.callback()
+def main(
+    ctx: typer.Context,
+    record: Path | None = typer.Option(
+        None,
+        "--record",
+        file_okay=False,
+        help="Record all HTTP traffic of this run into a cassette directory.",
+    ),
+    replay: Path | None = typer.Option(
+        None,
+        "--replay",
+        file_okay=False,
+        help="Serve HTTP traffic from a recorded cassette instead of the network.",
+    ),
+):
+    """
+    kptncook is a little command line utility to download new recipes.
+    """
+    if record is not None and replay is not None:
+        raise typer.BadParameter("--record and --replay cannot be combined")
+    try:
+        if record is not None:
+            transport = cassette_transport(record, "record")
+        elif replay is not None:
+            transport = cassette_transport(replay, "replay")
+        else:
+            return
+    except CassetteError as exc:
+        _exit_with_error(str(exc))
+    set_default_transport(transport)
+    ctx.call_on_close(lambda: set_default_transport(None))
+
+
 def _print_repository_warnings(invalid_entries: list[InvalidStoredRecipe]) -> None:
     if not invalid_entries:
         return
@@ -85,6 +146,15 @@ def _print_repository_warnings(invalid_entries: list[InvalidStoredRecipe]) -> No
         rprint(f"[yellow]- {label}: {entry.reason}[/yellow]")
 
 
+def _print_export_counts(
+    result: PaprikaExportResult | TandoorExportResult | MarkdownExportResult,
+) -> None:
+    rprint(
+        f"Written: {result.written}, unchanged: {result.skipped}, "
+        f"removed: {result.removed}"
+    )
+
+
 @app.command(name="help")
 def help_command(
     command: str | None = typer.Argument(
@@ -190,13 +260,80 @@ def list_kptncook_dailies(
 
 
 @app.command(name="sync-with-mealie")
-def sync_with_mealie():
+def sync_with_mealie(
+    bulk: bool = typer.Option(
+        False,
+        "--bulk",
+        help=(
+            "Import missing recipes with one migration archive upload "
+            "(fast initial load; step images follow on the next sync)."
+        ),
+    ),
+):
     """
     Sync locally saved recipes with mealie.
     """
-    result = _run_or_exit(sync_with_mealie_workflow)
+    workflow = bulk_import_to_mealie_workflow if bulk else sync_with_mealie_workflow
+    result = _run_or_exit(workflow)
     _print_repository_warnings(result.invalid_repository_entries)
     rprint(f"Created {result.created_count} recipes")
+    if result.updated_count:
+        rprint(f"Updated {result.updated_count} recipes")
+
+
+@app.command(name="mealie-purge")
+def mealie_purge(
+    dry_run: bool = typer.Option(
+        False, "--dry-run", help="Only list the recipes that would be deleted."
+    ),
+    orphans: bool = typer.Option(
+        False,
+        "--orphans",
+        help="Also delete units, foods and tags of kptncook recipes no recipe uses.",
+    ),
+    concurrency: int = typer.Option(
+        MEALIE_PURGE_CONCURRENCY,
+        "--concurrency",
+        "-c",
+        min=1,
+        help="Number of recipes deleted at the same time.",
+    ),
+    rate: float = typer.Option(
+        MEALIE_PURGE_RATE,
+        "--rate",
+        min=0,
+        help="Maximum delete requests per second (0 for no limit).",
+    ),
+    force: bool = typer.Option(False, "--force", "-f", help="Skip confirmation."),
+):
+    """
+    Delete all recipes kptncook created in Mealie.
+    """
+    listing = _run_or_exit(purge_mealie_recipes, dry_run=True)
+    if not listing.slugs:
+        rprint("No kptncook recipes found in Mealie, nothing to purge.")
+        return
+    rprint("Recipes to delete:")
+    for slug in listing.slugs:
+        rprint(f"- {slug}")
+    if dry_run:
+        return
+    if not force and not typer.confirm("Delete these recipes from Mealie?"):
+        _exit_with_error("Aborted.")
+
+    # Delete what was confirmed, not whatever is tagged by now.
+    result = _run_or_exit(
+        purge_mealie_recipes,
+        delete_orphans=orphans,
+        concurrency=concurrency,
+        rate=rate,
+        slugs=listing.slugs,
+    )
+    rprint(f"Deleted {len(result.deleted)} recipes.")
+    if result.failed:
+        rprint("[yellow]Could not delete: " + ", ".join(result.failed) + "[/yellow]")
+    for kind, count in result.deleted_items.items():
+        rprint(f"Deleted {count} unused {kind}.")
 
 
 @app.command(name="sync")
@@ -206,7 +343,7 @@ def sync():
     afterwards.
     """
     save_todays_recipes()
-    sync_with_mealie()
+    sync_with_mealie(bulk=False)
 
 
 @app.command(name="backup-favorites")
@@ -333,6 +470,31 @@ def list_discovery_list(
         pprint(recipe)
 
 
+@app.command(name="crawl-discovery")
+def crawl_discovery(
+    concurrency: int = typer.Option(
+        DISCOVERY_CRAWL_CONCURRENCY,
+        "--concurrency",
+        "-c",
+        min=1,
+        help="Number of discovery lists fetched in parallel.",
+    ),
+):
+    """
+    Save the recipes of all discovery lists to the local repository.
+    """
+    result = _run_or_exit(crawl_discovery_lists, concurrency=concurrency)
+    for label in result.skipped_lists:
+        rprint(f"[yellow]Skipped discovery list without id: {label}[/yellow]")
+    for label in result.failed_lists:
+        rprint(f"[yellow]Failed to fetch discovery list: {label}[/yellow]")
+    rprint(
+        f"Crawled {len(result.crawled_lists)} discovery lists with "
+        f"{result.identifier_count} unique recipes"
+    )
+    rprint(f"Added {result.saved_count} recipes to local repository")
+
+
 @app.command(name="ingredients-popular")
 def list_popular_ingredients():
     """
@@ -481,26 +643,64 @@ def delete_recipes(
     rprint(f"Deleted {len(deleted)} recipes.")
 
 
+def _read_ids(from_file: str) -> list[str]:
+    try:
+        if from_file == "-":
+            lines = sys.stdin.read().splitlines()
+        else:
+            lines = Path(from_file).read_text(encoding="utf-8").splitlines()
+    except OSError as exc:
+        _exit_with_error(f"Could not read ids from {from_file}: {exc}")
+    return [line for line in lines if not line.lstrip().startswith("#")]
+
+
 @app.command(name="search-by-id")
-def search_kptncook_recipe_by_id(id_: str):
+def search_kptncook_recipe_by_id(
+    id_: str | None = typer.Argument(None, metavar="ID"),
+    from_file: str | None = typer.Option(
+        None,
+        "--from-file",
+        "-f",
+        help="Read ids or share URLs line by line from a file ('-' for stdin).",
+    ),
+    concurrency: int = typer.Option(
+        SHARE_URL_CONCURRENCY,
+        "--concurrency",
+        min=1,
+        help="Share URLs resolved in parallel.",
+    ),
+):
     """
     Search for a recipe by id in kptncook api and add it to the local repository.
     """
-    result = _run_or_exit(search_recipe_by_id_workflow, id_)
-    rprint(result.id_type, result.id_value)
-    rprint(f"Added recipe {result.id_type} {result.id_value} to local repository")
-
+    if from_file is None:
+        if id_ is None:
+            raise typer.BadParameter("Pass an id or --from-file")
+        result = _run_or_exit(search_recipe_by_id_workflow, id_)
+        rprint(result.id_type, result.id_value)
+        rprint(f"Added recipe {result.id_type} {result.id_value} to local repository")
+        return
+    if id_ is not None:
+        raise typer.BadParameter("Pass either an id or --from-file, not both")
 
-OptionalId = Optional[str]
+    bulk = _run_or_exit(
+        search_recipes_by_ids_workflow, _read_ids(from_file), concurrency=concurrency
+    )
+    for id_value, reason in bulk.invalid:
+        rprint(f"[yellow]Skipped {id_value}: {reason}[/yellow]")
+    for id_value in bulk.not_found:
+        rprint(f"[yellow]Could not find recipe {id_value}[/yellow]")
+    rprint(f"Added {bulk.saved_count} recipes to local repository")
 
 
 @app.command(name="export-recipes-to-paprika")
-def export_recipes_to_paprika(_id: OptionalId = typer.Argument(None)):
+def export_recipes_to_paprika(_id: str | None = typer.Argument(None)):
     """
     Export one recipe or all recipes to Paprika app.
     """
     result = _run_or_exit(export_recipes_to_paprika_workflow, _id)
     _print_repository_warnings(result.invalid_repository_entries)
+    _print_export_counts(result)
     rprint(
         "\n The data was exported to '%s'. Open the export file with the Paprika App.\n"
         % result.filename
@@ -508,26 +708,182 @@ def export_recipes_to_paprika(_id: OptionalId = typer.Argument(None)):
 
 
 @app.command(name="export-recipes-to-tandoor")
-def export_recipes_to_tandoor(_id: OptionalId = typer.Argument(None)):
+def export_recipes_to_tandoor(
+    _id: str | None = typer.Argument(None),
+    single_archive: bool = typer.Option(
+        False,
+        "--single-archive",
+        help="Write one archive of all recipes for Tandoor's bulk import.",
+    ),
+    prune: bool = typer.Option(
+        False,
+        "--prune",
+        help="Delete exported zips of recipes no longer in the repository.",
+    ),
+):
     """
     Export one recipe or all recipes to Tandoor.
     """
-    result = _run_or_exit(export_recipes_to_tandoor_workflow, _id)
+    if prune and _id is not None:
+        raise typer.BadParameter("--prune exports all recipes and takes no id")
+    if prune and single_archive:
+        raise typer.BadParameter("--prune and --single-archive cannot be combined")
+    result = _run_or_exit(
+        export_recipes_to_tandoor_workflow,
+        _id,
+        single_archive=single_archive,
+        prune=prune,
+    )
     _print_repository_warnings(result.invalid_repository_entries)
+    _print_export_counts(result)
     rprint(
         "\n The data was exported to '%s'. Open the export file with Tandoor.\n"
         % ", ".join(result.filenames)
     )
 
 
+@app.command(name="fake-api")
+def run_fake_api(
+    host: str = typer.Option(DEFAULT_HOST, "--host", help="Interface to bind to."),
+    port: int = typer.Option(DEFAULT_PORT, "--port", "-p", help="Port to bind to."),
+    catalog_size: int = typer.Option(
+        500, "--catalog-size", "-n", min=1, help="Number of synthetic recipes."
+    ),
+    latency: float = typer.Option(
+        0.0, "--latency", min=0.0, help="Delay in seconds added to every response."
+    ),
+    jitter: float = typer.Option(
+        0.0, "--jitter", min=0.0, help="Random extra delay of up to this many seconds."
+    ),
+    error_rate: float = typer.Option(
+        0.0,
+        "--error-rate",
+        min=0.0,
+        max=1.0,
+        help="Share of requests answered with HTTP 503 (0.0 - 1.0).",
+    ),
+    seed: int = typer.Option(0, "--seed", help="Seed for the synthetic catalog."),
+):
+    """
+    Serve a local stand-in for the KptnCook API with synthetic recipes.
+    """
+    config = FakeApiConfig(
+        catalog_size=catalog_size,
+        latency=latency,
+        jitter=jitter,
+        error_rate=error_rate,
+        seed=seed,
+    )
+    try:
+        server = serve_fake_api(config, host=host, port=port)
+    except OSError as exc:
+        _exit_with_error(f"Could not start fake API on {host}:{port}: {exc}")
+    rprint(f"Serving fake KptnCook API with {catalog_size} recipes on {server.url}")
+    rprint(f"Use it with: KPTNCOOK_API_URL={server.url} kptncook <command>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+@app.command(name="daemon")
+def run_daemon(
+    status: bool = typer.Option(
+        False, "--status", help="Print the status file of the daemon and exit."
+    ),
+):
+    """
+    Run jobs from KPTNCOOK_DAEMON_JOBS on their schedules until stopped.
+    """
+    current_settings = _run_or_exit(get_settings)
+    status_path = current_settings.root / DAEMON_STATUS_FILENAME
+    if status:
+        data = read_daemon_status(status_path)
+        if data is None:
+            _exit_with_error(f"No daemon status found at {status_path}")
+        for name, job in data.get("jobs", {}).items():
+            rprint(
+                f"- {name} | {job.get('schedule')} | last: "
+                f"{job.get('last_status') or '-'} "
+                f"({job.get('last_duration') or 0:.1f}s) | "
+                f"next: {job.get('next_run') or '-'}"
+            )
+        return
+
+    if not current_settings.kptncook_daemon_jobs:
+        _exit_with_error(
+            "Please set KPTNCOOK_DAEMON_JOBS (e.g. 'sync=0 6 * * *') in your "
+            f"environment or {ENV_PATH}"
+        )
+    try:
+        jobs = parse_daemon_jobs(
+            current_settings.kptncook_daemon_jobs,
+            default_jitter=current_settings.kptncook_daemon_jitter,
+        )
+    except DaemonConfigError as exc:
+        _exit_with_error(str(exc))
+
+    stop_event = threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda *_args: stop_event.set())
+    scheduler = DaemonScheduler(jobs, status_path=status_path)
+    rprint(f"Running {len(jobs)} jobs, status in {status_path}")
+    with WarmResources():
+        try:
+            scheduler.run(stop_event)
+        except KeyboardInterrupt:
+            scheduler.wait_for_running_jobs()
+
+
 @app.command(name="export-recipes-to-markdown")
-def export_recipes_to_markdown(_id: OptionalId = typer.Argument(None)):
+def export_recipes_to_markdown(
+    _id: str | None = typer.Argument(None),
+    prune: bool = typer.Option(
+        False,
+        "--prune",
+        help="Delete exported files of recipes no longer in the repository.",
+    ),
+):
     """
     Export one recipe or all recipes to Markdown files.
     """
-    result = _run_or_exit(export_recipes_to_markdown_workflow, _id)
+    if prune and _id is not None:
+        raise typer.BadParameter("--prune exports all recipes and takes no id")
+    result = _run_or_exit(export_recipes_to_markdown_workflow, _id, prune=prune)
     _print_repository_warnings(result.invalid_repository_entries)
+    _print_export_counts(result)
     rprint(
         "\n %d recipe(s) were exported as Markdown to:\n %s\n"
         % (len(result.filenames), "\n ".join(result.filenames))
     )
+
+
+@app.command(name="export")
+def export_recipes(
+    to: str = typer.Option(
+        ...,
+        "--to",
+        help="Comma-separated export formats: markdown, tandoor, paprika.",
+    ),
+    prune: bool = typer.Option(
+        False,
+        "--prune",
+        help="Delete exported files of recipes no longer in the repository.",
+    ),
+):
+    """
+    Export all recipes to several formats in one pass.
+    """
+    try:
+        targets = parse_export_targets(to)
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc)) from exc
+    result = _run_or_exit(export_recipes_to_targets, targets, prune=prune)
+    _print_repository_warnings(result.invalid_repository_entries)
+    for target_result in result.results:
+        rprint(
+            f"{target_result.target}: written {target_result.written}, "
+            f"unchanged {target_result.skipped}, removed {target_result.removed}"
+        )
@@ -83,6 +83,11 @@ class Settings(BaseSettings):
     mealie_username: str | None = None
     mealie_password: str | None = None
     mealie_api_token: str | None = None
+    mealie_sync_concurrency: int = Field(4, ge=1)
+    mealie_page_size: int = Field(50, ge=1)
+    mealie_upload_concurrency: int = Field(4, ge=1)
+    mealie_match_threshold: float = Field(0.85, ge=0, le=1)
+    mealie_item_aliases: Path | None = None
 
     # Password manager integration
     kptncook_username_command: str | None = None
@@ -90,6 +95,14 @@ class Settings(BaseSettings):
     kptncook_group_ingredients_by_typ: bool = False
     kptncook_ingredient_group_labels: str | None = None
 
+    # Image cache below the home directory, shared by exporters and Mealie
+    kptncook_image_cache_max_mb: int = Field(1024, ge=0)
+    kptncook_image_cache_max_age: int = Field(7 * 24 * 3600, ge=0)
+
+    # Daemon mode: "job=cron[~jitter];..." e.g. "sync=0 6 * * *~300"
+    kptncook_daemon_jobs: str | None = None
+    kptncook_daemon_jitter: int = 0
+
     @field_validator("root", mode="before")
     def root_must_exist(cls, path: str | Path | os.PathLike[str]) -> Path:
         path = Path(os.path.expandvars(os.fspath(path))).expanduser()
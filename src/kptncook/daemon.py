@@ -0,0 +1,410 @@
+"""
+Long-running scheduler for recurring jobs.
+
+``kptncook daemon`` runs jobs such as ``sync`` or ``backup-favorites`` on
+cron-like schedules from ``KPTNCOOK_DAEMON_JOBS``. Running in one process keeps
+the HTTP connection pool and the parsed repository warm between runs. The state
+of every job is written to ``daemon_status.json`` in the kptncook home.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from kptncook.atomic_files import write_atomically
+from kptncook.http_client import (
+    SharedTransport,
+    get_default_transport,
+    set_default_transport,
+)
+from kptncook.services.repository import (
+    disable_repository_cache,
+    enable_repository_cache,
+)
+from kptncook.services.workflows import (
+    backup_kptncook_favorites,
+    crawl_discovery_lists,
+    save_todays_recipes,
+    sync_with_mealie_result,
+)
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+logger = logging.getLogger(__name__)
+
+STATUS_FILENAME = "daemon_status.json"
+MAX_IDLE_SECONDS = 60.0
+
+_FIELD_RANGES = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day of month", 1, 31),
+    ("month", 1, 12),
+    ("day of week", 0, 7),
+)
+
+
+class DaemonConfigError(ValueError):
+    """Raised when the daemon job configuration cannot be parsed."""
+
+
+def _parse_cron_field(value: str, name: str, low: int, high: int) -> frozenset[int]:
+    values: set[int] = set()
+    for part in value.split(","):
+        step = 1
+        if "/" in part:
+            part, raw_step = part.split("/", 1)
+            if not raw_step.isdigit() or int(raw_step) == 0:
+                raise DaemonConfigError(f"Invalid step in {name} field: {value!r}")
+            step = int(raw_step)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            raw_start, raw_end = part.split("-", 1)
+            if not (raw_start.isdigit() and raw_end.isdigit()):
+                raise DaemonConfigError(f"Invalid range in {name} field: {value!r}")
+            start, end = int(raw_start), int(raw_end)
+        elif part.isdigit():
+            start = end = int(part)
+            if step != 1:
+                end = high
+        else:
+            raise DaemonConfigError(f"Invalid {name} field: {value!r}")
+        if start < low or end > high or start > end:
+            raise DaemonConfigError(
+                f"{name} field {value!r} is outside of {low}-{high}"
+            )
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+@dataclass(frozen=True)
+class CronSchedule:
+    """
+    Five-field cron expression (minute hour day-of-month month day-of-week).
+
+    Supports ``*``, lists, ranges and steps. As in cron, a job runs when either
+    day field matches if both are restricted, that is, neither starts with
+    ``*`` (``*/2`` counts as unrestricted). Sunday is 0 or 7.
+    """
+
+    expression: str
+    minutes: frozenset[int]
+    hours: frozenset[int]
+    days: frozenset[int]
+    months: frozenset[int]
+    weekdays: frozenset[int]
+    days_restricted: bool
+    weekdays_restricted: bool
+
+    @classmethod
+    def parse(cls, expression: str) -> CronSchedule:
+        fields = expression.split()
+        if len(fields) != 5:
+            raise DaemonConfigError(
+                f"Cron expression {expression!r} must have 5 fields"
+            )
+        minutes, hours, days, months, weekdays = (
+            _parse_cron_field(value, name, low, high)
+            for value, (name, low, high) in zip(fields, _FIELD_RANGES)
+        )
+        return cls(
+            expression=" ".join(fields),
+            minutes=minutes,
+            hours=hours,
+            days=days,
+            months=months,
+            # cron counts from Sunday, datetime.weekday() from Monday
+            weekdays=frozenset((day - 1) % 7 for day in weekdays),
+            days_restricted=not fields[2].startswith("*"),
+            weekdays_restricted=not fields[4].startswith("*"),
+        )
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_match = moment.day in self.days
+        weekday_match = moment.weekday() in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day_match or weekday_match
+        return day_match and weekday_match
+
+    def next_after(self, moment: datetime) -> datetime:
+        """
+        Return the first matching minute strictly after ``moment``.
+        """
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                year = candidate.year + candidate.month // 12
+                month = candidate.month % 12 + 1
+                candidate = candidate.replace(
+                    year=year, month=month, day=1, hour=0, minute=0
+                )
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise DaemonConfigError(f"Cron expression {self.expression!r} never matches")
+
+
+def _run_sync() -> None:
+    save_todays_recipes()
+    sync_with_mealie_result()
+
+
+JOB_ACTIONS: dict[str, Callable[[], object]] = {
+    "sync": _run_sync,
+    "save-todays-recipes": save_todays_recipes,
+    "sync-with-mealie": sync_with_mealie_result,
+    "backup-favorites": backup_kptncook_favorites,
+    "crawl-discovery": crawl_discovery_lists,
+}
+
+
+@dataclass
+class DaemonJob:
+    name: str
+    schedule: CronSchedule
+    action: Callable[[], object]
+    jitter: float = 0.0
+    next_run: float | None = None
+    running: bool = False
+    last_started: float | None = None
+    last_finished: float | None = None
+    last_duration: float | None = None
+    last_status: str | None = None
+    last_error: str | None = None
+    runs: int = 0
+    failures: int = 0
+    skipped_overlaps: int = 0
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "schedule": self.schedule.expression,
+            "jitter": self.jitter,
+            "next_run": _isoformat(self.next_run),
+            "running": self.running,
+            "last_started": _isoformat(self.last_started),
+            "last_finished": _isoformat(self.last_finished),
+            "last_duration": self.last_duration,
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped_overlaps": self.skipped_overlaps,
+        }
+
+
+def _isoformat(timestamp: float | None) -> str | None:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp).astimezone().isoformat()
+
+
+def parse_daemon_jobs(value: str, *, default_jitter: float = 0.0) -> list[DaemonJob]:
+    """
+    Parse ``name=cron[~jitter]`` entries separated by ``;`` or newlines.
+    """
+    jobs: list[DaemonJob] = []
+    seen: set[str] = set()
+    for raw_entry in value.replace("\n", ";").split(";"):
+        entry = raw_entry.strip()
+        if not entry:
+            continue
+        name, separator, spec = entry.partition("=")
+        name = name.strip()
+        if not separator:
+            raise DaemonConfigError(f"Job entry {entry!r} must look like name=cron")
+        if name not in JOB_ACTIONS:
+            available = ", ".join(sorted(JOB_ACTIONS))
+            raise DaemonConfigError(
+                f"Unknown daemon job {name!r} (available: {available})"
+            )
+        if name in seen:
+            raise DaemonConfigError(f"Daemon job {name!r} is configured twice")
+        seen.add(name)
+        expression, _, raw_jitter = spec.partition("~")
+        jitter = default_jitter
+        if raw_jitter.strip():
+            try:
+                jitter = float(raw_jitter)
+            except ValueError as exc:
+                raise DaemonConfigError(
+                    f"Invalid jitter for daemon job {name!r}: {raw_jitter!r}"
+                ) from exc
+        if jitter < 0:
+            raise DaemonConfigError(f"Jitter for daemon job {name!r} is negative")
+        jobs.append(
+            DaemonJob(
+                name=name,
+                schedule=CronSchedule.parse(expression),
+                action=JOB_ACTIONS[name],
+                jitter=jitter,
+            )
+        )
+    return jobs
+
+
+class DaemonScheduler:
+    """
+    Run jobs on their schedules; a job that is still running when it comes due
+    again is skipped instead of started twice.
+    """
+
+    def __init__(
+        self,
+        jobs: list[DaemonJob],
+        *,
+        status_path: Path,
+        clock: Callable[[], float] = time.time,
+        rng: random.Random | None = None,
+    ) -> None:
+        self.jobs = jobs
+        self.status_path = Path(status_path)
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._threads: dict[str, threading.Thread] = {}
+        self._started_at = clock()
+
+    def _schedule_next(self, job: DaemonJob, after: float) -> None:
+        due = job.schedule.next_after(datetime.fromtimestamp(after)).timestamp()
+        job.next_run = due + (self._rng.uniform(0, job.jitter) if job.jitter else 0)
+
+    def _run_job(self, job: DaemonJob) -> None:
+        started = time.monotonic()
+        status, error = "ok", None
+        try:
+            job.action()
+        except Exception as exc:  # keep the daemon alive whatever a job raises
+            logger.exception("Daemon job %s failed", job.name)
+            status, error = "error", str(exc) or type(exc).__name__
+        duration = time.monotonic() - started
+        with self._lock:
+            job.running = False
+            job.last_finished = self._clock()
+            job.last_duration = round(duration, 3)
+            job.last_status = status
+            job.last_error = error
+            job.runs += 1
+            if status == "error":
+                job.failures += 1
+            self._write_status()
+
+    def run_pending(self) -> list[str]:
+        """
+        Start every job that is due and return the names of the started jobs.
+        """
+        now = self._clock()
+        started: list[str] = []
+        with self._lock:
+            for job in self.jobs:
+                if job.next_run is None:
+                    self._schedule_next(job, now)
+                    continue
+                if job.next_run > now:
+                    continue
+                self._schedule_next(job, now)
+                if job.running:
+                    logger.warning("Skipping %s: previous run still active", job.name)
+                    job.skipped_overlaps += 1
+                    job.last_status = "skipped"
+                    continue
+                job.running = True
+                job.last_started = now
+                thread = threading.Thread(
+                    target=self._run_job,
+                    args=(job,),
+                    name=f"kptncook-daemon-{job.name}",
+                    daemon=True,
+                )
+                self._threads[job.name] = thread
+                thread.start()
+                started.append(job.name)
+            self._write_status()
+        return started
+
+    def seconds_until_next_run(self) -> float:
+        now = self._clock()
+        due = [job.next_run for job in self.jobs if job.next_run is not None]
+        if not due:
+            return 0.0
+        return min(max(0.0, min(due) - now), MAX_IDLE_SECONDS)
+
+    def run(self, stop_event: threading.Event) -> None:
+        while not stop_event.is_set():
+            self.run_pending()
+            stop_event.wait(self.seconds_until_next_run())
+        self.wait_for_running_jobs()
+
+    def wait_for_running_jobs(self, timeout: float | None = None) -> None:
+        for thread in list(self._threads.values()):
+            thread.join(timeout)
+        with self._lock:
+            self._write_status()
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "started_at": _isoformat(self._started_at),
+            "updated_at": _isoformat(self._clock()),
+            "jobs": {job.name: job.status() for job in self.jobs},
+        }
+
+    def _write_status(self) -> None:
+        payload = json.dumps(self.status(), indent=2)
+        try:
+            self.status_path.parent.mkdir(parents=True, exist_ok=True)
+            write_atomically(self.status_path, payload)
+        except OSError as exc:
+            logger.warning(
+                "Could not write daemon status %s: %s", self.status_path, exc
+            )
+
+
+def read_daemon_status(status_path: Path) -> dict[str, Any] | None:
+    try:
+        return json.loads(Path(status_path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+@dataclass
+class WarmResources:
+    """
+    Connection pool and repository cache kept alive for the daemon's lifetime.
+    """
+
+    transport: SharedTransport | None = None
+    _previous_transport: Any = field(default=None, repr=False)
+
+    def __enter__(self) -> Self:
+        enable_repository_cache()
+        self._previous_transport = get_default_transport()
+        # --record/--replay already installed a transport shared by every client.
+        if self._previous_transport is None:
+            self.transport = SharedTransport()
+            set_default_transport(self.transport)
+        return self
+
+    def __exit__(self, *_args: object) -> None:
+        disable_repository_cache()
+        if self.transport is not None:
+            set_default_transport(self._previous_transport)
+            self.transport.shutdown()
+            self.transport = None
@@ -0,0 +1,195 @@
+"""
+Manifests that let exporters skip recipes whose output did not change.
+
+Each exporter keeps a JSON manifest next to its output that maps kptncook oids
+to the file written for them, the hash of the rendered content and the time it
+was written. A recipe whose content hash and file name match the manifest, and
+whose file still exists, is not written again, so tools watching the output
+directory only see real changes. When a title changes, the file under the old
+name is removed once the new one is written. Files of recipes that are no
+longer exported are removed only when asked to (``prune``).
+
+Content hashes must leave out values that change on every run, such as the
+export date, or nothing would ever be skipped.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .atomic_files import write_atomically
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def content_hash(*parts: str | bytes | None) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        if part is None:
+            part = b""
+        elif isinstance(part, str):
+            part = part.encode("utf-8")
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") differ.
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+@dataclass
+class ManifestEntry:
+    path: str
+    content_hash: str
+    exported_at: str
+
+
+@dataclass
+class ExportReport:
+    paths: list[Path] = field(default_factory=list)
+    written: int = 0
+    skipped: int = 0
+    removed: int = 0
+
+
+class ExportManifest:
+    def __init__(
+        self, directory: Path, filename: str, *, shared_file: bool = False
+    ) -> None:
+        self.directory = Path(directory)
+        self.path = self.directory / filename
+        # Every recipe goes into the same file (an archive), so recording one
+        # recipe does not take the file away from the others.
+        self.shared_file = shared_file
+        self._lock = threading.Lock()
+        self.entries: dict[str, ManifestEntry] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as exc:
+            logger.warning("Ignoring unreadable export manifest %s: %s", self.path, exc)
+            return
+        if not isinstance(raw, dict) or raw.get("version") != MANIFEST_VERSION:
+            return
+        try:
+            self.entries = {
+                oid: ManifestEntry(**entry) for oid, entry in raw["recipes"].items()
+            }
+        except (KeyError, TypeError, AttributeError) as exc:
+            logger.warning("Ignoring invalid export manifest %s: %s", self.path, exc)
+            self.entries = {}
+
+    def _relative(self, path: Path) -> str:
+        return Path(path).relative_to(self.directory).as_posix()
+
+    def is_unchanged(self, oid: str, path: Path, content_hash: str) -> bool:
+        with self._lock:
+            entry = self.entries.get(oid)
+        return (
+            entry is not None
+            and entry.path == self._relative(path)
+            and entry.content_hash == content_hash
+            and Path(path).exists()
+        )
+
+    def record(self, oid: str, path: Path, content_hash: str) -> Path | None:
+        """
+        Record a written file and return the file previously written for ``oid``
+        if it had another name.
+
+        Unless the file is shared, a recipe recorded under the same file before
+        lost it to ``oid``, so its entry is dropped and the recipe is written
+        again next time.
+        """
+        relative = self._relative(path)
+        exported_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        with self._lock:
+            previous = self.entries.get(oid)
+            if not self.shared_file:
+                for other in [
+                    other
+                    for other, entry in self.entries.items()
+                    if entry.path == relative and other != oid
+                ]:
+                    del self.entries[other]
+            self.entries[oid] = ManifestEntry(relative, content_hash, exported_at)
+        if previous is None or previous.path == relative:
+            return None
+        return self.directory / previous.path
+
+    def forget(self, oids: set[str]) -> None:
+        with self._lock:
+            for oid in oids:
+                self.entries.pop(oid, None)
+
+    def remove_renamed(self, previous_paths: list[Path]) -> int:
+        """
+        Delete files left behind by renamed recipes and return how many.
+
+        A file is kept if another recipe was written under its name.
+        """
+        with self._lock:
+            current = {entry.path for entry in self.entries.values()}
+        removed = 0
+        for path in previous_paths:
+            if self._relative(path) not in current and _unlink(path):
+                removed += 1
+        return removed
+
+    def prune(self, exported_oids: set[str]) -> int:
+        """
+        Delete the files of recipes that were not exported this time.
+        """
+        with self._lock:
+            stale = {
+                oid: entry
+                for oid, entry in self.entries.items()
+                if oid not in exported_oids
+            }
+            for oid in stale:
+                del self.entries[oid]
+            current = {entry.path for entry in self.entries.values()}
+        removed = 0
+        for entry in stale.values():
+            if entry.path not in current and _unlink(self.directory / entry.path):
+                removed += 1
+        return removed
+
+    def save(self) -> None:
+        with self._lock:
+            payload = json.dumps(
+                {
+                    "version": MANIFEST_VERSION,
+                    "recipes": {
+                        oid: asdict(entry)
+                        for oid, entry in sorted(self.entries.items())
+                    },
+                },
+                ensure_ascii=False,
+            )
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            write_atomically(self.path, payload)
+        except OSError as exc:
+            logger.warning("Could not write export manifest %s: %s", self.path, exc)
+
+
+def _unlink(path: Path) -> bool:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        return False
+    except OSError as exc:
+        logger.warning("Could not remove stale export %s: %s", path, exc)
+        return False
+    return True
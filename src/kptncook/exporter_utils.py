@@ -1,13 +1,19 @@
 import re
 import shutil
 import zipfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from collections.abc import Iterable
+from collections.abc import Callable, Iterable, Iterator
+from typing import TypeVar
 
 from unidecode import unidecode
 
 from kptncook.models import Image, RecipeStep, StepTimer, localized_fallback
 
+T = TypeVar("T")
+R = TypeVar("R")
+
 TIMER_PLACEHOLDER = "<timer>"
 TIMER_PLACEHOLDER_PATTERN = re.compile(
     rf"{re.escape(TIMER_PLACEHOLDER)}(?P<punct>[.!?])?"
@@ -103,3 +109,28 @@ def write_zip(zip_path: Path, entries: Iterable[tuple[str, ZipContent]]) -> None
                 zip_file.write(content, arcname=arcname)
             else:
                 zip_file.writestr(arcname, content)
+
+
+def iter_prefetched(
+    items: Iterable[T], fetch: Callable[[T], R], *, concurrency: int
+) -> Iterator[tuple[T, Future[R]]]:
+    """Yield each item with a future of ``fetch(item)``, in input order.
+
+    ``fetch`` runs in a pool of ``concurrency`` threads and at most twice as many
+    items are fetched ahead of the consumer, so slow downloads overlap with the
+    processing of earlier items without holding every result in memory.
+    """
+    window: deque[tuple[T, Future[R]]] = deque()
+    with ThreadPoolExecutor(
+        max_workers=max(1, concurrency), thread_name_prefix="prefetch"
+    ) as executor:
+        try:
+            for item in items:
+                window.append((item, executor.submit(fetch, item)))
+                if len(window) >= 2 * max(1, concurrency):
+                    yield window.popleft()
+            while window:
+                yield window.popleft()
+        finally:
+            for _, future in window:
+                future.cancel()
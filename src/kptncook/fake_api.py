@@ -0,0 +1,529 @@
+"""
+A local stand-in for the KptnCook mobile API.
+
+Serves synthetic recipes shaped like the real ``/recipes/search`` payloads
+(see ``tests/fixtures/kptncook_example.json``) so workflows can be developed
+offline or load-tested by pointing ``KPTNCOOK_API_URL`` at the server:
+
+    $ kptncook fake-api --catalog-size 2000 --latency 0.05
+    $ KPTNCOOK_API_URL=http://127.0.0.1:8765 kptncook backup-favorites
+
+Latency, jitter and the share of requests answered with an HTTP 503 are
+configurable, and the catalog is generated deterministically from a seed.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+FAKE_ACCESS_TOKEN = "fake-access-token"
+
+# A 1x1 pixel JPEG, served for every image URL in the catalog.
+FAKE_IMAGE_BYTES = bytes.fromhex(
+    "ffd8ffe000104a46494600010100000100010000ffdb004300080606070605080707"
+    "070909080a0c140d0c0b0b0c1912130f141d1a1f1e1d1a1c1c20242e2720222c231c"
+    "1c2837292c30313434341f27393d38323c2e333432ffc0000b080001000101011100"
+    "ffc4001f0000010501010101010100000000000000000102030405060708090a0bff"
+    "c400b5100002010303020403050504040000017d0102030004110512213141061351"
+    "6107227114328191a1082342b1c11552d1f02433627282090a161718191a25262728"
+    "292a3435363738393a434445464748494a535455565758595a636465666768696a73"
+    "7475767778797a838485868788898a92939495969798999aa2a3a4a5a6a7a8a9aab2"
+    "b3b4b5b6b7b8b9bac2c3c4c5c6c7c8c9cad2d3d4d5d6d7d8d9dae1e2e3e4e5e6e7e8"
+    "e9eaf1f2f3f4f5f6f7f8f9faffda0008010100003f00fbd3ffd9"
+)
+
+_TITLE_PREFIXES = (
+    ("Cremige", "Creamy"),
+    ("Knusprige", "Crispy"),
+    ("Schnelle", "Quick"),
+    ("Würzige", "Spicy"),
+    ("Ofen-", "Baked"),
+    ("Sommerliche", "Summery"),
+)
+_TITLE_MAINS = (
+    ("Lachs-Pasta", "Salmon Pasta"),
+    ("Gemüsepfanne", "Vegetable Stir-Fry"),
+    ("Linsen-Curry", "Lentil Curry"),
+    ("Hähnchen-Bowl", "Chicken Bowl"),
+    ("Kartoffel-Gratin", "Potato Gratin"),
+    ("Tofu-Tacos", "Tofu Tacos"),
+    ("Ofenlachs", "Oven Salmon"),
+    ("Risotto", "Risotto"),
+)
+_TITLE_SIDES = (
+    ("mit Kräuterdip", "with Herb Dip"),
+    ("mit Feta", "with Feta"),
+    ("mit Zitronen-Joghurt", "with Lemon Yogurt"),
+    ("mit Senf-Dill-Sauce", "with Mustard-Dill Sauce"),
+    ("", ""),
+)
+# (German title, English title, typ, category, measure, quantity)
+_INGREDIENTS = (
+    ("Zwiebel", "onion", "regular", "FruitVegetables", None, 1.0),
+    ("Knoblauchzehe", "garlic clove", "regular", "FruitVegetables", None, 2.0),
+    (
+        "Lachsfilet, tiefgefroren",
+        "salmon fillet, frozen",
+        "regular",
+        "Frozen",
+        "g",
+        200.0,
+    ),
+    ("Muschelnudel, groß", "pasta shell, large", "regular", "Pasta", "g", 160.0),
+    ("Zitrone", "lemon", "regular", "FruitVegetables", None, 0.5),
+    ("Dill", "dill", "regular", "Herbs", "Bund", 0.5),
+    ("Linsen, rot", "lentils, red", "regular", "Grains", "g", 120.0),
+    ("Kokosmilch", "coconut milk", "regular", "Cans", "ml", 200.0),
+    ("Hähnchenbrustfilet", "chicken breast", "regular", "Meat", "g", 250.0),
+    ("Tofu, natur", "tofu, plain", "regular", "Refrigerated", "g", 200.0),
+    (
+        "Kartoffel, festkochend",
+        "potato, waxy",
+        "regular",
+        "FruitVegetables",
+        "g",
+        400.0,
+    ),
+    ("Feta", "feta", "regular", "Dairy", "g", 100.0),
+    ("Joghurt", "yogurt", "regular", "Dairy", "g", 150.0),
+    ("Paprika, rot", "bell pepper, red", "regular", "FruitVegetables", None, 1.0),
+    ("Olivenöl", "olive oil", "basic", "Basics", "EL", 2.0),
+    ("Salz", "salt", "basic", "Basics", None, None),
+    ("Pfeffer", "pepper", "basic", "Basics", None, None),
+    ("Senf, mittelscharf", "mustard, medium hot", "basic", "Basics", "TL", 1.0),
+)
+_TAGS = (
+    "main_dish",
+    "dinner_lunch",
+    "diet_vegetarian",
+    "diet_high_protein",
+    "main_ingredient_pasta",
+    "main_ingredient_fish",
+    "cooking_time_under_20",
+    "comfort_foot",
+    "baked",
+)
+_RTYPES = ("Fish", "Meat", "Veggie", "Vegan")
+_STEP_TEXTS = (
+    ("Zwiebel schälen und fein würfeln.", "Peel and finely dice onion."),
+    (
+        "Etwas Öl in einer Pfanne erhitzen und ca. <timer> anbraten.",
+        "Heat some oil in a pan and fry for approx. <timer>.",
+    ),
+    ("Mit Salz und Pfeffer würzen.", "Season with salt and pepper."),
+    ("Alles im Ofen ca. <timer> backen.", "Bake everything for approx. <timer>."),
+    ("Anrichten und genießen!", "Serve and enjoy!"),
+)
+
+
+@dataclass(frozen=True)
+class FakeApiConfig:
+    catalog_size: int = 500
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    seed: int = 0
+    list_count: int = 6
+    list_size: int = 20
+    dailies_count: int = 6
+    favorites_count: int = 25
+
+
+def recipe_oid(index: int) -> str:
+    return f"fa{index:022x}"
+
+
+def recipe_uid(index: int) -> str:
+    return f"f{index:07x}"
+
+
+def _ingredient_oid(position: int) -> str:
+    return f"1a{position:022x}"
+
+
+def _image_oid(index: int, position: int) -> str:
+    return f"1b{index:016x}{position:06x}"
+
+
+class FakeCatalog:
+    """
+    Deterministic synthetic recipe catalog.
+    """
+
+    def __init__(self, config: FakeApiConfig, base_url: str) -> None:
+        self.config = config
+        self.base_url = base_url.rstrip("/")
+        self._oid_to_index = {
+            recipe_oid(index): index for index in range(config.catalog_size)
+        }
+        self._uid_to_index = {
+            recipe_uid(index): index for index in range(config.catalog_size)
+        }
+
+    def _rng(self, *parts: int) -> random.Random:
+        return random.Random(":".join(str(part) for part in (self.config.seed, *parts)))
+
+    def image_url(self, index: int, position: int) -> str:
+        return f"{self.base_url}/image/{_image_oid(index, position)}"
+
+    def _image(self, index: int, position: int, name: str, type_: str | None):
+        image: dict[str, Any] = {"name": name, "url": self.image_url(index, position)}
+        if type_ is not None:
+            image["type"] = type_
+        return image
+
+    def _ingredient_details(self, position: int) -> dict[str, Any]:
+        de, en, typ, category, _, _ = _INGREDIENTS[position]
+        title = {"de": de, "en": en}
+        return {
+            "_id": {"$oid": _ingredient_oid(position)},
+            "typ": typ,
+            "localizedTitle": title,
+            "numberTitle": {"singular": title, "plural": title},
+            "uncountableTitle": title,
+            "category": category,
+        }
+
+    def recipe(self, index: int) -> dict[str, Any]:
+        rng = self._rng(index)
+        prefix = rng.choice(_TITLE_PREFIXES)
+        main = rng.choice(_TITLE_MAINS)
+        side = rng.choice(_TITLE_SIDES)
+        title_de = " ".join(part for part in (prefix[0], main[0], side[0]) if part)
+        title_en = " ".join(part for part in (prefix[1], main[1], side[1]) if part)
+        positions = sorted(rng.sample(range(len(_INGREDIENTS)), rng.randint(4, 9)))
+        ingredients = []
+        for position in positions:
+            *_, measure, quantity = _INGREDIENTS[position]
+            ingredient: dict[str, Any] = {
+                "ingredient": self._ingredient_details(position)
+            }
+            if quantity is not None:
+                ingredient["quantity"] = quantity
+            if measure is not None:
+                ingredient["measure"] = measure
+            ingredients.append(ingredient)
+
+        steps: list[dict[str, Any]] = [
+            {
+                "title": {"de": "Alles parat?", "en": "All set?"},
+                "ingredients": [],
+                "image": self._image(index, 1, f"REZ_{index}_01.jpg", "step"),
+            }
+        ]
+        for number, (text_de, text_en) in enumerate(_STEP_TEXTS, start=2):
+            step_positions = positions[number - 2 :: len(_STEP_TEXTS)]
+            step: dict[str, Any] = {
+                "title": {"de": text_de, "en": text_en},
+                "ingredients": [
+                    {
+                        "ingredientId": _ingredient_oid(position),
+                        "title": {
+                            "de": _INGREDIENTS[position][0],
+                            "en": _INGREDIENTS[position][1],
+                        },
+                    }
+                    for position in step_positions
+                ],
+                "image": self._image(
+                    index, number, f"REZ_{index}_{number:02d}.jpg", "step"
+                ),
+            }
+            if "<timer>" in text_de:
+                step["timers"] = [{"minOrExact": rng.randint(3, 25)}]
+            steps.append(step)
+
+        return {
+            "_id": {"$oid": recipe_oid(index)},
+            "uid": recipe_uid(index),
+            "localizedTitle": {"de": title_de, "en": title_en},
+            "rtype": rng.choice(_RTYPES),
+            "authorComment": {
+                "de": f"Fake-Rezept Nummer {index}.",
+                "en": f"Fake recipe number {index}.",
+            },
+            "country": "de/at/ch",
+            "preparationTime": rng.randint(10, 45),
+            "cookingTime": rng.choice((None, 5, 10, 20, 30)),
+            "recipeNutrition": {
+                "calories": rng.randint(300, 950),
+                "protein": rng.randint(10, 60),
+                "fat": rng.randint(5, 50),
+                "carbohydrate": rng.randint(20, 110),
+            },
+            "activeTags": sorted(rng.sample(_TAGS, rng.randint(2, 5))),
+            "steps": steps,
+            "ingredients": ingredients,
+            "imageList": [
+                self._image(index, 90, f"REZ_{index}_Fav.jpg", "favorite"),
+                self._image(index, 91, f"REZ_{index}_Cover.jpg", "cover"),
+            ],
+        }
+
+    def summary(self, index: int) -> dict[str, Any]:
+        recipe = self.recipe(index)
+        return {
+            "_id": recipe["_id"],
+            "uid": recipe["uid"],
+            "localizedTitle": recipe["localizedTitle"],
+            "imageList": recipe["imageList"],
+        }
+
+    def resolve(self, payload: object) -> list[dict[str, Any]]:
+        if not isinstance(payload, list):
+            return []
+        recipes = []
+        for item in payload:
+            if not isinstance(item, dict):
+                continue
+            index = self._oid_to_index.get(str(item.get("identifier")))
+            if index is None:
+                index = self._uid_to_index.get(str(item.get("uid")))
+            if index is not None:
+                recipes.append(self.recipe(index))
+        return recipes
+
+    def sample(self, count: int, *salt: int) -> list[int]:
+        size = self.config.catalog_size
+        return sorted(self._rng(*salt).sample(range(size), min(count, size)))
+
+    def today(self) -> list[int]:
+        return self.sample(3, time.localtime().tm_yday)
+
+    def dailies(self) -> list[int]:
+        return self.sample(self.config.dailies_count, -1, time.localtime().tm_yday)
+
+    def favorites(self) -> list[int]:
+        return self.sample(self.config.favorites_count, -2)
+
+    def list_ids(self) -> list[str]:
+        return [f"fake-list-{number}" for number in range(self.config.list_count)]
+
+    def discovery_screen(self) -> dict[str, Any]:
+        lists = []
+        for number, list_id in enumerate(self.list_ids()):
+            lists.append(
+                {
+                    "id": list_id,
+                    "title": {"de": f"Liste {number}", "en": f"List {number}"},
+                    "listType": "curated" if number % 2 == 0 else "automated",
+                }
+            )
+        return {
+            "lists": lists,
+            "quickSearchEntries": [{"title": tag} for tag in _TAGS[:4]],
+        }
+
+    def discovery_list(self, list_type: str, list_id: str | None) -> list[int] | None:
+        size = self.config.catalog_size
+        if list_type == "latest":
+            return list(range(max(0, size - self.config.list_size), size))
+        if list_type == "recommended":
+            return self.sample(self.config.list_size, -3)
+        if list_type in ("curated", "automated") and list_id in self.list_ids():
+            return self.sample(
+                self.config.list_size, -4, self.list_ids().index(list_id)
+            )
+        return None
+
+    def with_tags(self, tags: list[str]) -> list[int]:
+        wanted = {tag.removeprefix("rt:") for tag in tags}
+        matches = []
+        for index in range(self.config.catalog_size):
+            if wanted & set(self.recipe(index)["activeTags"]):
+                matches.append(index)
+            if len(matches) >= self.config.list_size:
+                break
+        return matches
+
+    def with_ingredients(self, ingredient_ids: list[str]) -> list[int]:
+        wanted = set(ingredient_ids)
+        matches = []
+        for index in range(self.config.catalog_size):
+            recipe_ingredients = {
+                item["ingredient"]["_id"]["$oid"]
+                for item in self.recipe(index)["ingredients"]
+            }
+            if wanted <= recipe_ingredients:
+                matches.append(index)
+            if len(matches) >= self.config.list_size:
+                break
+        return matches
+
+    def popular_ingredients(self) -> list[dict[str, Any]]:
+        return [
+            self._ingredient_details(position) for position in range(len(_INGREDIENTS))
+        ]
+
+
+class FakeKptnCookServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str, port: int, config: FakeApiConfig) -> None:
+        super().__init__((host, port), FakeKptnCookRequestHandler)
+        self.config = config
+        self.catalog = FakeCatalog(config, self.url)
+        self._rng = random.Random(config.seed)
+        self._rng_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        if isinstance(host, bytes):
+            host = host.decode()
+        return f"http://{host}:{port}"
+
+    def draw_delay_and_failure(self) -> tuple[float, bool]:
+        with self._rng_lock:
+            delay = self.config.latency + self._rng.uniform(0, self.config.jitter)
+            failed = self._rng.random() < self.config.error_rate
+        return delay, failed
+
+
+class FakeKptnCookRequestHandler(BaseHTTPRequestHandler):
+    server: FakeKptnCookServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, payload: object, status: int = 200) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self._send(status, body, "application/json")
+
+    def _read_json(self) -> object:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return None
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return None
+
+    def _summaries(self, indices: list[int]) -> list[dict[str, Any]]:
+        return [self.server.catalog.summary(index) for index in indices]
+
+    def _handle(self, method: str) -> None:
+        split = urlsplit(self.path)
+        parts = [part for part in split.path.split("/") if part]
+        body = self._read_json() if method == "POST" else None
+
+        delay, failed = self.server.draw_delay_and_failure()
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            self._send_json({"message": "Injected fake-api failure"}, status=503)
+            return
+
+        catalog = self.server.catalog
+        route = (method, *parts[:2])
+        if method == "GET" and parts[:1] == ["image"] and len(parts) == 2:
+            self._send(200, FAKE_IMAGE_BYTES, "image/jpeg")
+        elif route == ("POST", "recipes", "search"):
+            self._send_json(catalog.resolve(body))
+        elif method == "GET" and parts[:1] == ["recipes"] and len(parts) == 3:
+            self._send_json([catalog.recipe(index) for index in catalog.today()])
+        elif route == ("GET", "dailies"):
+            self._send_json([catalog.recipe(index) for index in catalog.dailies()])
+        elif route == ("POST", "auth", "login"):
+            self._send_json({"accessToken": FAKE_ACCESS_TOKEN})
+        elif route == ("GET", "accounts", "me") and parts[2:] == ["favorites"]:
+            if "Token" not in self.headers:
+                self._send_json({"message": "Token required"}, status=401)
+                return
+            favorites = catalog.favorites()
+            self._send_json(
+                {"favorites": [{"identifier": recipe_oid(i)} for i in favorites]}
+            )
+        elif route == ("GET", "discovery", "screen"):
+            self._send_json(catalog.discovery_screen())
+        elif route == ("GET", "discovery", "list") and len(parts) in (3, 4):
+            list_id = parts[3] if len(parts) == 4 else None
+            indices = catalog.discovery_list(parts[2], list_id)
+            if indices is None:
+                self._send_json({"message": "Unknown discovery list"}, status=404)
+                return
+            self._send_json({"recipes": self._summaries(indices)})
+        elif route == ("POST", "recipes", "onboarding"):
+            tags = body.get("tags", []) if isinstance(body, dict) else []
+            self._send_json({"recipes": self._summaries(catalog.with_tags(tags))})
+        elif route == ("POST", "recipes", "withIngredients"):
+            ids = body.get("ingredientIds", []) if isinstance(body, dict) else []
+            self._send_json({"recipes": self._summaries(catalog.with_ingredients(ids))})
+        elif route == ("GET", "ingredients", "popular"):
+            self._send_json(catalog.popular_ingredients())
+        else:
+            self._send_json({"message": f"Unknown route {split.path}"}, status=404)
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+
+class FakeKptnCookApi:
+    """
+    Run the fake API in a background thread, e.g. from tests or benchmarks.
+    """
+
+    def __init__(
+        self,
+        config: FakeApiConfig | None = None,
+        *,
+        host: str = DEFAULT_HOST,
+        port: int = 0,
+    ) -> None:
+        self.server = FakeKptnCookServer(host, port, config or FakeApiConfig())
+        self._thread = threading.Thread(
+            target=self.server.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            daemon=True,
+        )
+
+    @property
+    def url(self) -> str:
+        return self.server.url
+
+    def start(self) -> Self:
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+
+    def __enter__(self) -> Self:
+        return self.start()
+
+    def __exit__(self, *_args: object) -> None:
+        self.stop()
+
+
+def serve_fake_api(
+    config: FakeApiConfig, *, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT
+) -> FakeKptnCookServer:
+    """
+    Build a fake API server; call ``serve_forever`` on the result to run it.
+    """
+    return FakeKptnCookServer(host, port, config)
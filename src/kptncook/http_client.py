@@ -1,11 +1,89 @@
 from __future__ import annotations
 
+import threading
+import time
+from collections.abc import Callable
 from typing import Any
 
 import httpx
 
 DEFAULT_REQUEST_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
 
+# Transport used by every client this package creates itself. ``None`` keeps
+# httpx's default; the CLI swaps in a cassette transport for --record/--replay.
+_default_transport: httpx.BaseTransport | None = None
+
+
+def set_default_transport(transport: httpx.BaseTransport | None) -> None:
+    global _default_transport
+    _default_transport = transport
+
+
+def get_default_transport() -> httpx.BaseTransport | None:
+    return _default_transport
+
+
+class SharedTransport(httpx.BaseTransport):
+    """
+    Connection pool shared by every client of a long-running process.
+
+    Clients are created and closed per workflow run; closing them must not tear
+    down the pool, so ``close`` is a no-op and ``shutdown`` releases it.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport | None = None) -> None:
+        self._transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self._transport.handle_request(request)
+
+    def close(self) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        self._transport.close()
+
+
+class RateLimiter:
+    """
+    Space out calls from any number of threads to at most ``rate`` per second.
+
+    A ``rate`` of ``None`` or ``0`` disables the limit.
+    """
+
+    def __init__(
+        self,
+        rate: float | None,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self._interval = 1.0 / rate if rate else 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self) -> None:
+        if not self._interval:
+            return
+        with self._lock:
+            now = self._clock()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self._interval
+        if slot > now:
+            self._sleep(slot - now)
+
+
+def fetch_url(url: str, **kwargs: Any) -> httpx.Response:
+    """
+    GET an absolute URL (images, share links) outside of an API client.
+    """
+    if _default_transport is None:
+        return httpx.get(url, **kwargs)
+    with httpx.Client(transport=_default_transport) as client:
+        return client.get(url, **kwargs)
+
 
 class BaseHttpClient:
     def __init__(
@@ -19,7 +97,9 @@ class BaseHttpClient:
         self.base_url = str(base_url)
         self.headers = dict(headers or {})
         self._timeout = timeout
-        self._client = client or httpx.Client(timeout=timeout)
+        self._client = client or httpx.Client(
+            timeout=timeout, transport=_default_transport
+        )
         self._owns_client = client is None
 
     def close(self) -> None:
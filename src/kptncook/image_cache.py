@@ -0,0 +1,353 @@
+"""
+On-disk cache for KptnCook images shared by all exporters and Mealie uploads.
+
+Images are stored once per SHA-256 digest under ``<root>/image_cache/blobs`` and
+looked up by their URL without the ``kptnkey`` query parameter, so rotating the
+API key does not invalidate the cache. ``index.json`` records, per URL, the
+digest, the validators the CDN sent (``ETag``, ``Last-Modified``) and when the
+entry was last checked and used.
+
+Entries younger than ``max_age`` are served without a request. Older ones are
+revalidated with a conditional GET; a ``304 Not Modified`` keeps the cached
+body, and a network error serves it as it is. Once the blobs exceed
+``max_size`` bytes the least recently used entries are evicted until a tenth
+of the cache is free again. Blobs fetched with ``pin=True`` are kept until
+``unpin`` is called, so paths handed out for later reads stay valid. The index
+is written every ``INDEX_SAVE_INTERVAL`` downloads and on ``close()``.
+
+Several processes may share a cache directory: blobs are written atomically and
+a blob that disappeared is downloaded again, so the worst case of two processes
+saving the index at the same time is a repeated download.
+"""
+
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+
+from .atomic_files import create_temporary_file, write_atomically
+from .config import get_settings
+from .http_client import get_default_transport
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DOWNLOAD_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+CACHE_DIRNAME = "image_cache"
+INDEX_FILENAME = "index.json"
+INDEX_VERSION = 1
+INDEX_SAVE_INTERVAL = 100
+EVICTION_LOW_WATERMARK = 0.9
+_CHUNK_SIZE = 64 * 1024
+
+
+def cache_key(url: str) -> str:
+    """
+    Return ``url`` without the ``kptnkey`` query parameter.
+    """
+    parts = urlsplit(url)
+    query = [
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name != "kptnkey"
+    ]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+@dataclass
+class CacheEntry:
+    digest: str
+    size: int
+    checked_at: float
+    used_at: float
+    etag: str | None = None
+    last_modified: str | None = None
+
+
+@dataclass(frozen=True)
+class CachedImage:
+    path: Path
+    digest: str
+    size: int
+
+    def read_bytes(self) -> bytes:
+        return self.path.read_bytes()
+
+
+class ImageCache:
+    def __init__(
+        self,
+        directory: Path,
+        *,
+        max_size: int,
+        max_age: float,
+        client: httpx.Client | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.max_age = max_age
+        self._client = client or httpx.Client(
+            transport=get_default_transport(),
+            follow_redirects=True,
+            timeout=IMAGE_DOWNLOAD_TIMEOUT,
+        )
+        self._owns_client = client is None
+        self._clock = clock
+        self._lock = threading.Lock()
+        # One download per URL at a time; other threads wait for its result.
+        self._key_locks: dict[str, threading.Lock] = {}
+        self._dirty = False
+        self._unsaved_downloads = 0
+        self.entries: dict[str, CacheEntry] = {}
+        # Entries per digest, the size of every blob and their sum, kept up to
+        # date so that eviction does not rescan the index.
+        self._digest_refs: dict[str, int] = {}
+        self._sizes: dict[str, int] = {}
+        self._total_size = 0
+        self._pins: dict[str, int] = {}
+        # Blobs no entry refers to any more, deleted by their last ``unpin``.
+        self._orphans: set[str] = set()
+        self._load()
+
+    @property
+    def index_path(self) -> Path:
+        return self.directory / INDEX_FILENAME
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.directory / "blobs" / digest[:2] / digest
+
+    def _load(self) -> None:
+        try:
+            raw = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as exc:
+            logger.warning("Ignoring unreadable image cache index: %s", exc)
+            return
+        if not isinstance(raw, dict) or raw.get("version") != INDEX_VERSION:
+            return
+        try:
+            entries = {key: CacheEntry(**entry) for key, entry in raw["images"].items()}
+        except (KeyError, TypeError, AttributeError) as exc:
+            logger.warning("Ignoring invalid image cache index: %s", exc)
+            return
+        for key, entry in entries.items():
+            self._add_entry(key, entry)
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = json.dumps(
+                {
+                    "version": INDEX_VERSION,
+                    "images": {
+                        key: asdict(entry)
+                        for key, entry in sorted(self.entries.items())
+                    },
+                }
+            )
+            self._dirty = False
+            self._unsaved_downloads = 0
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            write_atomically(self.index_path, payload)
+        except OSError as exc:
+            logger.warning("Could not write image cache index: %s", exc)
+
+    def get(self, url: str) -> bytes:
+        # Pinned while it is read, so another thread cannot evict it meanwhile.
+        image = self.fetch(url, pin=True)
+        try:
+            return image.read_bytes()
+        finally:
+            self.unpin(image.digest)
+
+    def fetch(self, url: str, *, pin: bool = False) -> CachedImage:
+        """
+        Return the cached image for ``url``, downloading or revalidating it.
+
+        With ``pin`` the blob is not evicted until ``unpin`` is called with its
+        digest. Raises ``httpx.HTTPError`` when the image cannot be downloaded
+        and no usable copy is cached.
+        """
+        key = cache_key(url)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            now = self._clock()
+            with self._lock:
+                entry = self.entries.get(key)
+            if entry is not None and not self._blob_path(entry.digest).is_file():
+                entry = None
+            if entry is not None and now - entry.checked_at < self.max_age:
+                return self._use(entry, now, pin)
+            try:
+                return self._download(url, key, entry, now, pin)
+            except httpx.RequestError as exc:
+                if entry is None:
+                    raise
+                logger.warning("Using cached image, could not revalidate: %s", exc)
+                return self._use(entry, now, pin)
+
+    def unpin(self, digest: str) -> None:
+        with self._lock:
+            pins = self._pins.get(digest, 0) - 1
+            if pins > 0:
+                self._pins[digest] = pins
+                return
+            self._pins.pop(digest, None)
+            if digest in self._orphans:
+                self._orphans.discard(digest)
+                self._drop_blob(digest)
+
+    def _use(self, entry: CacheEntry, now: float, pin: bool) -> CachedImage:
+        with self._lock:
+            entry.used_at = now
+            self._dirty = True
+            if pin:
+                self._pins[entry.digest] = self._pins.get(entry.digest, 0) + 1
+        return CachedImage(self._blob_path(entry.digest), entry.digest, entry.size)
+
+    def _download(
+        self, url: str, key: str, entry: CacheEntry | None, now: float, pin: bool
+    ) -> CachedImage:
+        headers = {}
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        blobs = self.directory / "blobs"
+        blobs.mkdir(parents=True, exist_ok=True)
+        temp_path: Path | None = None
+        try:
+            with self._client.stream("GET", url, headers=headers) as response:
+                if entry is not None and response.status_code == 304:
+                    entry.checked_at = now
+                    return self._use(entry, now, pin)
+                response.raise_for_status()
+                digest = hashlib.sha256()
+                size = 0
+                temp_path = create_temporary_file(blobs / "download")
+                with temp_path.open("wb") as f:
+                    for chunk in response.iter_bytes(_CHUNK_SIZE):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                new_entry = CacheEntry(
+                    digest=digest.hexdigest(),
+                    size=size,
+                    checked_at=now,
+                    used_at=now,
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified"),
+                )
+            blob_path = self._blob_path(new_entry.digest)
+            if blob_path.is_file():
+                temp_path.unlink()
+            else:
+                blob_path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(temp_path, blob_path)
+            temp_path = None
+        finally:
+            if temp_path is not None:
+                temp_path.unlink(missing_ok=True)
+        with self._lock:
+            self._add_entry(key, new_entry)
+            if pin:
+                self._pins[new_entry.digest] = self._pins.get(new_entry.digest, 0) + 1
+            self._dirty = True
+            self._unsaved_downloads += 1
+            if self._total_size > self.max_size:
+                self._evict()
+            save = self._unsaved_downloads >= INDEX_SAVE_INTERVAL
+        if save:
+            self.save()
+        return CachedImage(blob_path, new_entry.digest, new_entry.size)
+
+    def _add_entry(self, key: str, entry: CacheEntry) -> None:
+        # The new entry is counted before the old one is released: both may
+        # refer to the same blob.
+        previous = self.entries.get(key)
+        self.entries[key] = entry
+        self._digest_refs[entry.digest] = self._digest_refs.get(entry.digest, 0) + 1
+        self._orphans.discard(entry.digest)
+        if entry.digest not in self._sizes:
+            self._sizes[entry.digest] = entry.size
+            self._total_size += entry.size
+        if previous is not None:
+            self._release_digest(previous.digest)
+
+    def _release_digest(self, digest: str) -> None:
+        refs = self._digest_refs[digest] - 1
+        if refs > 0:
+            self._digest_refs[digest] = refs
+            return
+        del self._digest_refs[digest]
+        if digest in self._pins:
+            self._orphans.add(digest)
+        else:
+            self._drop_blob(digest)
+
+    def _drop_blob(self, digest: str) -> None:
+        self._total_size -= self._sizes.pop(digest)
+        self._blob_path(digest).unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        # Evicting down to a low watermark leaves room for the next downloads,
+        # so the index is sorted once per batch of evictions, not per image.
+        target = self.max_size * EVICTION_LOW_WATERMARK
+        for key in sorted(self.entries, key=lambda key: self.entries[key].used_at):
+            if self._total_size <= target:
+                break
+            if self.entries[key].digest in self._pins or self._is_fetching(key):
+                continue
+            self._release_digest(self.entries.pop(key).digest)
+
+    def _is_fetching(self, key: str) -> bool:
+        # An entry being fetched is about to be handed out, possibly pinned;
+        # this includes the one whose download triggered the eviction.
+        key_lock = self._key_locks.get(key)
+        return key_lock is not None and key_lock.locked()
+
+    def close(self) -> None:
+        self.save()
+        if self._owns_client:
+            self._client.close()
+
+
+_caches: dict[Path, ImageCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_image_cache() -> ImageCache:
+    """
+    Return the image cache below the configured kptncook home directory.
+
+    The cache is shared by every caller in the process and saves its index on
+    exit.
+    """
+    settings = get_settings()
+    directory = Path(settings.root) / CACHE_DIRNAME
+    with _caches_lock:
+        cache = _caches.get(directory)
+        if cache is None:
+            cache = ImageCache(
+                directory,
+                max_size=settings.kptncook_image_cache_max_mb * 1024 * 1024,
+                max_age=settings.kptncook_image_cache_max_age,
+            )
+            _caches[directory] = cache
+            atexit.register(cache.close)
+        return cache
@@ -40,14 +40,22 @@ def _format_group_label(key: str, label_map: dict[str, str]) -> str:
     return key.replace("_", " ").title()
 
 
-def iter_ingredient_groups(
-    ingredients: Iterable[Ingredient],
-) -> list[tuple[str | None, list[Ingredient]]]:
-    items = list(ingredients)
+def get_ingredient_group_labels() -> dict[str, str] | None:
+    """
+    Return the configured group labels, or ``None`` when grouping is disabled.
+    """
     settings = get_settings()
     if not settings.kptncook_group_ingredients_by_typ:
+        return None
+    return parse_ingredient_group_labels(settings.kptncook_ingredient_group_labels)
+
+
+def group_ingredients(
+    ingredients: Iterable[Ingredient], label_map: dict[str, str] | None
+) -> list[tuple[str | None, list[Ingredient]]]:
+    items = list(ingredients)
+    if label_map is None:
         return [(None, items)]
-    label_map = parse_ingredient_group_labels(settings.kptncook_ingredient_group_labels)
     groups: dict[str, list[Ingredient]] = {}
     seen_order: list[str] = []
     for ingredient in items:
@@ -61,3 +69,9 @@ def iter_ingredient_groups(
         if key not in ordered_keys:
             ordered_keys.append(key)
     return [(_format_group_label(key, label_map), groups[key]) for key in ordered_keys]
+
+
+def iter_ingredient_groups(
+    ingredients: Iterable[Ingredient],
+) -> list[tuple[str | None, list[Ingredient]]]:
+    return group_ingredients(ingredients, get_ingredient_group_labels())
@@ -5,26 +5,43 @@ Writes one `.md` file per recipe to an ``export_md`` directory under
 ``settings.kptncook_lang`` (falling back to English for unknown languages).
 Recipe content (titles, steps, ingredient names) follows the project-wide
 ``localized_fallback`` convention shared with the other exporters.
+
+A manifest in the output directory records what was written, so files of
+unchanged recipes are left alone on the next export (the ``date`` front matter
+line is not part of the comparison).
+
+Settings are read once per export into a ``RenderContext``. File names are
+assigned in input order before any recipe is rendered, and recipes are then
+rendered and written on a thread pool.
 """
 
 from __future__ import annotations
 
-from collections.abc import Iterable
+import re
+from collections.abc import Iterable, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import date
 from pathlib import Path
 
 from pathvalidate import sanitize_filename
 
+from .atomic_files import write_atomically
 from .config import get_settings
+from .export_manifest import ExportManifest, ExportReport, content_hash
 from .exporter_utils import get_cover, replace_timers_in_step
-from .ingredient_groups import iter_ingredient_groups
+from .ingredient_groups import get_ingredient_group_labels
 from .models import Ingredient, LocalizedString, Recipe, RecipeStep, localized_fallback
+from .recipe_view import RecipeView, view_for
 
 # KptnCook quantities are already totals for the recipe's standard portions, so
 # they are emitted as-is (matching the Paprika and Mealie exporters). This value
 # is only used for the ``servings`` front matter when the recipe omits an
 # explicit portion count.
 DEFAULT_SERVINGS = 2
+EXPORT_CONCURRENCY = 8
+MANIFEST_FILENAME = ".kptncook-markdown.json"
+_DATE_LINE = re.compile(r"^date: .*\n", re.MULTILINE)
 
 # Localized structural labels. Recipe content language is governed by
 # ``localized_fallback``; only the headings/alt text below are language-aware.
@@ -77,6 +94,25 @@ def _section_labels() -> dict[str, str]:
     return SECTION_LABELS.get(lang, SECTION_LABELS["en"])
 
 
+@dataclass(frozen=True)
+class RenderContext:
+    """Settings-derived values shared by every recipe of one export."""
+
+    labels: dict[str, str]
+    group_labels: dict[str, str] | None
+    api_key: str | None
+    today: date
+
+    @classmethod
+    def from_settings(cls) -> RenderContext:
+        return cls(
+            labels=_section_labels(),
+            group_labels=get_ingredient_group_labels(),
+            api_key=get_settings().kptncook_api_key,
+            today=date.today(),
+        )
+
+
 def _is_prep_step(step: RecipeStep) -> bool:
     title: LocalizedString = step.title
     for value in (title.en, title.de, title.es, title.fr, title.pt):
@@ -86,15 +122,78 @@ def _is_prep_step(step: RecipeStep) -> bool:
 
 
 class MarkdownExporter:
-    def export(self, recipes: Iterable[Recipe]) -> list[Path]:
-        written: list[Path] = []
-        used_stems: set[str] = set()
-
+    def __init__(self, views: Mapping[str, RecipeView] | None = None) -> None:
+        self.views = views
+
+    def get_view(self, recipe: Recipe, context: RenderContext) -> RecipeView:
+        return view_for(self.views, recipe, context.group_labels)
+
+    def export(
+        self,
+        recipes: Iterable[Recipe],
+        prune: bool = False,
+        concurrency: int = EXPORT_CONCURRENCY,
+    ) -> list[Path]:
+        return self.export_changes(recipes, prune=prune, concurrency=concurrency).paths
+
+    def export_changes(
+        self,
+        recipes: Iterable[Recipe],
+        prune: bool = False,
+        concurrency: int = EXPORT_CONCURRENCY,
+    ) -> ExportReport:
+        """Write the recipes whose Markdown changed since the last export.
+
+        With ``prune``, files of recipes missing from ``recipes`` are deleted.
+        """
+        context = RenderContext.from_settings()
         out_dir = get_settings().root / "export_md"
         out_dir.mkdir(parents=True, exist_ok=True)
-
+        manifest = ExportManifest(out_dir, MANIFEST_FILENAME)
+
+        targets = self.get_export_paths(recipes, out_dir, context)
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            futures = [
+                executor.submit(
+                    self.export_recipe_changes, recipe, path, manifest, context
+                )
+                for recipe, path in targets
+            ]
+            results = [future.result() for future in futures]
+
+        report = ExportReport(paths=[path for _, path in targets])
+        report.written = sum(written for written, _ in results)
+        report.skipped = len(results) - report.written
+        renamed = [previous for _, previous in results if previous is not None]
+        report.removed += manifest.remove_renamed(renamed)
+        if prune:
+            report.removed += manifest.prune(
+                {str(recipe.id.oid) for recipe, _ in targets}
+            )
+        manifest.save()
+        return report
+
+    def get_export_paths(
+        self,
+        recipes: Iterable[Recipe],
+        out_dir: Path,
+        context: RenderContext | None = None,
+    ) -> list[tuple[Recipe, Path]]:
+        """Pair each recipe with its file, skipping repeated ids.
+
+        Names are assigned in input order, so colliding titles get the same
+        suffixes on every run.
+        """
+        context = context or RenderContext.from_settings()
+        targets: list[tuple[Recipe, Path]] = []
+        used_stems: set[str] = set()
+        exported_oids: set[str] = set()
         for recipe in recipes:
-            title = localized_fallback(recipe.localized_title) or "recipe"
+            oid = str(recipe.id.oid)
+            if oid in exported_oids:
+                continue
+            exported_oids.add(oid)
+            title = self.get_view(recipe, context).title or "recipe"
             base = sanitize_filename(title)
             # keep one file per recipe even when titles (or suffixed stems) collide
             stem = base
@@ -104,17 +203,37 @@ class MarkdownExporter:
                 stem = f"{base}-{suffix}"
                 counter += 1
             used_stems.add(stem)
-            out_path = out_dir / f"{stem}.md"
-            out_path.write_text(self.render_recipe(recipe), encoding="utf-8")
-            written.append(out_path)
-        return written
-
-    def render_recipe(self, recipe: Recipe) -> str:
-        labels = _section_labels()
+            targets.append((recipe, out_dir / f"{stem}.md"))
+        return targets
+
+    def export_recipe_changes(
+        self,
+        recipe: Recipe,
+        path: Path,
+        manifest: ExportManifest,
+        context: RenderContext,
+    ) -> tuple[bool, Path | None]:
+        """Write ``recipe`` unless the manifest says its file is current.
+
+        Returns whether it was written and the file it replaced under another name.
+        """
+        oid = str(recipe.id.oid)
+        text = self.render_recipe(recipe, context=context)
+        digest = content_hash(_DATE_LINE.sub("", text, count=1))
+        if manifest.is_unchanged(oid, path, digest):
+            return False, None
+        write_atomically(path, text)
+        return True, manifest.record(oid, path, digest)
+
+    def render_recipe(
+        self, recipe: Recipe, context: RenderContext | None = None
+    ) -> str:
+        context = context or RenderContext.from_settings()
+        labels = context.labels
         comment = localized_fallback(recipe.author_comment) or ""
 
         lines: list[str] = ["---"]
-        lines.append(f"date: {date.today().isoformat()}")
+        lines.append(f"date: {context.today.isoformat()}")
 
         servings = recipe.fixed_portion_count or DEFAULT_SERVINGS
         lines.append(f"servings: {servings}")
@@ -129,9 +248,7 @@ class MarkdownExporter:
         # cover image (prefer the last step image, else the cover image)
         last_step_image = recipe.steps[-1].image if recipe.steps else None
         image = last_step_image or get_cover(recipe.image_list)
-        image_url = (
-            f"{image.url}?kptnkey={get_settings().kptncook_api_key}" if image else None
-        )
+        image_url = f"{image.url}?kptnkey={context.api_key}" if image else None
 
         if image_url:
             lines.append(f"image: {image_url}")
@@ -165,7 +282,8 @@ class MarkdownExporter:
         # Ingredients
         lines.append(f"### {labels['ingredients']}")
         lines.append("")
-        ing_lines = self.get_ingredients_lines(recipe.ingredients)
+        view = self.get_view(recipe, context)
+        ing_lines = self.format_ingredient_groups(view.ingredient_groups)
         if ing_lines:
             lines.extend(ing_lines)
         else:
@@ -221,12 +339,14 @@ class MarkdownExporter:
             transformed.append(tag)
         return transformed
 
-    def get_ingredients_lines(self, ingredients: list[Ingredient]) -> list[str]:
+    def format_ingredient_groups(
+        self, groups: list[tuple[str | None, list[Ingredient]]]
+    ) -> list[str]:
         lines: list[str] = []
-        for group_label, group_ingredients in iter_ingredient_groups(ingredients):
+        for group_label, grouped in groups:
             if group_label:
                 lines.append(f"{group_label}:")
-            for ingredient in group_ingredients:
+            for ingredient in grouped:
                 text = self.format_ingredient_line(ingredient)
                 if text:
                     lines.append(f"- {text}")
@@ -1,9 +1,12 @@
 import datetime
-import io
+import hashlib
 import json
 import logging
+import threading
+import time
 import uuid
-from collections.abc import Callable
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from getpass import getpass
 from pathlib import Path
 from typing import Any
@@ -15,6 +18,9 @@ from .exporter_utils import get_step_text
 from .config import get_settings
 from .http_client import BaseHttpClient, DEFAULT_REQUEST_TIMEOUT
 from .ingredient_groups import iter_ingredient_groups
+from .name_matching import DEFAULT_MATCH_THRESHOLD, NameMatchingIndex
+from .image_cache import get_image_cache
+from .step_images import StepImageDownloader
 from .models import (
     Image,
     Ingredient,
@@ -25,7 +31,13 @@ from .models import Recipe as KptnCookRecipe
 
 logger = logging.getLogger(__name__)
 
-ASSET_DOWNLOAD_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+DEFAULT_UPLOAD_CONCURRENCY = 4
+ARCHIVE_UPLOAD_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_PAGE_CONCURRENCY = 4
+KPTNCOOK_TAG = "kptncook"
+# Status codes of Mealie versions that do not understand the listing filters.
+FILTER_UNSUPPORTED_STATUS_CODES = {400, 404, 422}
 
 
 class NameIsIdModel(BaseModel):
@@ -170,16 +182,109 @@ class RecipeWithImage(Recipe):
     image_url: str | None = None
 
 
+class CreateCheckpoint:
+    """
+    Progress of one ``create_recipe`` call.
+
+    The phases are ``trunk`` (the empty recipe exists under ``slug``), ``image``
+    (the main image was scraped) and ``assets`` (all step images were
+    uploaded); uploaded step images are collected in ``assets`` as they
+    finish. A checkpoint restored from an earlier, interrupted call lets
+    ``create_recipe`` skip the work already done. ``on_change`` is called
+    after every step so the progress can be persisted.
+    """
+
+    phases = ("trunk", "image", "assets")
+
+    def __init__(
+        self,
+        slug: str | None = None,
+        phase: str | None = None,
+        assets: list[RecipeAsset] | None = None,
+        on_change: Callable[["CreateCheckpoint"], None] | None = None,
+    ) -> None:
+        self.slug = slug
+        self.phase = phase
+        self.assets = list(assets or [])
+        self.on_change = on_change
+
+    def reached(self, phase: str) -> bool:
+        if self.phase is None:
+            return False
+        return self.phases.index(self.phase) >= self.phases.index(phase)
+
+    def advance(self, phase: str, slug: str | None = None) -> None:
+        if slug is not None:
+            self.slug = slug
+        self.phase = phase
+        self._changed()
+
+    def add_asset(self, asset: RecipeAsset) -> None:
+        self.assets.append(asset)
+        self._changed()
+
+    def _changed(self) -> None:
+        if self.on_change is not None:
+            self.on_change(self)
+
+
 class MealieApiClient(BaseHttpClient):
     def __init__(
         self,
         base_url: str,
         *,
         client: httpx.Client | None = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        page_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+        upload_concurrency: int = DEFAULT_UPLOAD_CONCURRENCY,
+        step_images: StepImageDownloader | None = None,
+        match_threshold: float = DEFAULT_MATCH_THRESHOLD,
+        item_aliases: dict[str, str] | None = None,
     ) -> None:
         super().__init__(
             str(base_url), headers={}, timeout=DEFAULT_REQUEST_TIMEOUT, client=client
         )
+        self.page_size = page_size
+        self.page_concurrency = max(1, page_concurrency)
+        # Units, foods and tags by normalized name, loaded once per client so a
+        # sync of many recipes does not page through the catalogs per recipe.
+        self._item_lookups: dict[str, dict[str, Any]] = {}
+        # Units and foods are also matched on spelling variants ("Zwiebeln",
+        # "Frühlings-Zwiebel") so each variant does not become a new item.
+        self.match_threshold = match_threshold
+        self.item_aliases = item_aliases or {}
+        self._item_indexes: dict[str, NameMatchingIndex] = {}
+        # Recipes may be created from several threads; shared units, foods and
+        # tags must still be looked up and created one at a time.
+        self._item_lock = threading.Lock()
+        # Step images are shared by every recipe of a sync; uploads are capped
+        # across all recipes being created at the same time.
+        self.upload_concurrency = max(1, upload_concurrency)
+        self._upload_slots = threading.BoundedSemaphore(self.upload_concurrency)
+        self._owns_step_images = step_images is None
+        # Created on first use: a client that uploads no images does not need
+        # the image cache or the settings it is configured by.
+        self._step_images = step_images
+        self._step_images_lock = threading.Lock()
+
+    @property
+    def step_images(self) -> StepImageDownloader:
+        with self._step_images_lock:
+            if self._step_images is None:
+                self._step_images = StepImageDownloader(cache=get_image_cache())
+            return self._step_images
+
+    def close(self) -> None:
+        if self._owns_step_images and self._step_images is not None:
+            self._step_images.close()
+        super().close()
+
+    def clear_item_lookups(self) -> None:
+        """
+        Forget cached units, foods and tags, e.g. after they changed in Mealie.
+        """
+        self._item_lookups.clear()
+        self._item_indexes.clear()
 
     @property
     def logged_in(self):
@@ -201,15 +306,8 @@ class MealieApiClient(BaseHttpClient):
         self.headers["authorization"] = f"Bearer {token}"
 
     def upload_asset(self, recipe_slug, image: Image):
-        # download image
-        r = httpx.get(
-            image.url,
-            follow_redirects=True,
-            timeout=ASSET_DOWNLOAD_TIMEOUT,
-        )
-        r.raise_for_status()
-
-        download = io.BytesIO(r.content)
+        # download image, or reuse the download of an earlier recipe
+        download = self.step_images.get(image.url)
 
         # upload to mealie
         name = Path(image.name)
@@ -220,9 +318,12 @@ class MealieApiClient(BaseHttpClient):
             "icon": "mdi-file-image",
             "extension": extension,
         }
-        r = self.post(
-            f"/recipes/{recipe_slug}/assets", data=data, files={"file": download}
-        )
+        with self._upload_slots, download.open() as body:
+            r = self.post(
+                f"/recipes/{recipe_slug}/assets",
+                data=data,
+                files={"file": (name.name, body)},
+            )
         r.raise_for_status()
 
         return r.json()
@@ -231,33 +332,68 @@ class MealieApiClient(BaseHttpClient):
     def _build_recipestep_text(recipe_uuid, text, image_name):
         return f'{text} <img src="/api/media/recipes/{recipe_uuid}/assets/{image_name}" height="100%" width="100%"/>'
 
-    def enrich_recipe_with_step_images(self, recipe):
-        assets = []
-        for instruction in recipe.recipe_instructions:
+    def enrich_recipe_with_step_images(
+        self, recipe, existing_assets=None, on_upload=None
+    ):
+        # Assets already attached to the recipe are named after the step image
+        # they were uploaded from, so an update can reuse them as they are.
+        reusable_assets = {
+            asset.name: asset for asset in existing_assets or [] if asset.file_name
+        }
+        pending: list[tuple[RecipeStep, RecipeAsset | Future[dict]]] = []
+
+        def upload_and_release(image):
             try:
-                asset_properties = self.upload_asset(recipe.slug, instruction.image)
-            except httpx.HTTPError as exc:
-                logger.warning(
-                    "Skipping step image upload for recipe %s: %s", recipe.slug, exc
-                )
-                continue
-            except Exception:
-                logger.exception(
-                    "Skipping step image upload for recipe %s due to unexpected error",
-                    recipe.slug,
-                )
-                continue
-            uploaded_image_name = asset_properties["fileName"]
-            instruction.text = self._build_recipestep_text(
-                recipe.id, instruction.text, uploaded_image_name
-            )
-            assets.append(
-                RecipeAsset(
-                    name=asset_properties["name"],
-                    icon=asset_properties["icon"],
-                    file_name=asset_properties["fileName"],
+                return self.upload_asset(recipe.slug, image)
+            finally:
+                if image is not None:
+                    self.step_images.release(image.url)
+
+        with ThreadPoolExecutor(max_workers=self.upload_concurrency) as executor:
+            for instruction in recipe.recipe_instructions:
+                reused = None
+                if instruction.image is not None:
+                    reused = reusable_assets.get(Path(instruction.image.name).stem)
+                if reused is None and instruction.image is not None:
+                    # Start every download now so they overlap with the uploads;
+                    # the body is dropped once its last upload is done.
+                    self.step_images.acquire(instruction.image.url)
+                if reused is not None:
+                    pending.append((instruction, reused))
+                else:
+                    upload = executor.submit(upload_and_release, instruction.image)
+                    pending.append((instruction, upload))
+            assets = []
+            for instruction, result in pending:
+                if isinstance(result, RecipeAsset):
+                    asset = result
+                else:
+                    try:
+                        asset_properties = result.result()
+                    except httpx.HTTPError as exc:
+                        logger.warning(
+                            "Skipping step image upload for recipe %s: %s",
+                            recipe.slug,
+                            exc,
+                        )
+                        continue
+                    except Exception:
+                        logger.exception(
+                            "Skipping step image upload for recipe %s due to unexpected error",
+                            recipe.slug,
+                        )
+                        continue
+                    asset = RecipeAsset(
+                        name=asset_properties["name"],
+                        icon=asset_properties["icon"],
+                        file_name=asset_properties["fileName"],
+                    )
+                    if on_upload is not None:
+                        on_upload(asset)
+                instruction.text = self._build_recipestep_text(
+                    recipe.id, instruction.text, asset.file_name
                 )
-            )
+                assets.append(asset)
         recipe.assets = assets
         return recipe
 
@@ -290,23 +426,54 @@ class MealieApiClient(BaseHttpClient):
         recipe = RecipeWithImage(**(recipe.dict() | updated_details))
         return recipe
 
-    def _get_page(self, endpoint_name, page_num, per_page=50):
-        r = self.get(f"/{endpoint_name}?page={page_num}&perPage={per_page}")
+    def _get_page(self, endpoint_name, page_num, per_page=None, params=None):
+        query = {"page": page_num, "perPage": per_page or self.page_size}
+        r = self.get(f"/{endpoint_name}", params=query | (params or {}))
         r.raise_for_status()
         return r.json()
 
+    def _iter_pages(self, endpoint_name, params=None) -> Iterator[list[Any]]:
+        """
+        Yield the items of every page in order.
+
+        The first page tells how many pages there are; the rest are then
+        fetched concurrently while earlier pages are already being consumed.
+        """
+        first_page = self._get_page(endpoint_name, 1, params=params)
+        yield first_page["items"]
+        total_pages = first_page.get("total_pages") or 1
+        if total_pages < 2:
+            return
+        with ThreadPoolExecutor(max_workers=self.page_concurrency) as executor:
+            futures = [
+                executor.submit(self._get_page, endpoint_name, page_num, params=params)
+                for page_num in range(2, total_pages + 1)
+            ]
+            try:
+                for future in futures:
+                    yield future.result()["items"]
+            finally:
+                for future in futures:
+                    future.cancel()
+
     def _get_all_items(self, endpoint_name):
         all_items = []
-        response_data = self._get_page(endpoint_name, 1)
-        all_items.extend(response_data["items"])
+        for items in self._iter_pages(endpoint_name):
+            all_items.extend(items)
+        return all_items
 
-        # 1 was already fetched, start page_num at 2 and add 1 to the
-        # number of total pages, because we start counting at 1 instead of 0
-        for page_num in range(2, response_data["total_pages"] + 1):
-            response_data = self._get_page(endpoint_name, page_num)
-            all_items.extend(response_data["items"])
+    def get_items(self, endpoint_name, model_class):
+        return TypeAdapter(list[model_class]).validate_python(
+            self._get_all_items(endpoint_name)
+        )
 
-        return all_items
+    def delete_item(self, endpoint_name, item_id):
+        r = self.delete(f"/{endpoint_name}/{item_id}")
+        r.raise_for_status()
+        # The cached lookup would hand out the deleted item otherwise.
+        with self._item_lock:
+            self._item_lookups.pop(endpoint_name, None)
+            self._item_indexes.pop(endpoint_name, None)
 
     def _create_item(self, endpoint_name, item):
         r = self.post(
@@ -323,6 +490,7 @@ class MealieApiClient(BaseHttpClient):
         model_class,
         items,
         normalize_name: Callable[[str], str] | None = None,
+        fuzzy: bool = False,
     ):
         def identity(name: str) -> str:
             return name
@@ -330,24 +498,48 @@ class MealieApiClient(BaseHttpClient):
         if normalize_name is None:
             normalize_name = identity
 
-        existing_items = TypeAdapter(list[model_class]).validate_python(
-            self._get_all_items(endpoint_name)
-        )
-        normalized_name_to_item = {
-            normalize_name(item.name): item for item in existing_items
-        }
-        items_to_create = {
-            item
-            for item in items
-            if normalize_name(item.name) not in normalized_name_to_item
-        }
-        for item in items_to_create:
-            created_item = model_class(**self._create_item(endpoint_name, item))
-            normalized_name_to_item[normalize_name(created_item.name)] = created_item
-        return {
-            item.name: normalized_name_to_item[normalize_name(item.name)]
-            for item in items
-        }
+        with self._item_lock:
+            normalized_name_to_item = self._item_lookups.get(endpoint_name)
+            if normalized_name_to_item is None:
+                existing_items = TypeAdapter(list[model_class]).validate_python(
+                    self._get_all_items(endpoint_name)
+                )
+                normalized_name_to_item = {
+                    normalize_name(item.name): item for item in existing_items
+                }
+                self._item_lookups[endpoint_name] = normalized_name_to_item
+            index = None
+            if fuzzy:
+                index = self._item_indexes.get(endpoint_name)
+                if index is None:
+                    index = NameMatchingIndex(
+                        normalized_name_to_item.values(),
+                        threshold=self.match_threshold,
+                        aliases=self.item_aliases,
+                    )
+                    self._item_indexes[endpoint_name] = index
+            for item in sorted(items, key=lambda item: item.name):
+                key = normalize_name(item.name)
+                if key in normalized_name_to_item:
+                    continue
+                matched_item = index.match(item.name) if index is not None else None
+                if matched_item is None:
+                    if index is not None:
+                        # Aliases are created under the name they stand for.
+                        item = item.model_copy(
+                            update={"name": index.canonical_name(item.name)}
+                        )
+                    matched_item = model_class(**self._create_item(endpoint_name, item))
+                    normalized_name_to_item[normalize_name(matched_item.name)] = (
+                        matched_item
+                    )
+                    if index is not None:
+                        index.add(matched_item)
+                normalized_name_to_item[key] = matched_item
+            return {
+                item.name: normalized_name_to_item[normalize_name(item.name)]
+                for item in items
+            }
 
     def _update_item_ids(self, recipe, endpoint_name, model_class, attr_name):
         items = {
@@ -360,7 +552,7 @@ class MealieApiClient(BaseHttpClient):
             return recipe
 
         name_to_item_with_id = self._create_item_name_to_item_lookup(
-            endpoint_name, model_class, items
+            endpoint_name, model_class, items, fuzzy=True
         )
         for ingredient in recipe.recipe_ingredient:
             if getattr(ingredient, attr_name) is not None:
@@ -393,18 +585,56 @@ class MealieApiClient(BaseHttpClient):
         r.raise_for_status()
         return Recipe.model_validate(r.json())
 
-    def create_recipe(self, recipe):
-        slug = self._post_recipe_trunk_and_get_slug(recipe.name)
-        logger.debug("Created Mealie recipe slug: %s", slug)
+    def create_recipe(self, recipe, checkpoint: CreateCheckpoint | None = None):
+        if checkpoint is None:
+            checkpoint = CreateCheckpoint()
+        if checkpoint.reached("trunk") and checkpoint.slug:
+            slug = checkpoint.slug
+            logger.debug("Resuming Mealie recipe slug: %s", slug)
+        else:
+            slug = self._post_recipe_trunk_and_get_slug(recipe.name)
+            logger.debug("Created Mealie recipe slug: %s", slug)
+            checkpoint.advance("trunk", slug)
         recipe.slug = slug
-        self._scrape_image_for_recipe(recipe, slug)
+        if not checkpoint.reached("image"):
+            self._scrape_image_for_recipe(recipe, slug)
+            checkpoint.advance("image")
+        # Resolving ids is not checkpointed: it only reads the cached lookups
+        # and creates whatever units, foods or tags are still missing.
         recipe = self._update_user_and_group_id(recipe, slug)
         recipe = self._update_item_ids(recipe, "units", RecipeUnit, "unit")
         recipe = self._update_item_ids(recipe, "foods", RecipeFood, "food")
         recipe = self._update_tag_ids(recipe)
-        recipe = self.enrich_recipe_with_step_images(recipe)
+        # Step images uploaded before an interruption are reused, not uploaded
+        # again.
+        recipe = self.enrich_recipe_with_step_images(
+            recipe, checkpoint.assets, on_upload=checkpoint.add_asset
+        )
+        checkpoint.advance("assets")
         return self._update_recipe(recipe, slug)
 
+    def update_recipe(self, recipe, slug):
+        """
+        Replace the content of an existing recipe, keeping its Mealie identity.
+
+        Step images already attached to the recipe are reused instead of being
+        downloaded and uploaded again; the main image is only scraped when the
+        recipe has none.
+        """
+        existing = self.get_via_slug(slug)
+        recipe.slug = existing.slug or slug
+        recipe.id = existing.id
+        recipe.user_id = existing.user_id
+        recipe.group_id = existing.group_id
+        recipe.image = existing.image
+        if not existing.image:
+            self._scrape_image_for_recipe(recipe, recipe.slug)
+        recipe = self._update_item_ids(recipe, "units", RecipeUnit, "unit")
+        recipe = self._update_item_ids(recipe, "foods", RecipeFood, "food")
+        recipe = self._update_tag_ids(recipe)
+        recipe = self.enrich_recipe_with_step_images(recipe, existing.assets)
+        return self._update_recipe(recipe, recipe.slug)
+
     @staticmethod
     def validate_recipes(recipes):
         validated_recipes = []
@@ -422,25 +652,77 @@ class MealieApiClient(BaseHttpClient):
 
     def get_all_recipes(self):
         all_recipes = []
-
-        r = self.get("/recipes?page=1&perPage=50")
-        r.raise_for_status()
-        all_recipes.extend(self.validate_recipes(r.json()["items"]))
-
-        page = 2
-        while page <= r.json()["total_pages"]:
-            r = self.get(f"/recipes?page={page}&perPage=50")
-            r.raise_for_status()
-            all_recipes.extend(self.validate_recipes(r.json()["items"]))
-            page += 1
-
+        for items in self._iter_pages("recipes"):
+            all_recipes.extend(self.validate_recipes(items))
         return all_recipes
 
+    def get_recipes_with_tag(self, tag_name: str) -> tuple[list[Recipe], bool]:
+        """
+        List the recipes carrying a tag, filtered by the server.
+
+        Returns the recipes and whether the server applied the filter. Servers
+        that reject the filter parameters, or ignore them and answer with every
+        recipe, get a plain full listing instead, flagged as unfiltered.
+        """
+        params = {
+            # Mealie matches tags by slug or id; simple names are their own slug.
+            "tags": [tag_name.lower()],
+            "queryFilter": f'tags.name IN ["{tag_name}"]',
+        }
+        try:
+            recipes = []
+            for items in self._iter_pages("recipes", params=params):
+                recipes.extend(self.validate_recipes(items))
+        except httpx.HTTPStatusError as exc:
+            if exc.response.status_code not in FILTER_UNSUPPORTED_STATUS_CODES:
+                raise
+            logger.info("Mealie rejected the recipe tag filter, listing all recipes")
+            return self.get_all_recipes(), False
+        wanted = tag_name.lower()
+        for recipe in recipes:
+            if not any(tag.name.lower() == wanted for tag in recipe.tags or []):
+                logger.info("Mealie ignored the recipe tag filter")
+                return recipes, False
+        return recipes, True
+
     def delete_via_slug(self, slug):
         r = self.delete(f"/recipes/{slug}")
         r.raise_for_status()
         return r.json()
 
+    def start_migration(self, archive_path: Path, migration_type: str) -> str:
+        """
+        Upload a migration archive and return the id of its import report.
+        """
+        with archive_path.open("rb") as archive:
+            r = self.post(
+                "/groups/migrations",
+                data={"migration_type": migration_type, "add_migration_tag": "false"},
+                files={"archive": (archive_path.name, archive, "application/zip")},
+                timeout=ARCHIVE_UPLOAD_TIMEOUT,
+            )
+        r.raise_for_status()
+        return r.json()["id"]
+
+    def wait_for_report(
+        self, report_id: str, *, timeout: float, poll_interval: float = 2.0
+    ) -> dict[str, Any]:
+        """
+        Poll a background job report until it is no longer in progress.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            r = self.get(f"/groups/reports/{report_id}")
+            r.raise_for_status()
+            report = r.json()
+            if report.get("status") != "in-progress":
+                return report
+            if time.monotonic() >= deadline:
+                raise TimeoutError(
+                    f"Mealie report {report_id} still in progress after {timeout:.0f}s"
+                )
+            time.sleep(poll_interval)
+
     def get_via_slug(self, slug):
         r = self.get(f"/recipes/{slug}")
         r.raise_for_status()
@@ -533,7 +815,7 @@ def kptncook_to_mealie_steps(
 
 
 def kptncook_to_mealie_tags(active_tags: list[str] | None) -> list[RecipeTag]:
-    tag_names = ["kptncook"]
+    tag_names = [KPTNCOOK_TAG]
     if active_tags:
         tag_names.extend(active_tags)
 
@@ -547,6 +829,60 @@ def kptncook_to_mealie_tags(active_tags: list[str] | None) -> list[RecipeTag]:
     return tags
 
 
+_HASH_EXCLUDED_FIELDS = {
+    "id",
+    "user_id",
+    "group_id",
+    "slug",
+    "extras",
+    "assets",
+    "image_url",
+}
+
+
+def mealie_recipe_hash(recipe: Recipe) -> str:
+    """
+    Hash the content of a converted recipe.
+
+    Ingredient reference ids are random per conversion, so they are replaced by
+    their position before hashing; Mealie-assigned fields are left out. Image
+    URLs carry the API key, so the cover URL is left out and the key is cut off
+    the step image URLs.
+    """
+    payload = recipe.model_dump(mode="json", exclude=_HASH_EXCLUDED_FIELDS)
+    reference_ids: dict[str, int] = {}
+
+    def normalize(value: Any, key: str | None = None) -> Any:
+        if key == "referenceId" and value is not None:
+            return reference_ids.setdefault(str(value), len(reference_ids))
+        if key == "url" and isinstance(value, str):
+            return value.partition("?kptnkey=")[0]
+        if isinstance(value, dict):
+            return {key: normalize(item, key) for key, item in value.items()}
+        if isinstance(value, list):
+            return [normalize(item) for item in value]
+        return value
+
+    canonical = json.dumps(normalize(payload), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# Bump whenever kptncook_to_mealie produces different output, so recipes synced
+# before are converted and compared again.
+MEALIE_CONVERSION_VERSION = 1
+
+
+def kptncook_source_hash(recipe: KptnCookRecipe) -> str:
+    """
+    Hash a stored kptncook recipe together with the conversion version.
+
+    Much cheaper than converting the recipe, so a sync can skip recipes that
+    did not change since they were last written to Mealie.
+    """
+    payload = f"{MEALIE_CONVERSION_VERSION}:{recipe.model_dump_json()}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 def kptncook_to_mealie(
     kcin: KptnCookRecipe, api_key: str | None = None
 ) -> RecipeWithImage:
@@ -581,4 +917,6 @@ def kptncook_to_mealie(
         "extras": {"kptncook_id": kcin.id.oid, "source": "kptncook"},
     }
     logger.debug("Mealie recipe payload kwargs: %s", kwargs)
-    return RecipeWithImage(**kwargs)
+    recipe = RecipeWithImage(**kwargs)
+    recipe.extras["kptncook_hash"] = mealie_recipe_hash(recipe)
+    return recipe
@@ -0,0 +1,96 @@
+"""
+Build archives for Mealie's bulk recipe import.
+
+Mealie migrates zip files laid out like its own legacy exports (the
+``mealie_alpha`` migration): ``recipes/<slug>/<slug>.json`` holds the recipe
+and ``recipes/<slug>/images/original.webp`` its main image. Mealie derives the
+slug from the recipe name, so the folders are named the same way for the images
+to be picked up.
+
+Imported recipes carry no content hash in their ``extras`` and are marked as
+pending an update in the ledger. The next regular sync therefore updates each
+of them in place: it resolves unit, food and tag ids and uploads the step
+images, which an archive cannot reference before Mealie has assigned the recipe
+ids.
+"""
+
+import json
+import logging
+import re
+import shutil
+import zipfile
+from pathlib import Path
+from typing import Any
+
+import httpx
+from unidecode import unidecode
+
+from .mealie import RecipeWithImage
+from .step_images import StepImageDownloader
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_TYPE = "mealie_alpha"
+_ARCHIVE_EXCLUDED_FIELDS = {"id", "user_id", "group_id", "image", "image_url", "assets"}
+
+
+def mealie_slug(name: str) -> str:
+    text = unidecode(name).lower().replace("'", "")
+    return re.sub(r"[^a-z0-9]+", "-", text).strip("-")
+
+
+def archive_recipe_payload(recipe: RecipeWithImage) -> dict[str, Any]:
+    payload = recipe.model_dump(
+        mode="json", by_alias=True, exclude=_ARCHIVE_EXCLUDED_FIELDS
+    )
+    payload["slug"] = mealie_slug(recipe.name or "")
+    for step in payload.get("recipe_instructions") or []:
+        step.pop("image", None)
+    payload["extras"] = {
+        key: value for key, value in recipe.extras.items() if key != "kptncook_hash"
+    }
+    return payload
+
+
+def build_import_archive(
+    path: Path, recipes: list[RecipeWithImage], images: StepImageDownloader
+) -> int:
+    """
+    Write the recipes to a migration archive and return how many were added.
+
+    Main images are fetched concurrently through ``images``; a recipe whose
+    image cannot be downloaded is imported without one. Recipes whose names
+    map to the same slug would overwrite each other, so only the first is kept.
+    """
+    for recipe in recipes:
+        if recipe.image_url:
+            images.fetch(recipe.image_url)
+    seen_slugs: set[str] = set()
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for recipe in recipes:
+            slug = mealie_slug(recipe.name or "")
+            if not slug or slug in seen_slugs:
+                logger.warning(
+                    "Leaving recipe %s out of the Mealie import: duplicate name",
+                    recipe.name,
+                )
+                continue
+            seen_slugs.add(slug)
+            folder = f"recipes/{slug}"
+            archive.writestr(
+                f"{folder}/{slug}.json",
+                json.dumps(archive_recipe_payload(recipe), ensure_ascii=False),
+            )
+            if not recipe.image_url:
+                continue
+            try:
+                image = images.get(recipe.image_url)
+            except httpx.HTTPError as exc:
+                logger.warning("Could not download image for %s: %s", recipe.name, exc)
+                continue
+            # Images are already compressed; store them as they are.
+            info = zipfile.ZipInfo(f"{folder}/images/original.webp")
+            info.compress_type = zipfile.ZIP_STORED
+            with image.open() as body, archive.open(info, "w") as target:
+                shutil.copyfileobj(body, target)
+    return len(seen_slugs)
@@ -0,0 +1,334 @@
+"""
+Local record of the recipes kptncook created in Mealie.
+
+The ledger maps kptncook oids to the Mealie slug, id and content hash of the
+recipe created for them, so a sync does not have to fetch the details of every
+Mealie recipe to find out which ones came from kptncook. It is only a cache:
+reconciliation against one paged listing drops entries for recipes deleted in
+Mealie and looks up slugs it has never seen; a missing or broken ledger file is
+rebuilt from scratch.
+
+The journal next to it holds the recipes whose creation is in flight: the slug
+of the empty recipe ("trunk") created first, the last finished phase and the
+step images uploaded so far. A sync that was interrupted resumes those recipes
+where they stopped instead of creating them again.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import httpx
+
+from .atomic_files import write_atomically
+from .mealie import KPTNCOOK_TAG, CreateCheckpoint, MealieApiClient, RecipeAsset
+
+logger = logging.getLogger(__name__)
+
+LEDGER_FILENAME = "mealie_ledger.json"
+LEDGER_VERSION = 1
+JOURNAL_FILENAME = "mealie_journal.json"
+JOURNAL_VERSION = 1
+
+
+def _write_json_atomically(path: Path, payload: str, description: str) -> None:
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomically(path, payload)
+    except OSError as exc:
+        logger.warning("Could not write %s %s: %s", description, path, exc)
+
+
+@dataclass
+class LedgerEntry:
+    slug: str
+    recipe_id: str | None = None
+    content_hash: str | None = None
+    # Hash of the stored kptncook recipe the Mealie recipe was converted from.
+    source_hash: str | None = None
+    # Set for recipes not written by a sync (bulk imports): the next sync
+    # updates them whatever their hashes say.
+    pending_update: bool = False
+
+
+class MealieLedger:
+    def __init__(self, path: Path, mealie_url: str) -> None:
+        self.path = Path(path)
+        self.mealie_url = mealie_url
+        self._lock = threading.Lock()
+        self.entries: dict[str, LedgerEntry] = {}
+        # Slugs of recipes that did not come from kptncook.
+        self.foreign_slugs: set[str] = set()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as exc:
+            logger.warning("Ignoring unreadable Mealie ledger %s: %s", self.path, exc)
+            return
+        if not isinstance(raw, dict) or raw.get("version") != LEDGER_VERSION:
+            return
+        if raw.get("mealie_url") != self.mealie_url:
+            # A ledger for another Mealie instance says nothing about this one.
+            return
+        try:
+            self.entries = {
+                oid: LedgerEntry(**entry) for oid, entry in raw["recipes"].items()
+            }
+            self.foreign_slugs = set(raw.get("foreign_slugs", []))
+        except (KeyError, TypeError, AttributeError) as exc:
+            logger.warning("Ignoring invalid Mealie ledger %s: %s", self.path, exc)
+            self.entries = {}
+            self.foreign_slugs = set()
+
+    def __contains__(self, oid: object) -> bool:
+        return oid in self.entries
+
+    def get(self, oid: str) -> LedgerEntry | None:
+        return self.entries.get(oid)
+
+    @property
+    def known_slugs(self) -> set[str]:
+        return {entry.slug for entry in self.entries.values()} | self.foreign_slugs
+
+    def record(
+        self,
+        oid: str,
+        slug: str,
+        *,
+        recipe_id: object = None,
+        content_hash: str | None = None,
+    ) -> None:
+        with self._lock:
+            self.entries[oid] = LedgerEntry(
+                slug=slug,
+                recipe_id=None if recipe_id is None else str(recipe_id),
+                content_hash=content_hash,
+            )
+            self.foreign_slugs.discard(slug)
+
+    def mark_pending_update(self, oid: str) -> None:
+        with self._lock:
+            entry = self.entries.get(oid)
+            if entry is not None:
+                entry.pending_update = True
+
+    def set_source_hash(self, oid: str, source_hash: str) -> None:
+        with self._lock:
+            entry = self.entries.get(oid)
+            if entry is not None:
+                entry.source_hash = source_hash
+
+    def record_foreign(self, slug: str) -> None:
+        with self._lock:
+            self.foreign_slugs.add(slug)
+
+    def forget(self, oid: str) -> None:
+        with self._lock:
+            self.entries.pop(oid, None)
+
+    def retain_slugs(self, present_slugs: set[str]) -> int:
+        """
+        Drop entries whose recipe no longer exists in Mealie.
+        """
+        with self._lock:
+            stale = [
+                oid
+                for oid, entry in self.entries.items()
+                if entry.slug not in present_slugs
+            ]
+            for oid in stale:
+                del self.entries[oid]
+            self.foreign_slugs &= present_slugs
+        return len(stale)
+
+    def save(self) -> None:
+        with self._lock:
+            payload = json.dumps(
+                {
+                    "version": LEDGER_VERSION,
+                    "mealie_url": self.mealie_url,
+                    "recipes": {
+                        oid: asdict(entry)
+                        for oid, entry in sorted(self.entries.items())
+                    },
+                    "foreign_slugs": sorted(self.foreign_slugs),
+                }
+            )
+        _write_json_atomically(self.path, payload, "Mealie ledger")
+
+
+class MealieJournal:
+    def __init__(self, path: Path, mealie_url: str) -> None:
+        self.path = Path(path)
+        self.mealie_url = mealie_url
+        self._lock = threading.Lock()
+        # Writes are ordered by the snapshot they carry, so an older snapshot
+        # never replaces a newer one written by another worker.
+        self._write_lock = threading.Lock()
+        self._generation = 0
+        self._written_generation = 0
+        self.entries: dict[str, CreateCheckpoint] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as exc:
+            logger.warning("Ignoring unreadable Mealie journal %s: %s", self.path, exc)
+            return
+        if not isinstance(raw, dict) or raw.get("version") != JOURNAL_VERSION:
+            return
+        if raw.get("mealie_url") != self.mealie_url:
+            return
+        try:
+            self.entries = {
+                oid: self._bind(
+                    CreateCheckpoint(
+                        slug=entry["slug"],
+                        phase=entry["phase"],
+                        assets=[
+                            RecipeAsset.model_validate(asset)
+                            for asset in entry.get("assets", [])
+                        ],
+                    ),
+                )
+                for oid, entry in raw["recipes"].items()
+            }
+        except (KeyError, TypeError, AttributeError, ValueError) as exc:
+            logger.warning("Ignoring invalid Mealie journal %s: %s", self.path, exc)
+            self.entries = {}
+
+    def _bind(self, checkpoint: CreateCheckpoint) -> CreateCheckpoint:
+        checkpoint.on_change = lambda _checkpoint: self.save()
+        return checkpoint
+
+    def checkpoint(self, oid: str) -> CreateCheckpoint:
+        """
+        Return the checkpoint to create ``oid`` with, resuming an earlier one.
+        """
+        with self._lock:
+            if oid not in self.entries:
+                self.entries[oid] = self._bind(CreateCheckpoint())
+            return self.entries[oid]
+
+    def finish(self, oid: str) -> None:
+        with self._lock:
+            removed = self.entries.pop(oid, None)
+        if removed is not None:
+            self.save()
+
+    def save(self) -> None:
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            payload = json.dumps(
+                {
+                    "version": JOURNAL_VERSION,
+                    "mealie_url": self.mealie_url,
+                    "recipes": {
+                        oid: {
+                            "slug": checkpoint.slug,
+                            "phase": checkpoint.phase,
+                            "assets": [
+                                asset.model_dump(mode="json")
+                                for asset in checkpoint.assets
+                            ],
+                        }
+                        for oid, checkpoint in sorted(self.entries.items())
+                        # Nothing exists in Mealie before the trunk is created.
+                        if checkpoint.slug
+                    },
+                }
+            )
+        with self._write_lock:
+            if generation < self._written_generation:
+                return
+            _write_json_atomically(self.path, payload, "Mealie journal")
+            self._written_generation = generation
+
+
+def discard_orphan_trunks(
+    journal: MealieJournal,
+    ledger: MealieLedger,
+    client: MealieApiClient,
+    resumable_oids: set[str],
+) -> int:
+    """
+    Delete half-created recipes that will not be resumed and return their count.
+
+    A journal entry whose recipe ended up in the ledger was completed after its
+    last checkpoint, so only the entry is dropped. Trunks of recipes that are no
+    longer going to be created are deleted from Mealie.
+    """
+    deleted = 0
+    for oid, checkpoint in list(journal.entries.items()):
+        if oid in resumable_oids:
+            continue
+        entry = ledger.get(oid)
+        if checkpoint.slug and (entry is None or entry.slug != checkpoint.slug):
+            try:
+                client.delete_via_slug(checkpoint.slug)
+            except httpx.HTTPStatusError as exc:
+                if exc.response.status_code != 404:
+                    logger.warning(
+                        "Could not delete unfinished Mealie recipe %s: %s",
+                        checkpoint.slug,
+                        exc,
+                    )
+                    continue
+            except httpx.HTTPError as exc:
+                logger.warning(
+                    "Could not delete unfinished Mealie recipe %s: %s",
+                    checkpoint.slug,
+                    exc,
+                )
+                continue
+            deleted += 1
+        journal.finish(oid)
+    return deleted
+
+
+def reconcile_ledger(ledger: MealieLedger, client: MealieApiClient) -> set[str]:
+    """
+    Bring the ledger in line with Mealie and return the kptncook oids present.
+
+    Needs one paged listing of the recipes tagged ``kptncook`` (or of every
+    recipe when the server cannot filter by tag); only slugs the ledger has
+    never seen are fetched in detail to read their ``extras``.
+    """
+    summaries, _ = client.get_recipes_with_tag(KPTNCOOK_TAG)
+    present_slugs = {summary.slug for summary in summaries if summary.slug}
+    removed = ledger.retain_slugs(present_slugs)
+    if removed:
+        logger.info("Dropped %d deleted recipes from the Mealie ledger", removed)
+    known_slugs = ledger.known_slugs
+    for summary in summaries:
+        if not summary.slug or summary.slug in known_slugs:
+            continue
+        try:
+            recipe = client.get_via_slug(summary.slug)
+        except httpx.HTTPError as exc:
+            # Not recorded either way, so the next sync retries it.
+            logger.warning("Could not inspect Mealie recipe %s: %s", summary.slug, exc)
+            continue
+        kptncook_id = recipe.extras.get("kptncook_id")
+        if recipe.extras.get("source") == "kptncook" and kptncook_id:
+            ledger.record(
+                str(kptncook_id),
+                recipe.slug,
+                recipe_id=recipe.id,
+                content_hash=recipe.extras.get("kptncook_hash"),
+            )
+        else:
+            ledger.record_foreign(summary.slug)
+    return set(ledger.entries)
@@ -0,0 +1,144 @@
+"""
+Match ingredient names against existing Mealie foods and units.
+
+KptnCook spells the same ingredient in several ways ("Zwiebel", "Zwiebeln",
+"Frühlings-Zwiebel"). Matching them by exact name creates a new Mealie food for
+every variant, so names are compared by a normalized key instead: accents are
+transliterated, punctuation and spaces dropped, and simple German and English
+plural endings stripped from the end. Names whose keys differ get a trigram
+similarity score and match when it reaches the threshold. An alias file maps
+names that look different but mean the same thing ("Lauchzwiebel" ->
+"Frühlingszwiebel").
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Generic, Protocol, TypeVar
+
+from unidecode import unidecode
+
+DEFAULT_MATCH_THRESHOLD = 0.85
+# Shorter keys ("g", "el", "tl") only match exactly: a typo is a different unit.
+MIN_FUZZY_KEY_LENGTH = 4
+_GERMAN_SUFFIXES = ("en", "n", "e")
+_MIN_STEM_LENGTH = 4
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class AliasFileError(ValueError):
+    """Raised when an alias file cannot be read or has the wrong shape."""
+
+
+class Named(Protocol):
+    name: str
+
+
+T = TypeVar("T", bound=Named)
+
+
+def _strip_suffix(word: str, suffixes: tuple[str, ...]) -> str:
+    for suffix in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM_LENGTH:
+            return word[: -len(suffix)]
+    return word
+
+
+def _stem(word: str) -> str:
+    # The English "s" goes first, so that the singular and the plural reach the
+    # German endings in the same form: "Champignons" and "Champignon" both
+    # lose the "n" after the "s" is gone, and end up with one key.
+    return _strip_suffix(_strip_suffix(word, ("s",)), _GERMAN_SUFFIXES)
+
+
+def match_key(name: str) -> str:
+    # Words are joined before stemming: only the end of a compound inflects
+    # ("Frühlings-Zwiebeln" and "Frühlingszwiebel" share one key).
+    return _stem("".join(_WORD.findall(unidecode(name).casefold())))
+
+
+def _trigrams(key: str) -> set[str]:
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def load_aliases(path: Path) -> dict[str, str]:
+    """
+    Read a JSON object mapping alias names to the names to use instead.
+    """
+    try:
+        raw = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError) as exc:
+        raise AliasFileError(f"Could not read alias file {path}: {exc}") from exc
+    if not isinstance(raw, dict) or not all(
+        isinstance(key, str) and isinstance(value, str) for key, value in raw.items()
+    ):
+        raise AliasFileError(
+            f"Alias file {path} must contain a JSON object of names to names"
+        )
+    return raw
+
+
+class NameMatchingIndex(Generic[T]):
+    def __init__(
+        self,
+        items: Iterable[T] = (),
+        *,
+        threshold: float = DEFAULT_MATCH_THRESHOLD,
+        aliases: dict[str, str] | None = None,
+    ) -> None:
+        self.threshold = threshold
+        self._aliases = {
+            match_key(alias): canonical for alias, canonical in (aliases or {}).items()
+        }
+        self._by_key: dict[str, T] = {}
+        self._trigram_keys: dict[str, set[str]] = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, item: T) -> None:
+        key = match_key(item.name)
+        if not key or key in self._by_key:
+            return
+        self._by_key[key] = item
+        for trigram in _trigrams(key):
+            self._trigram_keys.setdefault(trigram, set()).add(key)
+
+    def canonical_name(self, name: str) -> str:
+        """
+        Return the name an alias stands for, or ``name`` itself.
+        """
+        return self._aliases.get(match_key(name), name)
+
+    def match(self, name: str) -> T | None:
+        key = match_key(self.canonical_name(name))
+        if not key:
+            return None
+        if key in self._by_key:
+            return self._by_key[key]
+        if len(key) < MIN_FUZZY_KEY_LENGTH:
+            return None
+        trigrams = _trigrams(key)
+        shared: dict[str, int] = {}
+        for trigram in trigrams:
+            for candidate in self._trigram_keys.get(trigram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        best_key, best_score = None, 0.0
+        for candidate, count in shared.items():
+            if len(candidate) < MIN_FUZZY_KEY_LENGTH:
+                continue
+            union = len(trigrams) + len(_trigrams(candidate)) - count
+            score = count / union
+            # Ties go to the shorter, more general name.
+            if score > best_score or (
+                score == best_score
+                and best_key is not None
+                and len(candidate) < len(best_key)
+            ):
+                best_key, best_score = candidate, score
+        if best_key is None or best_score < self.threshold:
+            return None
+        return self._by_key[best_key]
@@ -5,63 +5,48 @@ file format:
     1. export recipe to json
     2. compress file as gz: naming convention: a_recipe_name.paprikarecipe (Singular)
     3. zip this file as some_recipes.paprikarecipes (Plural!)
+
+Each recipe is compressed in memory and written to the archive as soon as it
+is rendered; the archive is renamed into place once it is complete. Covers are
+downloaded a few recipes ahead, so up to twice ``concurrency`` recipes, with
+their covers encoded as base64, are held in memory at a time. A manifest
+next to it records the content of each recipe, and an archive whose recipes
+are all unchanged is left as it is.
 """
 
 import base64
-import glob
 import gzip
 import json
 import logging
-import os
 import re
 import secrets
-import tempfile
+import zipfile
+from collections.abc import Callable, Iterable, Iterator, Mapping
 from datetime import datetime
+from functools import cached_property
 from pathlib import Path
 from typing import Any
 
-import httpx
-from jinja2 import Template
-
-from kptncook.config import get_settings
+from kptncook.atomic_files import replacing
+from kptncook.export_manifest import ExportManifest, ExportReport, content_hash
 from kptncook.exporter_utils import (
     asciify_string,
     get_cover,
-    get_step_text,
-    move_to_target_dir,
-    write_zip,
+    iter_prefetched,
+)
+from kptncook.image_cache import ImageCache, get_image_cache
+from kptncook.ingredient_groups import (
+    get_ingredient_group_labels,
+    iter_ingredient_groups,
 )
-from kptncook.ingredient_groups import iter_ingredient_groups
 from kptncook.models import Image, Ingredient, Recipe, localized_fallback
-
-PAPRIKA_RECIPE_TEMPLATE = """{
-   "uid":"{{recipe.id.oid}}",
-   "name":"{{localized_fallback(recipe.localized_title)|default('',true)}}",
-   "directions": "{% for step in recipe.steps %}{{get_step_text(step)|default('',true)}}\\n{% endfor %}",
-   "servings":"2",
-   "rating":0,
-   "difficulty":"",
-   "ingredients":"{{ingredients_text}}",
-   "notes":"",
-   "created":"{{dtnow}}",
-   "image_url":null,
-   "cook_time":"{{recipe.cooking_time|default('',true)}}",
-   "prep_time":"{{recipe.preparation_time|default('',true)}}",
-   "source":"Kptncook",
-   "source_url":"",
-   "hash" : "{{hash}}",
-   "photo_hash":null,
-   "photos":[],
-   "photo": "{{cover_filename}}",
-   "nutritional_info":"{% for nutrient, amount in recipe.recipe_nutrition %}{{nutrient}}: {{amount}}\\n{% endfor %}",
-   "photo_data":"{{cover_img}}",
-   "photo_large":null,
-   "categories":["Kptncook"]
-}
-"""  # noqa: E501
+from kptncook.recipe_view import RecipeView, find_view
 
 logger = logging.getLogger(__name__)
-IMAGE_DOWNLOAD_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+COVER_DOWNLOAD_CONCURRENCY = 4
+MANIFEST_FILENAME = ".kptncook-paprika.json"
+# Fields that change on every export and are left out of the content hash.
+GENERATED_FIELDS = ("created", "hash")
 
 
 class GeneratedData:
@@ -76,25 +61,92 @@ class GeneratedData:
 
 class PaprikaExporter:
     invalid_control_chars = re.compile(r"[\x00-\x08\x0B-\x0C\x0E-\x1F\x7F-\x9F]")
-    template = Template(PAPRIKA_RECIPE_TEMPLATE, trim_blocks=True)
-    unescaped_newline = re.compile(r"(?<!\\)\n")
-
-    def export(self, recipes: list[Recipe]) -> str:
-        export_data = self.get_export_data(recipes=recipes)
-        filename = self.get_export_filename(export_data=export_data, recipes=recipes)
-        tmp_dir = tempfile.mkdtemp()
-        filename_full_path = self.save_recipes(
-            export_data=export_data, directory=tmp_dir, filename=filename
-        )
-        move_to_target_dir(
-            source=filename_full_path, target=os.path.join(str(Path.cwd()), filename)
-        )
-        return filename
 
-    def get_export_filename(
-        self, export_data: dict[str, str], recipes: list[Recipe]
+    def __init__(
+        self,
+        image_cache: ImageCache | None = None,
+        views: Mapping[str, RecipeView] | None = None,
+    ) -> None:
+        self._image_cache = image_cache
+        self.views = views
+
+    @property
+    def image_cache(self) -> ImageCache:
+        # Looked up on first use, so exporting without covers needs no cache.
+        if self._image_cache is None:
+            self._image_cache = get_image_cache()
+        return self._image_cache
+
+    @cached_property
+    def group_labels(self) -> dict[str, str] | None:
+        # Read from the settings once per exporter, not once per recipe.
+        return get_ingredient_group_labels()
+
+    def get_view(self, recipe: Recipe) -> RecipeView:
+        view = find_view(self.views, recipe)
+        if view is None:
+            view = RecipeView.from_recipe(recipe, self.group_labels, self.image_cache)
+        return view
+
+    def export(
+        self, recipes: list[Recipe], concurrency: int = COVER_DOWNLOAD_CONCURRENCY
     ) -> str:
-        if len(export_data) == 1:
+        report = self.export_changes(recipes=recipes, concurrency=concurrency)
+        return report.paths[0].name
+
+    def export_changes(
+        self, recipes: list[Recipe], concurrency: int = COVER_DOWNLOAD_CONCURRENCY
+    ) -> ExportReport:
+        """Export the recipes and count which of them changed.
+
+        Paprika imports whole archives, so the archive is rewritten when any
+        recipe changed, was added or was left out since the last export.
+        ``concurrency`` covers are downloaded at a time.
+        """
+        path = Path.cwd() / self.get_export_filename(recipes=recipes)
+        manifest = ExportManifest(path.parent, MANIFEST_FILENAME, shared_file=True)
+        previous_oids = {
+            oid for oid, entry in manifest.entries.items() if entry.path == path.name
+        }
+        exported_oids: set[str] = set()
+        report = ExportReport(paths=[path])
+
+        def tracked() -> Iterator[tuple[str, str]]:
+            for oid, data in self.iter_recipe_data(
+                recipes=recipes, concurrency=concurrency
+            ):
+                digest = content_hash(
+                    json.dumps(
+                        {
+                            key: value
+                            for key, value in data.items()
+                            if key not in GENERATED_FIELDS
+                        },
+                        ensure_ascii=False,
+                        sort_keys=True,
+                    )
+                )
+                if manifest.is_unchanged(oid, path, digest):
+                    report.skipped += 1
+                else:
+                    report.written += 1
+                    manifest.record(oid, path, digest)
+                exported_oids.add(oid)
+                yield oid, json.dumps(data, ensure_ascii=False)
+
+        self.save_recipes(
+            export_data=tracked(),
+            path=path,
+            unchanged=lambda: not report.written and exported_oids == previous_oids,
+        )
+        removed_oids = previous_oids - exported_oids
+        manifest.forget(removed_oids)
+        report.removed = len(removed_oids)
+        manifest.save()
+        return report
+
+    def get_export_filename(self, recipes: list[Recipe]) -> str:
+        if len(recipes) == 1:
             return (
                 asciify_string(
                     s=localized_fallback(recipes[0].localized_title) or "recipe"
@@ -111,36 +163,74 @@ class PaprikaExporter:
         hash = secrets.token_hex(32)
         return GeneratedData(cover_filename, cover_img, dtnow, hash)
 
-    def get_recipe_as_json_string(self, recipe: Recipe) -> str:
-        generated = self.get_generated_data(recipe=recipe)
-        ingredients_text = self.get_ingredients_text(recipe.ingredients)
-        recipe_as_json = self.template.render(
-            recipe=recipe,
-            localized_fallback=localized_fallback,
-            get_step_text=get_step_text,
-            dtnow=generated.dtnow,
-            cover_filename=generated.cover_filename,
-            hash=generated.hash,
-            cover_img=generated.cover_img,
-            ingredients_text=ingredients_text,
+    def get_recipe_as_json_string(
+        self, recipe: Recipe, generated: GeneratedData | None = None
+    ) -> str:
+        if generated is None:
+            generated = self.get_generated_data(recipe=recipe)
+        return json.dumps(
+            self.get_recipe_data(recipe=recipe, generated=generated),
+            ensure_ascii=False,
+        )
+
+    def clean_text(self, text: str | None) -> str:
+        """Drop control characters and turn line breaks into spaces."""
+        return self.invalid_control_chars.sub("", text or "").replace("\n", " ")
+
+    def get_recipe_data(
+        self, recipe: Recipe, generated: GeneratedData
+    ) -> dict[str, Any]:
+        """Build the recipe in the layout of a Paprika recipe export."""
+        view = self.get_view(recipe)
+        directions = "".join(f"{self.clean_text(text)}\n" for text in view.step_texts)
+        nutritional_info = "".join(
+            f"{nutrient}: {amount}\n" for nutrient, amount in recipe.recipe_nutrition
         )
-        recipe_as_json = self.invalid_control_chars.sub("", recipe_as_json)
-        recipe_as_json = self.unescaped_newline.sub(" ", recipe_as_json)
-        json.loads(recipe_as_json)  # check if valid json
-        return recipe_as_json
+        return {
+            "uid": str(recipe.id.oid),
+            "name": self.clean_text(view.title),
+            "directions": directions,
+            "servings": "2",
+            "rating": 0,
+            "difficulty": "",
+            "ingredients": self.get_ingredients_text(
+                recipe.ingredients, view.ingredient_groups
+            ),
+            "notes": "",
+            "created": generated.dtnow,
+            "image_url": None,
+            "cook_time": str(recipe.cooking_time or ""),
+            "prep_time": str(recipe.preparation_time or ""),
+            "source": "Kptncook",
+            "source_url": "",
+            "hash": generated.hash,
+            "photo_hash": None,
+            "photos": [],
+            "photo": generated.cover_filename,
+            "nutritional_info": nutritional_info,
+            "photo_data": generated.cover_img,
+            "photo_large": None,
+            "categories": ["Kptncook"],
+        }
 
-    def get_ingredients_text(self, ingredients: list[Ingredient]) -> str:
+    def get_ingredients_text(
+        self,
+        ingredients: list[Ingredient],
+        groups: list[tuple[str | None, list[Ingredient]]] | None = None,
+    ) -> str:
+        if groups is None:
+            groups = iter_ingredient_groups(ingredients)
         lines = []
-        for group_label, group_ingredients in iter_ingredient_groups(ingredients):
+        for group_label, group_ingredients in groups:
             if group_label:
-                lines.append(f"{group_label}:")
+                lines.append(f"{self.clean_text(group_label)}:")
             for ingredient in group_ingredients:
-                line = self.format_ingredient_line(ingredient)
+                line = self.clean_text(self.format_ingredient_line(ingredient))
                 if line:
                     lines.append(line)
         if not lines:
             return ""
-        return "\\n".join(lines) + "\\n"
+        return "\n".join(lines) + "\n"
 
     def format_ingredient_line(self, ingredient: Ingredient) -> str:
         parts: list[str] = []
@@ -156,28 +246,63 @@ class PaprikaExporter:
         return " ".join(part for part in parts if part).strip()
 
     def get_export_data(self, recipes: list[Recipe]) -> dict[str, str]:
-        export_data = dict()
-        for recipe in recipes:
-            try:
-                recipe_as_json = self.get_recipe_as_json_string(recipe=recipe)
-                export_data[str(recipe.id.oid)] = recipe_as_json
-            except json.JSONDecodeError as e:
-                logger.warning("Could not parse recipe %s: %s", recipe.id.oid, e)
-        return export_data
+        return dict(self.iter_export_data(recipes=recipes))
+
+    def iter_export_data(self, recipes: list[Recipe]) -> Iterator[tuple[str, str]]:
+        """Yield the id and JSON of each recipe, skipping repeated ids."""
+        for oid, data in self.iter_recipe_data(recipes=recipes):
+            yield oid, json.dumps(data, ensure_ascii=False)
+
+    def iter_recipe_data(
+        self, recipes: list[Recipe], concurrency: int = COVER_DOWNLOAD_CONCURRENCY
+    ) -> Iterator[tuple[str, dict[str, Any]]]:
+        """Yield the id and data of each recipe, skipping repeated ids.
+
+        Covers are downloaded ``concurrency`` at a time while earlier recipes
+        are rendered; up to twice as many recipes are held ahead, each with its
+        cover as base64.
+        """
+        seen: set[str] = set()
+        prefetched = iter_prefetched(
+            recipes,
+            lambda recipe: self.get_generated_data(recipe=recipe),
+            concurrency=concurrency,
+        )
+        for recipe, generated in prefetched:
+            oid = str(recipe.id.oid)
+            if oid in seen:
+                continue
+            seen.add(oid)
+            yield oid, self.get_recipe_data(recipe=recipe, generated=generated.result())
 
     def save_recipes(
-        self, export_data: dict[str, Any], filename: str, directory: str
-    ) -> str:
-        for id, recipe_as_json in export_data.items():
-            recipe_as_gz = os.path.join(directory, "recipe_" + id + ".paprikarecipe")
-            with gzip.open(recipe_as_gz, "wb") as f:
-                f.write(recipe_as_json.encode("utf-8"))
-        filename_full_path = os.path.join(directory, filename)
-        gz_files = glob.glob(os.path.join(directory, "*.paprikarecipe"))
-        logger.debug("Paprika export files: %s", gz_files)
-        entries = [(Path(gz_file).name, Path(gz_file)) for gz_file in gz_files]
-        write_zip(Path(filename_full_path), entries)
-        return filename_full_path
+        self,
+        export_data: Iterable[tuple[str, str]],
+        path: Path,
+        unchanged: Callable[[], bool] | None = None,
+    ) -> Path:
+        """Write the recipes to a ``.paprikarecipes`` archive at ``path``.
+
+        Recipes are gzip-compressed one at a time and stored in the zip as they
+        come in. The archive is written next to ``path`` and renamed into place,
+        so an interrupted export leaves any earlier file untouched. If
+        ``unchanged`` returns true once all recipes are written, an existing
+        archive is kept instead.
+        """
+        path = Path(path)
+        with replacing(path) as temp_path:
+            # The entries are gzip files already; deflating them again gains nothing.
+            with zipfile.ZipFile(
+                temp_path, "w", compression=zipfile.ZIP_STORED, allowZip64=True
+            ) as archive:
+                for oid, recipe_as_json in export_data:
+                    archive.writestr(
+                        f"recipe_{oid}.paprikarecipe",
+                        gzip.compress(recipe_as_json.encode("utf-8")),
+                    )
+            if unchanged is not None and unchanged() and path.exists():
+                temp_path.unlink()
+        return path
 
     def get_cover_img_as_base64_string(
         self, recipe: Recipe
@@ -185,24 +310,11 @@ class PaprikaExporter:
         cover = get_cover(image_list=recipe.image_list)
         if cover is None:
             raise ValueError("No cover image found")
-        cover_url = recipe.get_image_url(api_key=get_settings().kptncook_api_key)
-        if not isinstance(cover_url, str):
-            raise ValueError("Cover URL must be a string")
-        try:
-            response = httpx.get(cover_url, timeout=IMAGE_DOWNLOAD_TIMEOUT)
-            response.raise_for_status()
-        except httpx.HTTPStatusError as exc:
-            if exc.response.status_code == 404:
-                title = localized_fallback(recipe.localized_title) or "kptncook-recipe"
-                logger.warning('Cover image for "%s" not found online any more.', title)
-            else:
-                logger.error(
-                    "HTTP error while fetching cover image (%s): %s",
-                    exc.response.status_code,
-                    exc,
-                )
+        # The view logs why a cover could not be loaded.
+        content = self.get_view(recipe).cover_bytes()
+        if content is None:
             return None, None
-        return cover.name, base64.b64encode(response.content).decode("utf-8")
+        return cover.name, base64.b64encode(content).decode("utf-8")
 
     def asciify_string(self, s: str) -> str:
         return asciify_string(s)
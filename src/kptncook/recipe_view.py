@@ -0,0 +1,198 @@
+"""
+Per-recipe values shared by the exporters of a multi-target export.
+
+Exporting one repository to several formats derives the same values from
+every recipe in each exporter: the localized title, the step texts, the
+ingredient groups and the cover image. ``build_recipe_views`` computes them
+once per recipe, downloading covers concurrently, and the exporters read them
+from the views they are given. An exporter without a view for a recipe builds
+one on demand with ``RecipeView.from_recipe``; its values are derived when
+first read and its cover is loaded from the image cache.
+
+A shared view keeps the cover as the cached image file rather than its bytes,
+so a large repository does not hold every cover in memory at once. The file is
+pinned in the cache until ``release_recipe_views`` is called, so downloading
+later covers cannot evict it.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections.abc import Callable, Iterable, Mapping
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import TypeVar
+
+import httpx
+
+from .config import get_settings
+from .exporter_utils import get_cover, get_step_text, iter_prefetched
+from .image_cache import CachedImage, ImageCache
+from .ingredient_groups import get_ingredient_group_labels, group_ingredients
+from .models import Ingredient, Recipe, localized_fallback
+
+logger = logging.getLogger(__name__)
+
+COVER_DOWNLOAD_CONCURRENCY = 8
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class RecipeView:
+    recipe: Recipe
+    group_labels: dict[str, str] | None
+    cover: CachedImage | None = None
+    # Set on views built on demand: their cover is loaded when it is read.
+    image_cache: ImageCache | None = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_recipe(
+        cls,
+        recipe: Recipe,
+        group_labels: dict[str, str] | None,
+        image_cache: ImageCache | None = None,
+    ) -> RecipeView:
+        return cls(recipe=recipe, group_labels=group_labels, image_cache=image_cache)
+
+    @cached_property
+    def title(self) -> str | None:
+        return localized_fallback(self.recipe.localized_title)
+
+    @cached_property
+    def step_texts(self) -> list[str]:
+        return [get_step_text(step) for step in self.recipe.steps]
+
+    @cached_property
+    def ingredient_groups(self) -> list[tuple[str | None, list[Ingredient]]]:
+        return group_ingredients(self.recipe.ingredients, self.group_labels)
+
+    def cover_bytes(self) -> bytes | None:
+        """
+        Return the cover image, or ``None`` if there is none or it is unreadable.
+        """
+        if self.cover is not None:
+            try:
+                return self.cover.read_bytes()
+            except OSError as exc:
+                logger.warning(
+                    'Could not read cover image for "%s": %s',
+                    self.title or "kptncook-recipe",
+                    exc,
+                )
+                return None
+        if self.image_cache is not None:
+            return _load_cover(self.recipe, self.image_cache.get)
+        return None
+
+
+def find_view(
+    views: Mapping[str, RecipeView] | None, recipe: Recipe
+) -> RecipeView | None:
+    """
+    Return the view built from this very ``recipe`` object, if any.
+
+    Views are keyed by id; a different recipe object with the same id (an
+    edited copy, say) does not get the view of the other one.
+    """
+    if not views:
+        return None
+    view = views.get(str(recipe.id.oid))
+    if view is None or view.recipe is not recipe:
+        return None
+    return view
+
+
+def view_for(
+    views: Mapping[str, RecipeView] | None,
+    recipe: Recipe,
+    group_labels: dict[str, str] | None,
+    image_cache: ImageCache | None = None,
+) -> RecipeView:
+    """
+    Return the shared view of ``recipe``, or build one on demand.
+    """
+    view = find_view(views, recipe)
+    if view is None:
+        view = RecipeView.from_recipe(recipe, group_labels, image_cache)
+    return view
+
+
+def _load_cover(recipe: Recipe, load: Callable[[str], T]) -> T | None:
+    if get_cover(image_list=recipe.image_list) is None:
+        return None
+    cover_url = recipe.get_image_url(api_key=get_settings().kptncook_api_key)
+    if cover_url is None:
+        return None
+    title = localized_fallback(recipe.localized_title) or "kptncook-recipe"
+    try:
+        return load(cover_url)
+    except httpx.HTTPStatusError as exc:
+        if exc.response.status_code == 404:
+            logger.warning('Cover image for "%s" not found online any more.', title)
+        else:
+            logger.warning(
+                'HTTP error while fetching cover image for "%s" (%s): %s',
+                title,
+                exc.response.status_code,
+                exc,
+            )
+    except httpx.RequestError as exc:
+        logger.warning(
+            'Network error while fetching cover image for "%s": %s', title, exc
+        )
+    except OSError as exc:
+        logger.warning('Could not read cover image for "%s": %s', title, exc)
+    return None
+
+
+def fetch_cover(
+    recipe: Recipe, image_cache: ImageCache, *, pin: bool = False
+) -> CachedImage | None:
+    """
+    Return the cached cover of ``recipe``, or ``None`` if it has none or the
+    download failed. With ``pin`` the file stays in the cache until unpinned.
+    """
+    return _load_cover(recipe, lambda url: image_cache.fetch(url, pin=pin))
+
+
+def build_recipe_views(
+    recipes: Iterable[Recipe],
+    image_cache: ImageCache,
+    concurrency: int = COVER_DOWNLOAD_CONCURRENCY,
+) -> dict[str, RecipeView]:
+    """
+    Build one view per recipe id, downloading covers ``concurrency`` at a time.
+
+    The covers stay pinned in ``image_cache`` until ``release_recipe_views``.
+    """
+    group_labels = get_ingredient_group_labels()
+    views: dict[str, RecipeView] = {}
+    prefetched = iter_prefetched(
+        recipes,
+        lambda recipe: fetch_cover(recipe, image_cache, pin=True),
+        concurrency=concurrency,
+    )
+    for recipe, cover in prefetched:
+        oid = str(recipe.id.oid)
+        previous = views.get(oid)
+        if previous is not None and previous.cover is not None:
+            image_cache.unpin(previous.cover.digest)
+        view = RecipeView(
+            recipe=recipe, group_labels=group_labels, cover=cover.result()
+        )
+        # Derived here, once, rather than by the exporter threads reading them.
+        _ = view.title, view.step_texts, view.ingredient_groups
+        views[oid] = view
+    return views
+
+
+def release_recipe_views(
+    views: Mapping[str, RecipeView], image_cache: ImageCache
+) -> None:
+    """
+    Unpin the covers of views built by ``build_recipe_views``.
+    """
+    for view in views.values():
+        if view.cover is not None:
+            image_cache.unpin(view.cover.digest)
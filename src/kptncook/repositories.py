@@ -7,7 +7,7 @@ remote api, maybe mealie... hmm.
 
 import os
 import shutil
-import tempfile
+import threading
 from contextlib import contextmanager
 from datetime import date
 from pathlib import Path
@@ -19,7 +19,9 @@ try:
 except ImportError:  # pragma: no cover - only used on platforms without fcntl
     fcntl = None  # type: ignore[assignment]
 
-from pydantic import BaseModel, RootModel, ValidationError
+from pydantic import BaseModel, RootModel, ValidationError, model_serializer
+
+from kptncook.atomic_files import write_atomically
 
 
 class RepositoryError(Exception):
@@ -38,11 +40,33 @@ def format_validation_error(exc: ValidationError) -> str:
 class RecipeInDb(BaseModel):
     date: date
     data: dict
+    # Discovery lists ("<type>/<id>") the recipe was crawled from, if any.
+    discovery_lists: list[str] | None = None
 
     @property
     def id(self):
         return self.data["_id"]["$oid"]
 
+    @model_serializer(mode="wrap")
+    def _omit_empty_discovery_lists(self, handler):
+        # Keep entries that were never crawled byte-identical to older files.
+        serialized = handler(self)
+        if not serialized.get("discovery_lists"):
+            serialized.pop("discovery_lists", None)
+        return serialized
+
+    def merged_with(self, existing: "RecipeInDb") -> "RecipeInDb":
+        """
+        Return this entry with discovery lists of an existing entry carried over.
+        """
+        if not existing.discovery_lists:
+            return self
+        merged = list(existing.discovery_lists)
+        for list_label in self.discovery_lists or []:
+            if list_label not in merged:
+                merged.append(list_label)
+        return self.model_copy(update={"discovery_lists": merged})
+
 
 class RecipeListInDb(RootModel):
     root: list[RecipeInDb]
@@ -54,11 +78,60 @@ class RecipeListInDb(RootModel):
         return self.root[item]
 
 
+class RepositoryCache:
+    """
+    Keep the last parsed repository file in memory.
+
+    Entries are keyed on the file's inode, size and modification time, so any
+    write (ours or another process's) invalidates them. Only worth enabling in
+    long-running processes such as the daemon.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: dict[Path, tuple[tuple[int, int, int], RecipeListInDb]] = {}
+
+    @staticmethod
+    def signature(path: Path) -> tuple[int, int, int] | None:
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def get(self, path: Path) -> RecipeListInDb | None:
+        signature = self.signature(path)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is None or signature is None or entry[0] != signature:
+            return None
+        return entry[1]
+
+    def put(
+        self,
+        path: Path,
+        models: RecipeListInDb,
+        signature: tuple[int, int, int] | None = None,
+    ) -> None:
+        if signature is None:
+            signature = self.signature(path)
+        with self._lock:
+            if signature is None:
+                self._entries.pop(path, None)
+            else:
+                self._entries[path] = (signature, models)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
 class RecipeRepository:
     name: str = "kptncook.json"
 
-    def __init__(self, base_dir: Path):
+    def __init__(self, base_dir: Path, *, cache: RepositoryCache | None = None):
         self.base_dir = Path(base_dir)
+        self.cache = cache
 
     @property
     def path(self) -> Path:
@@ -84,6 +157,10 @@ class RecipeRepository:
     ) -> dict[str, RecipeInDb]:
         return {recipe.id: recipe for recipe in recipes}
 
+    def _put(self, locked: dict[str, RecipeInDb], recipe: RecipeInDb) -> None:
+        existing = locked.get(recipe.id)
+        locked[recipe.id] = recipe if existing is None else recipe.merged_with(existing)
+
     def _fsync_directory(self) -> None:
         try:
             directory_fd = os.open(self.path.parent, os.O_RDONLY)
@@ -112,37 +189,27 @@ class RecipeRepository:
         self.create_backup()
         self._ensure_parent_dir()
         models = RecipeListInDb.model_validate(locked.values())
-        temp_path: Path | None = None
         try:
-            with tempfile.NamedTemporaryFile(
-                "w",
-                encoding="utf-8",
-                dir=self.path.parent,
-                prefix=f".{self.path.name}.",
-                suffix=".tmp",
-                delete=False,
-            ) as f:
-                temp_path = Path(f.name)
-                f.write(models.model_dump_json())
-                f.flush()
-                os.fsync(f.fileno())
-            os.replace(temp_path, self.path)
+            write_atomically(self.path, models.model_dump_json(), fsync=True)
             self._fsync_directory()
+            if self.cache is not None:
+                self.cache.put(self.path, models)
         except OSError as exc:
             raise RepositoryError(
                 f"Could not write repository file {self.path}: {exc}"
             ) from exc
-        finally:
-            if temp_path is not None:
-                try:
-                    temp_path.unlink(missing_ok=True)
-                except OSError:
-                    pass
 
     def _fetch_all(self):
         """
         Fetch dict of pydantic models from json in self.path
         """
+        signature = None
+        if self.cache is not None:
+            cached = self.cache.get(self.path)
+            if cached is not None:
+                return cached
+            # Taken before reading so a concurrent write invalidates the entry.
+            signature = RepositoryCache.signature(self.path)
         try:
             if not self.path.exists():
                 return []
@@ -155,12 +222,15 @@ class RecipeRepository:
                 f"Could not read repository file {self.path}: {exc}"
             ) from exc
         try:
-            return RecipeListInDb.model_validate_json(raw_data)
+            models = RecipeListInDb.model_validate_json(raw_data)
         except ValidationError as exc:
             raise RepositoryError(
                 f"Repository file {self.path} contains invalid data: "
                 f"{format_validation_error(exc)}"
             ) from exc
+        if self.cache is not None and signature is not None:
+            self.cache.put(self.path, models, signature)
+        return models
 
     def list_by_id(self):
         return self._build_by_id(self.list())
@@ -174,14 +244,14 @@ class RecipeRepository:
     def add(self, recipe: RecipeInDb):
         with self._write_lock():
             locked = self._build_by_id(self._fetch_all())
-            locked[recipe.id] = recipe
+            self._put(locked, recipe)
             self._write_models(locked)
 
     def add_list(self, recipes: list[RecipeInDb]):
         with self._write_lock():
             locked = self._build_by_id(self._fetch_all())
             for recipe in recipes:
-                locked[recipe.id] = recipe
+                self._put(locked, recipe)
             self._write_models(locked)
 
     def delete_by_ids(self, ids: list[str]) -> tuple[list[str], list[str]]:
@@ -11,6 +11,7 @@ from kptncook.models import Recipe
 from kptncook.repositories import (
     RecipeInDb,
     RecipeRepository,
+    RepositoryCache,
     RepositoryError,
     format_validation_error,
 )
@@ -50,8 +51,24 @@ def _log_invalid_entries(invalid_entries: list[InvalidStoredRecipe]) -> None:
         logger.warning("Skipping invalid stored recipe %s: %s", label, entry.reason)
 
 
+# Parsed repository shared by all calls while enabled (see the daemon).
+_repository_cache: RepositoryCache | None = None
+
+
+def enable_repository_cache() -> RepositoryCache:
+    global _repository_cache
+    if _repository_cache is None:
+        _repository_cache = RepositoryCache()
+    return _repository_cache
+
+
+def disable_repository_cache() -> None:
+    global _repository_cache
+    _repository_cache = None
+
+
 def get_repository() -> RecipeRepository:
-    return RecipeRepository(get_settings().root)
+    return RecipeRepository(get_settings().root, cache=_repository_cache)
 
 
 def repository_needs_sync(sync_date: date) -> bool:
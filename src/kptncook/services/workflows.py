@@ -1,29 +1,68 @@
 from __future__ import annotations
 
 import logging
-from collections.abc import Sequence
+import multiprocessing
+import tempfile
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
 from datetime import date
-from typing import Any
+from functools import partial
+from pathlib import Path
 
 import httpx
 
-from kptncook.api import KptnCookClient, _collect_recipe_identifiers, parse_id
+from kptncook.api import (
+    RECIPE_RESOLUTION_CHUNK_SIZE,
+    KptnCookClient,
+    RecipeIdentifier,
+    _collect_recipe_identifiers,
+    parse_id,
+)
 from kptncook.config import get_settings
 from kptncook.env import ENV_PATH
+from kptncook.http_client import RateLimiter, fetch_url, get_default_transport
 from kptncook.http_errors import (
     UserFacingError,
     extract_mealie_detail_message,
     format_http_status_error,
     format_request_error,
 )
+from kptncook.export_manifest import ExportReport
+from kptncook.image_cache import get_image_cache
 from kptncook.markdown_exporter import MarkdownExporter
-from kptncook.mealie import MealieApiClient, kptncook_to_mealie
+from kptncook.mealie import (
+    MealieApiClient,
+    RecipeFood,
+    RecipeTag,
+    RecipeUnit,
+    RecipeWithImage,
+    kptncook_source_hash,
+    kptncook_to_mealie,
+    mealie_recipe_hash,
+)
+from kptncook.mealie_archive import MIGRATION_TYPE, build_import_archive
+from kptncook.mealie_ledger import (
+    JOURNAL_FILENAME,
+    LEDGER_FILENAME,
+    MealieJournal,
+    MealieLedger,
+    discard_orphan_trunks,
+    reconcile_ledger,
+)
 from kptncook.models import Recipe
+from kptncook.name_matching import AliasFileError, load_aliases
 from kptncook.paprika import PaprikaExporter
 from kptncook.password_manager import get_credentials
+from kptncook.recipe_view import build_recipe_views, release_recipe_views
 from kptncook.repositories import RecipeInDb
-from kptncook.services.discovery import DiscoveryScreenData, parse_discovery_screen
+from kptncook.services.discovery import (
+    DISCOVERY_LIST_TYPES_REQUIRE_ID,
+    DiscoveryListSummary,
+    DiscoveryScreenData,
+    parse_discovery_screen,
+)
 from kptncook.services.repository import (
     InvalidStoredRecipe,
     RepositoryRecipesResult,
@@ -37,7 +76,22 @@ from kptncook.services.repository import (
 from kptncook.tandoor import TandoorExporter
 
 logger = logging.getLogger(__name__)
+SHARE_URL_PREFIX = "https://share.kptncook.com/"
+EXPORT_TARGETS = ("markdown", "tandoor", "paprika")
 SHARE_URL_TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+SHARE_URL_CONCURRENCY = 8
+DISCOVERY_CRAWL_CONCURRENCY = 4
+MEALIE_IMPORT_TIMEOUT = 30 * 60
+MEALIE_PURGE_CONCURRENCY = 4
+MEALIE_CONVERSION_PROCESS_THRESHOLD = 200
+MEALIE_CONVERSION_CHUNK_SIZE = 25
+MEALIE_PURGE_RATE = 10.0
+# Mealie item endpoints, their models and the key their names are matched by.
+_MEALIE_ITEM_KINDS: dict[str, tuple[str, type, Callable[[str], str]]] = {
+    "units": ("units", RecipeUnit, str),
+    "foods": ("foods", RecipeFood, str),
+    "tags": ("organizers/tags", RecipeTag, str.casefold),
+}
 
 
 @dataclass(frozen=True)
@@ -53,10 +107,36 @@ class SearchResult:
     recipe: RecipeInDb
 
 
+@dataclass(frozen=True)
+class BulkSearchResult:
+    found: list[SearchResult]
+    not_found: list[str]
+    invalid: list[tuple[str, str]]
+    saved_count: int
+
+
+@dataclass(frozen=True)
+class MealiePurgeResult:
+    slugs: list[str]
+    deleted: list[str]
+    failed: list[str]
+    deleted_items: dict[str, int]
+
+
 @dataclass(frozen=True)
 class SyncWithMealieResult:
     created_count: int
     invalid_repository_entries: list[InvalidStoredRecipe]
+    updated_count: int = 0
+
+
+@dataclass(frozen=True)
+class DiscoveryCrawlResult:
+    crawled_lists: list[str]
+    failed_lists: list[str]
+    skipped_lists: list[str]
+    identifier_count: int
+    saved_count: int
 
 
 @dataclass(frozen=True)
@@ -72,18 +152,42 @@ class DeleteSelectionResult:
 class PaprikaExportResult:
     filename: str
     invalid_repository_entries: list[InvalidStoredRecipe]
+    written: int = 0
+    skipped: int = 0
+    removed: int = 0
 
 
 @dataclass(frozen=True)
 class TandoorExportResult:
     filenames: list[str]
     invalid_repository_entries: list[InvalidStoredRecipe]
+    written: int = 0
+    skipped: int = 0
+    removed: int = 0
+
+
+@dataclass(frozen=True)
+class ExportTargetResult:
+    target: str
+    filenames: list[str]
+    written: int = 0
+    skipped: int = 0
+    removed: int = 0
+
+
+@dataclass(frozen=True)
+class MultiExportResult:
+    results: list[ExportTargetResult]
+    invalid_repository_entries: list[InvalidStoredRecipe]
 
 
 @dataclass(frozen=True)
 class MarkdownExportResult:
     filenames: list[str]
     invalid_repository_entries: list[InvalidStoredRecipe]
+    written: int = 0
+    skipped: int = 0
+    removed: int = 0
 
 
 def _wrap_repository_error(exc: RepositoryServiceError) -> UserFacingError:
@@ -150,7 +254,19 @@ def save_todays_recipes() -> int:
 
 def get_mealie_client() -> MealieApiClient:
     settings = get_settings()
-    client = MealieApiClient(str(settings.mealie_url))
+    item_aliases = None
+    if settings.mealie_item_aliases is not None:
+        try:
+            item_aliases = load_aliases(settings.mealie_item_aliases)
+        except AliasFileError as exc:
+            raise UserFacingError(str(exc)) from exc
+    client = MealieApiClient(
+        str(settings.mealie_url),
+        page_size=settings.mealie_page_size,
+        upload_concurrency=settings.mealie_upload_concurrency,
+        match_threshold=settings.mealie_match_threshold,
+        item_aliases=item_aliases,
+    )
     try:
         if settings.mealie_api_token:
             client.login_with_token(settings.mealie_api_token)
@@ -166,10 +282,27 @@ def get_mealie_client() -> MealieApiClient:
     )
 
 
-def get_kptncook_recipes_from_mealie(client: MealieApiClient) -> list[Any]:
-    recipes = client.get_all_recipes()
-    recipes_with_details = [client.get_via_slug(recipe.slug) for recipe in recipes]
-    return [r for r in recipes_with_details if r.extras.get("source") == "kptncook"]
+def get_mealie_ledger() -> MealieLedger:
+    settings = get_settings()
+    return MealieLedger(settings.root / LEDGER_FILENAME, str(settings.mealie_url))
+
+
+def get_mealie_journal() -> MealieJournal:
+    settings = get_settings()
+    return MealieJournal(settings.root / JOURNAL_FILENAME, str(settings.mealie_url))
+
+
+def get_kptncook_ids_in_mealie(
+    client: MealieApiClient, ledger: MealieLedger
+) -> set[str]:
+    try:
+        return reconcile_ledger(ledger, client)
+    except httpx.HTTPStatusError as exc:
+        raise UserFacingError(
+            format_http_status_error(exc.response, action="listing Mealie recipes")
+        ) from exc
+    except httpx.HTTPError as exc:
+        raise UserFacingError(format_request_error(exc)) from exc
 
 
 def get_kptncook_recipes_from_repository():
@@ -181,12 +314,16 @@ def get_recipe_from_repository_by_oid(oid: str):
 
 
 def _resolve_recipe_summaries(
-    client: KptnCookClient, items: Sequence[object], *, action: str
+    client: KptnCookClient,
+    items: Sequence[object],
+    *,
+    action: str,
+    chunk_size: int | None = None,
 ) -> list[RecipeInDb]:
     if not items:
         return []
     try:
-        return client.resolve_recipe_summaries(items)
+        return client.resolve_recipe_summaries(items, chunk_size=chunk_size)
     except httpx.HTTPStatusError as exc:
         raise UserFacingError(
             format_http_status_error(exc.response, action=action)
@@ -223,39 +360,200 @@ def _require_access_token() -> None:
         )
 
 
+def _mealie_content_hash(recipe: RecipeWithImage) -> str:
+    return recipe.extras.get("kptncook_hash") or mealie_recipe_hash(recipe)
+
+
+def _create_mealie_recipe(
+    client: MealieApiClient,
+    ledger: MealieLedger,
+    journal: MealieJournal,
+    recipe: RecipeWithImage,
+) -> str | None:
+    """
+    Create one recipe in Mealie; failures are logged and reported as ``None``.
+
+    Progress is checkpointed in the journal, so a recipe interrupted by a
+    failure or a crash is resumed by the next sync.
+    """
+    oid = recipe.extras["kptncook_id"]
+    content_hash = _mealie_content_hash(recipe)
+    checkpoint = journal.checkpoint(oid)
+    try:
+        created = client.create_recipe(recipe, checkpoint=checkpoint)
+    except httpx.HTTPStatusError as exc:
+        if exc.response.status_code == 404 and checkpoint.slug:
+            # The unfinished recipe was deleted in Mealie; start over next time.
+            journal.finish(oid)
+        detail_message = extract_mealie_detail_message(exc.response)
+        if detail_message != "Recipe already exists":
+            logger.warning(
+                "Failed to create recipe %s in Mealie (%s): %s",
+                recipe.name,
+                exc.response.status_code,
+                detail_message or exc,
+            )
+        return None
+    except httpx.HTTPError as exc:
+        logger.warning("Failed to create recipe %s in Mealie: %s", recipe.name, exc)
+        return None
+    ledger.record(oid, created.slug, recipe_id=created.id, content_hash=content_hash)
+    journal.finish(oid)
+    return created.slug
+
+
+def _update_mealie_recipe(
+    client: MealieApiClient, ledger: MealieLedger, recipe: RecipeWithImage
+) -> str | None:
+    """
+    Update a recipe already in Mealie; failures are logged and reported as ``None``.
+    """
+    oid = recipe.extras["kptncook_id"]
+    entry = ledger.get(oid)
+    if entry is None:
+        return None
+    content_hash = _mealie_content_hash(recipe)
+    try:
+        updated = client.update_recipe(recipe, entry.slug)
+    except httpx.HTTPStatusError as exc:
+        if exc.response.status_code == 404:
+            # Deleted since the ledger was reconciled; created on the next sync.
+            ledger.forget(oid)
+        logger.warning(
+            "Failed to update recipe %s in Mealie (%s): %s",
+            recipe.name,
+            exc.response.status_code,
+            extract_mealie_detail_message(exc.response) or exc,
+        )
+        return None
+    except httpx.HTTPError as exc:
+        logger.warning("Failed to update recipe %s in Mealie: %s", recipe.name, exc)
+        return None
+    ledger.record(oid, updated.slug, recipe_id=updated.id, content_hash=content_hash)
+    return updated.slug
+
+
+def _needs_mealie_update(ledger: MealieLedger, recipe: RecipeWithImage) -> bool:
+    oid = recipe.extras["kptncook_id"]
+    entry = ledger.get(oid)
+    if entry is None:
+        return False
+    # Without a hash (recipes created before hashes were recorded) nothing says
+    # what is in Mealie, so the recipe is written again.
+    if entry.pending_update or entry.content_hash is None:
+        return True
+    return entry.content_hash != _mealie_content_hash(recipe)
+
+
 def sync_with_mealie_result() -> SyncWithMealieResult:
     client = get_mealie_client()
-    kptncook_recipes_from_mealie = get_kptncook_recipes_from_mealie(client)
+    try:
+        return _sync_with_mealie(client)
+    finally:
+        # Releases the connection pool and the step images downloaded so far.
+        client.close()
+
+
+def convert_recipes_to_mealie(recipes: Sequence[Recipe]) -> list[RecipeWithImage]:
+    """
+    Convert recipes to Mealie payloads, spread over processes for large batches.
+
+    Conversion is pure CPU work; small batches are converted in this process
+    because starting a pool would take longer than the work itself.
+    """
+    if len(recipes) < MEALIE_CONVERSION_PROCESS_THRESHOLD:
+        return [kptncook_to_mealie(recipe) for recipe in recipes]
+    convert = partial(kptncook_to_mealie, api_key=get_settings().kptncook_api_key)
+    try:
+        # Forking would copy the threads of the caller (the HTTP pool, the
+        # ledger writers) together with whatever locks they hold.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(mp_context=context) as executor:
+            return list(
+                executor.map(convert, recipes, chunksize=MEALIE_CONVERSION_CHUNK_SIZE)
+            )
+    except (OSError, BrokenProcessPool) as exc:
+        logger.warning("Converting recipes without a process pool: %s", exc)
+        return [convert(recipe) for recipe in recipes]
+
+
+def _sync_with_mealie(client: MealieApiClient) -> SyncWithMealieResult:
+    ledger = get_mealie_ledger()
+    ids_in_mealie = get_kptncook_ids_in_mealie(client, ledger)
+    ledger.save()
     repository_result = load_kptncook_recipes_from_repository()
-    kptncook_recipes_from_repository = [
-        kptncook_to_mealie(r) for r in repository_result.recipes
-    ]
-    ids_in_mealie = {r.extras["kptncook_id"] for r in kptncook_recipes_from_mealie}
-    ids_from_api = {r.extras["kptncook_id"] for r in kptncook_recipes_from_repository}
-    ids_to_add = ids_from_api - ids_in_mealie
+    repository_recipes = repository_result.recipes
+    ids_to_add = {recipe.id.oid for recipe in repository_recipes} - ids_in_mealie
+    source_hashes = {
+        recipe.id.oid: kptncook_source_hash(recipe) for recipe in repository_recipes
+    }
+    # Only recipes missing in Mealie, or changed since they were last written,
+    # are worth converting.
+    converted = convert_recipes_to_mealie(
+        [
+            recipe
+            for recipe in repository_recipes
+            if recipe.id.oid in ids_to_add
+            or _source_changed(ledger, recipe.id.oid, source_hashes[recipe.id.oid])
+        ]
+    )
     recipes_to_add = [
+        recipe for recipe in converted if recipe.extras["kptncook_id"] in ids_to_add
+    ]
+    journal = get_mealie_journal()
+    orphans = discard_orphan_trunks(journal, ledger, client, ids_to_add)
+    if orphans:
+        logger.info("Deleted %d unfinished recipes from Mealie", orphans)
+    # Recipes whose converted content changed since they were last written.
+    recipes_to_update = [
         recipe
-        for recipe in kptncook_recipes_from_repository
-        if recipe.extras.get("kptncook_id") in ids_to_add
+        for recipe in converted
+        if recipe.extras["kptncook_id"] in ids_in_mealie
+        and _needs_mealie_update(ledger, recipe)
     ]
-    created_slugs: list[str] = []
-    for recipe in recipes_to_add:
-        try:
-            created = client.create_recipe(recipe)
-            created_slugs.append(created.slug)
-        except httpx.HTTPStatusError as exc:
-            detail_message = extract_mealie_detail_message(exc.response)
-            if detail_message == "Recipe already exists":
-                continue
-            logger.warning(
-                "Failed to create recipe %s in Mealie (%s): %s",
-                recipe.name,
-                exc.response.status_code,
-                detail_message or exc,
+    concurrency = max(1, get_settings().mealie_sync_concurrency)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            created = list(
+                executor.map(
+                    lambda recipe: _create_mealie_recipe(
+                        client, ledger, journal, recipe
+                    ),
+                    recipes_to_add,
+                )
             )
+            updated = list(
+                executor.map(
+                    lambda recipe: _update_mealie_recipe(client, ledger, recipe),
+                    recipes_to_update,
+                )
+            )
+    except BaseException:
+        # Keep the recipes created before the failure, or the next sync would
+        # create them again.
+        ledger.save()
+        raise
+    failed_ids = {
+        recipe.extras["kptncook_id"]
+        for recipe, slug in zip(recipes_to_add + recipes_to_update, created + updated)
+        if slug is None
+    }
+    for recipe in converted:
+        oid = recipe.extras["kptncook_id"]
+        if oid not in failed_ids:
+            ledger.set_source_hash(oid, source_hashes[oid])
+    ledger.save()
     return SyncWithMealieResult(
-        created_count=len(created_slugs),
+        created_count=sum(slug is not None for slug in created),
         invalid_repository_entries=repository_result.invalid_entries,
+        updated_count=sum(slug is not None for slug in updated),
+    )
+
+
+def _source_changed(ledger: MealieLedger, oid: str, source_hash: str) -> bool:
+    entry = ledger.get(oid)
+    return entry is not None and (
+        entry.pending_update or entry.source_hash != source_hash
     )
 
 
@@ -263,6 +561,212 @@ def sync_with_mealie() -> int:
     return sync_with_mealie_result().created_count
 
 
+def purge_mealie_recipes(
+    *,
+    dry_run: bool = False,
+    delete_orphans: bool = False,
+    concurrency: int = MEALIE_PURGE_CONCURRENCY,
+    rate: float | None = MEALIE_PURGE_RATE,
+    slugs: Sequence[str] | None = None,
+) -> MealiePurgeResult:
+    """
+    Delete every recipe kptncook created in Mealie.
+
+    The recipes are taken from the sync ledger, reconciled against the recipes
+    tagged ``kptncook``, and from the journal of unfinished creations. With
+    ``dry_run`` they are only listed. Passing the ``slugs`` of an earlier
+    listing deletes exactly those recipes, without listing them again. ``rate``
+    caps the delete requests per second across all ``concurrency`` workers.
+    """
+    client = get_mealie_client()
+    try:
+        return _purge_mealie_recipes(
+            client,
+            dry_run=dry_run,
+            delete_orphans=delete_orphans,
+            concurrency=max(1, concurrency),
+            limiter=RateLimiter(rate),
+            slugs=slugs,
+        )
+    finally:
+        client.close()
+
+
+def _purge_mealie_recipes(
+    client: MealieApiClient,
+    *,
+    dry_run: bool,
+    delete_orphans: bool,
+    concurrency: int,
+    limiter: RateLimiter,
+    slugs: Sequence[str] | None = None,
+) -> MealiePurgeResult:
+    ledger = get_mealie_ledger()
+    if slugs is None:
+        get_kptncook_ids_in_mealie(client, ledger)
+    journal = get_mealie_journal()
+    oid_by_slug = {entry.slug: oid for oid, entry in ledger.entries.items()}
+    for oid, checkpoint in journal.entries.items():
+        if checkpoint.slug:
+            oid_by_slug.setdefault(checkpoint.slug, oid)
+    slugs = sorted(oid_by_slug) if slugs is None else list(slugs)
+    if dry_run:
+        return MealiePurgeResult(slugs=slugs, deleted=[], failed=[], deleted_items={})
+
+    def delete(slug: str) -> bool:
+        limiter.wait()
+        try:
+            client.delete_via_slug(slug)
+        except httpx.HTTPStatusError as exc:
+            if exc.response.status_code == 404:
+                return True
+            logger.warning(
+                "Failed to delete Mealie recipe %s (%s): %s",
+                slug,
+                exc.response.status_code,
+                extract_mealie_detail_message(exc.response) or exc,
+            )
+            return False
+        except httpx.HTTPError as exc:
+            logger.warning("Failed to delete Mealie recipe %s: %s", slug, exc)
+            return False
+        return True
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(delete, slugs))
+    deleted = [slug for slug, ok in zip(slugs, outcomes) if ok]
+    for slug in deleted:
+        deleted_oid = oid_by_slug.get(slug)
+        if deleted_oid is not None:
+            ledger.forget(deleted_oid)
+            journal.finish(deleted_oid)
+    ledger.save()
+    deleted_items = {}
+    if delete_orphans:
+        deleted_items = _delete_orphaned_mealie_items(client, concurrency, limiter)
+    return MealiePurgeResult(
+        slugs=slugs,
+        deleted=deleted,
+        failed=[slug for slug, ok in zip(slugs, outcomes) if not ok],
+        deleted_items=deleted_items,
+    )
+
+
+def _delete_orphaned_mealie_items(
+    client: MealieApiClient, concurrency: int, limiter: RateLimiter
+) -> dict[str, int]:
+    """
+    Delete units, foods and tags of kptncook recipes no Mealie recipe uses.
+
+    Only names the locally saved recipes convert to are candidates, so items
+    kptncook never used are kept even if no recipe refers to them.
+    """
+    candidates: dict[str, set[str]] = {kind: set() for kind in _MEALIE_ITEM_KINDS}
+    for recipe in load_kptncook_recipes_from_repository().recipes:
+        _collect_mealie_item_names(kptncook_to_mealie(recipe), candidates)
+    used: dict[str, set[str]] = {kind: set() for kind in _MEALIE_ITEM_KINDS}
+    try:
+        remaining = client.get_all_recipes()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for recipe in executor.map(
+                lambda summary: client.get_via_slug(summary.slug), remaining
+            ):
+                _collect_mealie_item_names(recipe, used)
+        deleted_items = {}
+        for kind, (endpoint, model_class, normalize) in _MEALIE_ITEM_KINDS.items():
+            orphans = [
+                item
+                for item in client.get_items(endpoint, model_class)
+                if item.id is not None
+                and normalize(item.name) in candidates[kind]
+                and normalize(item.name) not in used[kind]
+            ]
+            for item in orphans:
+                limiter.wait()
+                client.delete_item(endpoint, item.id)
+            deleted_items[kind] = len(orphans)
+    except httpx.HTTPStatusError as exc:
+        raise UserFacingError(
+            format_http_status_error(
+                exc.response, action="deleting unused Mealie units, foods and tags"
+            )
+        ) from exc
+    except httpx.HTTPError as exc:
+        raise UserFacingError(format_request_error(exc)) from exc
+    return deleted_items
+
+
+def _collect_mealie_item_names(recipe, names: dict[str, set[str]]) -> None:
+    for ingredient in recipe.recipe_ingredient or []:
+        if ingredient.unit is not None:
+            names["units"].add(ingredient.unit.name)
+        if ingredient.food is not None:
+            names["foods"].add(ingredient.food.name)
+    names["tags"].update(tag.name.casefold() for tag in recipe.tags or [])
+
+
+def bulk_import_to_mealie_result() -> SyncWithMealieResult:
+    """
+    Import all recipes missing in Mealie with one migration archive upload.
+
+    Much faster than creating recipes one by one for an initial load; the next
+    regular sync then adds the step images to the imported recipes.
+    """
+    client = get_mealie_client()
+    try:
+        return _bulk_import_to_mealie(client)
+    finally:
+        client.close()
+
+
+def _bulk_import_to_mealie(client: MealieApiClient) -> SyncWithMealieResult:
+    ledger = get_mealie_ledger()
+    ids_in_mealie = get_kptncook_ids_in_mealie(client, ledger)
+    repository_result = load_kptncook_recipes_from_repository()
+    recipes_to_add = convert_recipes_to_mealie(
+        [
+            recipe
+            for recipe in repository_result.recipes
+            if recipe.id.oid not in ids_in_mealie
+        ]
+    )
+    if recipes_to_add:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive_path = Path(tmp_dir) / "kptncook-mealie-import.zip"
+            build_import_archive(archive_path, recipes_to_add, client.step_images)
+            try:
+                report_id = client.start_migration(archive_path, MIGRATION_TYPE)
+                report = client.wait_for_report(
+                    report_id, timeout=MEALIE_IMPORT_TIMEOUT
+                )
+            except httpx.HTTPStatusError as exc:
+                raise UserFacingError(
+                    format_http_status_error(
+                        exc.response, action="importing recipes into Mealie"
+                    )
+                ) from exc
+            except httpx.HTTPError as exc:
+                raise UserFacingError(format_request_error(exc)) from exc
+            except TimeoutError as exc:
+                raise UserFacingError(str(exc)) from exc
+        for entry in report.get("entries") or []:
+            if not entry.get("success", True):
+                logger.warning(
+                    "Mealie could not import a recipe: %s", entry.get("message")
+                )
+    # The import report does not say which slugs belong to which recipe, so
+    # the ledger picks the new recipes up from their extras.
+    ids_after_import = get_kptncook_ids_in_mealie(client, ledger)
+    # Their ids, step images and hashes are only filled in by the next sync.
+    for oid in ids_after_import - ids_in_mealie:
+        ledger.mark_pending_update(oid)
+    ledger.save()
+    return SyncWithMealieResult(
+        created_count=len(ids_after_import - ids_in_mealie),
+        invalid_repository_entries=repository_result.invalid_entries,
+    )
+
+
 def backup_kptncook_favorites() -> FavoritesBackupResult:
     _require_access_token()
     client = KptnCookClient()
@@ -323,9 +827,11 @@ def get_kptncook_access_token() -> str:
         raise UserFacingError(format_request_error(exc)) from exc
 
 
-def get_discovery_screen() -> DiscoveryScreenData:
+def get_discovery_screen(client: KptnCookClient | None = None) -> DiscoveryScreenData:
+    if client is None:
+        client = KptnCookClient()
     try:
-        payload = KptnCookClient().get_discovery_screen()
+        payload = client.get_discovery_screen()
     except httpx.HTTPStatusError as exc:
         raise UserFacingError(
             format_http_status_error(exc.response, action="fetching discovery screen")
@@ -350,6 +856,95 @@ def get_discovery_list_recipes(
     return _resolve_recipe_summaries(client, items, action="resolving recipes")
 
 
+def _discovery_list_label(entry: DiscoveryListSummary) -> str:
+    list_type = (entry.list_type or "").strip().lower()
+    if entry.list_id:
+        return f"{list_type}/{entry.list_id}"
+    return list_type
+
+
+def crawl_discovery_lists(
+    *, concurrency: int = DISCOVERY_CRAWL_CONCURRENCY
+) -> DiscoveryCrawlResult:
+    """
+    Mirror every list of the discovery screen into the local repository.
+
+    Lists are fetched concurrently, identifiers are deduplicated across lists
+    and resolved in one chunked pass, and the result is saved with a single
+    repository write. Each saved recipe records the lists it was found in.
+    """
+    client = KptnCookClient()
+    screen = get_discovery_screen(client)
+
+    entries: dict[str, DiscoveryListSummary] = {}
+    skipped_lists: list[str] = []
+    for entry in screen.lists:
+        label = _discovery_list_label(entry)
+        list_type = label.split("/", 1)[0]
+        if not list_type or (
+            list_type in DISCOVERY_LIST_TYPES_REQUIRE_ID and not entry.list_id
+        ):
+            skipped_lists.append(label or entry.title or "-")
+            continue
+        entries.setdefault(label, entry)
+
+    def fetch_list(label: str) -> list[object]:
+        return client.get_discovery_list(
+            list_type=label.split("/", 1)[0], list_id=entries[label].list_id
+        )
+
+    crawled_lists: list[str] = []
+    failed_lists: list[str] = []
+    sources: dict[RecipeIdentifier, list[str]] = {}
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [(label, executor.submit(fetch_list, label)) for label in entries]
+        # Collect in screen order so the recorded list order is deterministic.
+        for label, future in futures:
+            try:
+                items = future.result()
+            except httpx.HTTPError as exc:
+                logger.warning("Failed to fetch discovery list %s: %s", label, exc)
+                failed_lists.append(label)
+                continue
+            crawled_lists.append(label)
+            for identifier in _collect_recipe_identifiers(items):
+                labels = sources.setdefault(identifier, [])
+                if label not in labels:
+                    labels.append(label)
+
+    if entries and not crawled_lists:
+        raise UserFacingError("Could not fetch any discovery list.")
+
+    recipes = _resolve_recipe_summaries(
+        client,
+        list(sources),
+        action="resolving recipes",
+        chunk_size=RECIPE_RESOLUTION_CHUNK_SIZE,
+    )
+    for index, recipe in enumerate(recipes):
+        identifiers: list[RecipeIdentifier] = [("oid", recipe.id)]
+        uid = recipe.data.get("uid")
+        if isinstance(uid, str):
+            identifiers.append(("uid", uid))
+        recipe_lists: list[str] = []
+        for identifier in identifiers:
+            for label in sources.get(identifier, []):
+                if label not in recipe_lists:
+                    recipe_lists.append(label)
+        recipes[index] = recipe.model_copy(
+            update={"discovery_lists": recipe_lists or None}
+        )
+
+    saved_count = _save_repository_entries(recipes)
+    return DiscoveryCrawlResult(
+        crawled_lists=crawled_lists,
+        failed_lists=failed_lists,
+        skipped_lists=skipped_lists,
+        identifier_count=len(sources),
+        saved_count=saved_count,
+    )
+
+
 def list_popular_ingredients() -> list[dict[str, object]]:
     _require_access_token()
     client = KptnCookClient()
@@ -431,24 +1026,33 @@ def delete_repository_recipes(ids: list[str]) -> tuple[list[str], list[str]]:
     return _delete_repository_ids(ids)
 
 
-def search_recipe_by_id(id_: str) -> SearchResult:
-    resolved_id = id_
-    if resolved_id.startswith("https://share.kptncook.com/"):
-        try:
-            response = httpx.get(resolved_id, timeout=SHARE_URL_TIMEOUT)
-        except httpx.HTTPError as exc:
-            raise UserFacingError(
-                f"Request failed while resolving share URL: {exc}"
-            ) from exc
-        if response.status_code not in (301, 302):
-            raise UserFacingError(
-                f"Could not get redirect location (HTTP {response.status_code})."
-            )
-        location = response.headers.get("location")
-        if not location:
-            raise UserFacingError("Share URL did not include a redirect location.")
-        resolved_id = location
+def _resolve_share_url(id_: str, *, client: httpx.Client | None = None) -> str:
+    """
+    Follow a share.kptncook.com link to the URL containing the recipe id.
+    """
+    if not id_.startswith(SHARE_URL_PREFIX):
+        return id_
+    try:
+        if client is None:
+            response = fetch_url(id_, timeout=SHARE_URL_TIMEOUT)
+        else:
+            response = client.get(id_, timeout=SHARE_URL_TIMEOUT)
+    except httpx.HTTPError as exc:
+        raise UserFacingError(
+            f"Request failed while resolving share URL: {exc}"
+        ) from exc
+    if response.status_code not in (301, 302):
+        raise UserFacingError(
+            f"Could not get redirect location (HTTP {response.status_code})."
+        )
+    location = response.headers.get("location")
+    if not location:
+        raise UserFacingError("Share URL did not include a redirect location.")
+    return location
+
 
+def search_recipe_by_id(id_: str) -> SearchResult:
+    resolved_id = _resolve_share_url(id_)
     parsed = parse_id(resolved_id)
     if parsed is None:
         raise UserFacingError("Could not parse id")
@@ -471,6 +1075,76 @@ def search_recipe_by_id(id_: str) -> SearchResult:
     return SearchResult(id_type=id_type, id_value=id_value, recipe=recipe)
 
 
+def search_recipes_by_ids(
+    ids: Sequence[str], *, concurrency: int = SHARE_URL_CONCURRENCY
+) -> BulkSearchResult:
+    """
+    Look up many ids or share URLs and save all found recipes at once.
+
+    Share URLs are resolved in parallel, the parsed ids are resolved with one
+    chunked search and the recipes are stored with a single repository write.
+    Inputs that cannot be parsed or resolved are reported instead of aborting.
+    """
+    inputs = list(dict.fromkeys(id_.strip() for id_ in ids if id_.strip()))
+    invalid: list[tuple[str, str]] = []
+    resolved: dict[str, str] = {}
+    share_urls = [id_ for id_ in inputs if id_.startswith(SHARE_URL_PREFIX)]
+    if share_urls:
+        with (
+            httpx.Client(transport=get_default_transport()) as http_client,
+            ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor,
+        ):
+            futures = {
+                url: executor.submit(_resolve_share_url, url, client=http_client)
+                for url in share_urls
+            }
+            for url, future in futures.items():
+                try:
+                    resolved[url] = future.result()
+                except UserFacingError as exc:
+                    invalid.append((url, str(exc)))
+
+    parsed_inputs: dict[str, RecipeIdentifier] = {}
+    for id_ in inputs:
+        if id_ in share_urls and id_ not in resolved:
+            continue
+        parsed = parse_id(resolved.get(id_, id_))
+        if parsed is None:
+            invalid.append((id_, "Could not parse id"))
+            continue
+        parsed_inputs[id_] = parsed
+
+    identifiers = list(dict.fromkeys(parsed_inputs.values()))
+    recipes = _resolve_recipe_summaries(
+        KptnCookClient(),
+        identifiers,
+        action="fetching recipes",
+        chunk_size=RECIPE_RESOLUTION_CHUNK_SIZE,
+    )
+    by_identifier: dict[RecipeIdentifier, RecipeInDb] = {}
+    for recipe in recipes:
+        by_identifier[("oid", recipe.id)] = recipe
+        uid = recipe.data.get("uid")
+        if isinstance(uid, str):
+            by_identifier[("uid", uid)] = recipe
+
+    found: list[SearchResult] = []
+    not_found: list[str] = []
+    for id_, (id_type, id_value) in parsed_inputs.items():
+        match = by_identifier.get((id_type, id_value))
+        if match is None:
+            not_found.append(id_)
+            continue
+        found.append(SearchResult(id_type=id_type, id_value=id_value, recipe=match))
+
+    saved_count = _save_repository_entries(
+        list({recipe.id: recipe for recipe in by_identifier.values()}.values())
+    )
+    return BulkSearchResult(
+        found=found, not_found=not_found, invalid=invalid, saved_count=saved_count
+    )
+
+
 def get_recipe_by_id(id_: str):
     found_recipes = load_recipe_from_repository_by_id(id_).recipes
     if len(found_recipes) == 0:
@@ -492,9 +1166,13 @@ def export_recipes_to_paprika_result(recipe_id: str | None) -> PaprikaExportResu
             raise UserFacingError("Recipe not found.")
         if len(recipes) > 1:
             raise UserFacingError("More than one recipe found with that ID.")
+    report = PaprikaExporter().export_changes(recipes=recipes)
     return PaprikaExportResult(
-        filename=PaprikaExporter().export(recipes=recipes),
+        filename=report.paths[0].name,
         invalid_repository_entries=repository_result.invalid_entries,
+        written=report.written,
+        skipped=report.skipped,
+        removed=report.removed,
     )
 
 
@@ -502,7 +1180,9 @@ def export_recipes_to_paprika(recipe_id: str | None) -> str:
     return export_recipes_to_paprika_result(recipe_id).filename
 
 
-def export_recipes_to_tandoor_result(recipe_id: str | None) -> TandoorExportResult:
+def export_recipes_to_tandoor_result(
+    recipe_id: str | None, *, single_archive: bool = False, prune: bool = False
+) -> TandoorExportResult:
     repository_result = (
         load_recipe_from_repository_by_id(recipe_id)
         if recipe_id
@@ -514,9 +1194,17 @@ def export_recipes_to_tandoor_result(recipe_id: str | None) -> TandoorExportResu
             raise UserFacingError("Recipe not found.")
         if len(recipes) > 1:
             raise UserFacingError("More than one recipe found with that ID.")
+    exporter = TandoorExporter()
+    if single_archive:
+        report = exporter.export_archive_changes(recipes=recipes)
+    else:
+        report = exporter.export_changes(recipes=recipes, prune=prune)
     return TandoorExportResult(
-        filenames=TandoorExporter().export(recipes=recipes),
+        filenames=[path.name for path in report.paths],
         invalid_repository_entries=repository_result.invalid_entries,
+        written=report.written,
+        skipped=report.skipped,
+        removed=report.removed,
     )
 
 
@@ -524,7 +1212,9 @@ def export_recipes_to_tandoor(recipe_id: str | None) -> list[str]:
     return export_recipes_to_tandoor_result(recipe_id).filenames
 
 
-def export_recipes_to_markdown_result(recipe_id: str | None) -> MarkdownExportResult:
+def export_recipes_to_markdown_result(
+    recipe_id: str | None, *, prune: bool = False
+) -> MarkdownExportResult:
     repository_result = (
         load_recipe_from_repository_by_id(recipe_id)
         if recipe_id
@@ -536,11 +1226,78 @@ def export_recipes_to_markdown_result(recipe_id: str | None) -> MarkdownExportRe
             raise UserFacingError("Recipe not found.")
         if len(recipes) > 1:
             raise UserFacingError("More than one recipe found with that ID.")
+    report = MarkdownExporter().export_changes(recipes=recipes, prune=prune)
     return MarkdownExportResult(
-        filenames=[str(path) for path in MarkdownExporter().export(recipes=recipes)],
+        filenames=[str(path) for path in report.paths],
         invalid_repository_entries=repository_result.invalid_entries,
+        written=report.written,
+        skipped=report.skipped,
+        removed=report.removed,
     )
 
 
 def export_recipes_to_markdown(recipe_id: str | None) -> list[str]:
     return export_recipes_to_markdown_result(recipe_id).filenames
+
+
+def parse_export_targets(value: str) -> list[str]:
+    """
+    Parse a comma-separated list of export formats, dropping repeats.
+    """
+    targets = [part.strip().lower() for part in value.split(",") if part.strip()]
+    unknown = [target for target in targets if target not in EXPORT_TARGETS]
+    if unknown:
+        raise ValueError(
+            f"Unknown export format(s): {', '.join(unknown)}. "
+            f"Choose from {', '.join(EXPORT_TARGETS)}."
+        )
+    if not targets:
+        raise ValueError(f"Choose at least one of {', '.join(EXPORT_TARGETS)}.")
+    return list(dict.fromkeys(targets))
+
+
+def export_recipes_to_targets(
+    targets: Sequence[str], *, prune: bool = False
+) -> MultiExportResult:
+    """
+    Export all repository recipes to several formats in one pass.
+
+    The repository is loaded once and the values every format needs (titles,
+    step texts, ingredient groups, covers) are derived once per recipe. The
+    format writers then run at the same time.
+    """
+    repository_result = load_kptncook_recipes_from_repository()
+    recipes = repository_result.recipes
+    image_cache = get_image_cache()
+    views = build_recipe_views(recipes, image_cache)
+    writers: dict[str, Callable[[], ExportReport]] = {
+        "markdown": lambda: MarkdownExporter(views=views).export_changes(
+            recipes, prune=prune
+        ),
+        "tandoor": lambda: TandoorExporter(views=views).export_changes(
+            recipes, prune=prune
+        ),
+        "paprika": lambda: PaprikaExporter(views=views).export_changes(recipes),
+    }
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, len(targets))) as executor:
+            futures = [(target, executor.submit(writers[target])) for target in targets]
+            results = []
+            for target, future in futures:
+                report = future.result()
+                results.append(
+                    ExportTargetResult(
+                        target=target,
+                        filenames=[str(path) for path in report.paths],
+                        written=report.written,
+                        skipped=report.skipped,
+                        removed=report.removed,
+                    )
+                )
+    finally:
+        # The covers were pinned against eviction for the writers.
+        release_recipe_views(views, image_cache)
+    return MultiExportResult(
+        results=results,
+        invalid_repository_entries=repository_result.invalid_entries,
+    )
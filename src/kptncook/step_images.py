@@ -0,0 +1,196 @@
+"""
+Download step images once per sync.
+
+Recipes often share step images, and the same picture may be served under
+several URLs. ``StepImageDownloader`` fetches each URL once through a pooled
+client, a few at a time, and keeps the body in a spooled temporary file that
+moves to disk when it grows. Bodies with the same SHA-256 digest are stored
+only once. Uploads then stream from those files instead of copying each image
+into memory again. Callers that ``acquire`` a URL ``release`` it after its
+upload; a body is closed once no acquired URL refers to it, so a sync only
+holds the images of the recipes in flight. With an ``ImageCache`` the bodies are
+read from the on-disk cache instead, so images downloaded by an earlier run are
+not fetched again. Cached blobs are pinned against eviction while in use and
+opened for each upload, so no file handle stays open between uploads.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import tempfile
+import threading
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from typing import IO
+
+import httpx
+
+from .http_client import get_default_transport
+from .image_cache import ImageCache
+
+ASSET_DOWNLOAD_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+DOWNLOAD_CONCURRENCY = 8
+# Step images are a few hundred KiB; anything larger is spooled to disk.
+SPOOL_MAX_SIZE = 512 * 1024
+
+
+class DownloadedImage:
+    def __init__(
+        self,
+        file: IO[bytes] | Path,
+        digest: str,
+        size: int,
+        *,
+        on_close: Callable[[], None] | None = None,
+    ) -> None:
+        self._file = file
+        self._lock = threading.Lock()
+        self._on_close = on_close
+        self.digest = digest
+        self.size = size
+
+    @contextmanager
+    def open(self) -> Iterator[IO[bytes]]:
+        """
+        Give exclusive access to the body, rewound to its start.
+
+        A spooled file is shared by every upload of the same image, so uploads
+        of one image run one after another while different images upload in
+        parallel. A cached file is opened anew for each upload.
+        """
+        if isinstance(self._file, Path):
+            with self._file.open("rb") as file:
+                yield file
+            return
+        with self._lock:
+            self._file.seek(0)
+            yield self._file
+
+    def close(self) -> None:
+        if not isinstance(self._file, Path):
+            self._file.close()
+        if self._on_close is not None:
+            self._on_close()
+            self._on_close = None
+
+
+class StepImageDownloader:
+    def __init__(
+        self,
+        *,
+        client: httpx.Client | None = None,
+        concurrency: int = DOWNLOAD_CONCURRENCY,
+        cache: ImageCache | None = None,
+    ) -> None:
+        self.cache = cache
+        self._client = client or httpx.Client(
+            transport=get_default_transport(),
+            follow_redirects=True,
+            timeout=ASSET_DOWNLOAD_TIMEOUT,
+        )
+        self._owns_client = client is None
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, concurrency), thread_name_prefix="step-image"
+        )
+        self._lock = threading.Lock()
+        self._by_url: dict[str, Future[DownloadedImage]] = {}
+        self._by_digest: dict[str, DownloadedImage] = {}
+        # Outstanding acquisitions per URL and downloaded URLs per digest.
+        self._claims: dict[str, int] = {}
+        self._digest_refs: dict[str, int] = {}
+
+    def fetch(self, url: str) -> Future[DownloadedImage]:
+        """
+        Start downloading ``url`` unless it was requested before.
+        """
+        with self._lock:
+            future = self._by_url.get(url)
+            # A failed download is retried by the next recipe asking for it.
+            if future is None or (future.done() and future.exception() is not None):
+                future = self._executor.submit(self._download, url)
+                self._by_url[url] = future
+            return future
+
+    def get(self, url: str) -> DownloadedImage:
+        return self.fetch(url).result()
+
+    def acquire(self, url: str) -> Future[DownloadedImage]:
+        """
+        Like ``fetch``, but keep the image until ``release`` is called as often.
+        """
+        with self._lock:
+            self._claims[url] = self._claims.get(url, 0) + 1
+        return self.fetch(url)
+
+    def release(self, url: str) -> None:
+        with self._lock:
+            claims = self._claims.get(url, 0) - 1
+            if claims > 0:
+                self._claims[url] = claims
+                return
+            self._claims.pop(url, None)
+            future = self._by_url.pop(url, None)
+        if future is not None:
+            future.add_done_callback(self._forget)
+
+    def _forget(self, future: Future[DownloadedImage]) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        image = future.result()
+        with self._lock:
+            refs = self._digest_refs.get(image.digest, 0) - 1
+            if refs > 0:
+                self._digest_refs[image.digest] = refs
+                return
+            self._digest_refs.pop(image.digest, None)
+            self._by_digest.pop(image.digest, None)
+        image.close()
+
+    def _download(self, url: str) -> DownloadedImage:
+        if self.cache is not None:
+            cached = self.cache.fetch(url, pin=True)
+            image = DownloadedImage(
+                cached.path,
+                cached.digest,
+                cached.size,
+                on_close=partial(self.cache.unpin, cached.digest),
+            )
+        else:
+            image = self._download_to_spool(url)
+        with self._lock:
+            existing = self._by_digest.setdefault(image.digest, image)
+            self._digest_refs[image.digest] = self._digest_refs.get(image.digest, 0) + 1
+        if existing is not image:
+            image.close()
+        return existing
+
+    def _download_to_spool(self, url: str) -> DownloadedImage:
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)  # noqa: SIM115
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with self._client.stream("GET", url) as response:
+                response.raise_for_status()
+                for chunk in response.iter_bytes():
+                    spool.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+        except BaseException:
+            spool.close()
+            raise
+        return DownloadedImage(spool, digest.hexdigest(), size)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            for image in self._by_digest.values():
+                image.close()
+            self._by_digest.clear()
+            self._by_url.clear()
+            self._claims.clear()
+            self._digest_refs.clear()
+        if self._owns_client:
+            self._client.close()
@@ -2,26 +2,30 @@
 Export recipes to Tandoor.
 
 Tandoor expects a zip archive with a recipe.json file and an optional image.jpg.
+For bulk imports it also accepts one zip archive holding such per-recipe zips.
+Recipes are built in memory a few at a time, so cover downloads overlap with
+writing the archives. A manifest in the working directory records the content
+of each per-recipe zip, so unchanged recipes are not written again. The bulk
+archive has a manifest of its own and is only replaced when a recipe in it
+changed, was added or was left out.
 """
 
+import io
 import json
 import logging
-import tempfile
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from collections.abc import Mapping
+from functools import cached_property
 from pathlib import Path
 from typing import Any
 
-import httpx
-
-from kptncook.config import get_settings
-from kptncook.exporter_utils import (
-    asciify_string,
-    get_cover,
-    get_step_text,
-    move_to_target_dir,
-    write_zip,
-    ZipContent,
-)
-from kptncook.ingredient_groups import iter_ingredient_groups
+from kptncook.atomic_files import replacing, write_atomically
+from kptncook.export_manifest import ExportManifest, ExportReport, content_hash
+from kptncook.exporter_utils import asciify_string, iter_prefetched
+from kptncook.image_cache import ImageCache, get_image_cache
+from kptncook.ingredient_groups import get_ingredient_group_labels
 from kptncook.models import (
     Ingredient,
     localized_fallback,
@@ -30,86 +34,207 @@ from kptncook.models import (
     StepIngredient,
     StepIngredientUnit,
 )
+from kptncook.recipe_view import RecipeView, find_view
 
 logger = logging.getLogger(__name__)
-IMAGE_DOWNLOAD_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+EXPORT_CONCURRENCY = 8
+ARCHIVE_FILENAME = "allrecipes.tandoor.zip"
+MANIFEST_FILENAME = ".kptncook-tandoor.json"
+ARCHIVE_MANIFEST_FILENAME = ".kptncook-tandoor-archive.json"
 
 
 class TandoorExporter:
-    def export(self, recipes: list[Recipe]) -> list[str]:
-        filenames = []
-        for recipe in recipes:
-            filenames.append(self.export_recipe(recipe=recipe))
-        return filenames
+    def __init__(
+        self,
+        image_cache: ImageCache | None = None,
+        views: Mapping[str, RecipeView] | None = None,
+    ) -> None:
+        self._image_cache = image_cache
+        self.views = views
+
+    @property
+    def image_cache(self) -> ImageCache:
+        # Looked up on first use, so exporting without covers needs no cache.
+        if self._image_cache is None:
+            self._image_cache = get_image_cache()
+        return self._image_cache
+
+    @cached_property
+    def group_labels(self) -> dict[str, str] | None:
+        # Read from the settings once per exporter, not once per recipe.
+        return get_ingredient_group_labels()
+
+    def get_view(self, recipe: Recipe) -> RecipeView:
+        view = find_view(self.views, recipe)
+        if view is None:
+            view = RecipeView.from_recipe(recipe, self.group_labels, self.image_cache)
+        return view
+
+    def export(
+        self,
+        recipes: list[Recipe],
+        concurrency: int = EXPORT_CONCURRENCY,
+        prune: bool = False,
+    ) -> list[str]:
+        self.export_changes(recipes, concurrency=concurrency, prune=prune)
+        return [self.get_export_filename(recipe=recipe) for recipe in recipes]
+
+    def export_changes(
+        self,
+        recipes: list[Recipe],
+        concurrency: int = EXPORT_CONCURRENCY,
+        prune: bool = False,
+    ) -> ExportReport:
+        """Write one zip per recipe whose content changed to the working directory.
+
+        Recipes with the same title share a file name; as in a serial export,
+        the last of them ends up in the file. With ``prune``, zips of recipes
+        missing from ``recipes`` are deleted.
+        """
+        out_dir = Path.cwd()
+        manifest = ExportManifest(out_dir, MANIFEST_FILENAME)
+        paths = [out_dir / self.get_export_filename(recipe) for recipe in recipes]
+        last_index = {path: index for index, path in enumerate(paths)}
+        exported = [
+            (recipe, path)
+            for index, (recipe, path) in enumerate(zip(recipes, paths))
+            if last_index[path] == index
+        ]
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            futures = [
+                executor.submit(self.export_recipe_changes, recipe, path, manifest)
+                for recipe, path in exported
+            ]
+            results = [future.result() for future in futures]
+
+        report = ExportReport(paths=[path for _, path in exported])
+        report.written = sum(written for written, _ in results)
+        report.skipped = len(results) - report.written
+        renamed = [previous for _, previous in results if previous is not None]
+        report.removed += manifest.remove_renamed(renamed)
+        if prune:
+            report.removed += manifest.prune(
+                {str(recipe.id.oid) for recipe, _ in exported}
+            )
+        manifest.save()
+        return report
+
+    def export_recipe_changes(
+        self, recipe: Recipe, path: Path, manifest: ExportManifest
+    ) -> tuple[bool, Path | None]:
+        """Write the zip for ``recipe`` unless the manifest says it is current.
+
+        Returns whether it was written and the file it replaced under another name.
+        """
+        oid = str(recipe.id.oid)
+        entries = self.get_recipe_entries(recipe=recipe)
+        digest = content_hash(*(part for entry in entries for part in entry))
+        if manifest.is_unchanged(oid, path, digest):
+            return False, None
+        write_atomically(path, build_zip(entries))
+        return True, manifest.record(oid, path, digest)
 
     def export_recipe(self, recipe: Recipe) -> str:
         filename = self.get_export_filename(recipe=recipe)
-        payload = self.get_recipe_payload(recipe=recipe)
-        image_bytes = self.get_cover_image_bytes(recipe=recipe)
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            zip_path = Path(tmp_dir) / filename
-            entries: list[tuple[str, ZipContent]] = [
-                (
-                    "recipe.json",
-                    json.dumps(payload, ensure_ascii=False, indent=2),
-                )
-            ]
-            if image_bytes is not None:
-                entries.append(("image.jpg", image_bytes))
-            write_zip(zip_path, entries)
-            move_to_target_dir(zip_path, Path.cwd() / filename)
+        write_atomically(Path.cwd() / filename, self.get_recipe_zip(recipe=recipe))
         return filename
 
+    def export_archive(
+        self, recipes: list[Recipe], concurrency: int = EXPORT_CONCURRENCY
+    ) -> str:
+        """Write all recipes into one archive for Tandoor's bulk import."""
+        report = self.export_archive_changes(recipes, concurrency=concurrency)
+        return report.paths[0].name
+
+    def export_archive_changes(
+        self, recipes: list[Recipe], concurrency: int = EXPORT_CONCURRENCY
+    ) -> ExportReport:
+        """Write the bulk import archive and count which recipes changed.
+
+        Tandoor imports whole archives, so the archive is rewritten when any
+        recipe changed, was added or was left out since the last export.
+        """
+        path = Path.cwd() / ARCHIVE_FILENAME
+        manifest = ExportManifest(
+            path.parent, ARCHIVE_MANIFEST_FILENAME, shared_file=True
+        )
+        previous_oids = {
+            oid for oid, entry in manifest.entries.items() if entry.path == path.name
+        }
+        exported_oids: set[str] = set()
+        report = ExportReport(paths=[path])
+        used_names: set[str] = set()
+        with replacing(path) as temp_path:
+            # The recipe zips are compressed already; store them as they are.
+            with zipfile.ZipFile(
+                temp_path, "w", compression=zipfile.ZIP_STORED, allowZip64=True
+            ) as archive:
+                prefetched = iter_prefetched(
+                    recipes, self.get_recipe_entries, concurrency=concurrency
+                )
+                for recipe, future in prefetched:
+                    oid = str(recipe.id.oid)
+                    entries = future.result()
+                    digest = content_hash(
+                        *(part for entry in entries for part in entry)
+                    )
+                    if manifest.is_unchanged(oid, path, digest):
+                        report.skipped += 1
+                    else:
+                        report.written += 1
+                        manifest.record(oid, path, digest)
+                    exported_oids.add(oid)
+                    name = unique_name(self.get_export_filename(recipe), used_names)
+                    archive.writestr(name, build_zip(entries))
+            if not report.written and exported_oids == previous_oids and path.exists():
+                temp_path.unlink()
+        removed_oids = previous_oids - exported_oids
+        manifest.forget(removed_oids)
+        report.removed = len(removed_oids)
+        manifest.save()
+        return report
+
+    def get_recipe_zip(self, recipe: Recipe) -> bytes:
+        return build_zip(self.get_recipe_entries(recipe=recipe))
+
+    def get_recipe_entries(self, recipe: Recipe) -> list[tuple[str, bytes]]:
+        view = self.get_view(recipe)
+        payload = self.get_recipe_payload(recipe=recipe, view=view)
+        entries = [
+            (
+                "recipe.json",
+                json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8"),
+            )
+        ]
+        image_bytes = view.cover_bytes()
+        if image_bytes is not None:
+            entries.append(("image.jpg", image_bytes))
+        return entries
+
+    def get_title(self, recipe: Recipe) -> str | None:
+        return self.get_view(recipe).title
+
     def get_export_filename(self, recipe: Recipe) -> str:
-        title = localized_fallback(recipe.localized_title) or "kptncook-recipe"
+        title = self.get_title(recipe=recipe) or "kptncook-recipe"
         return f"{asciify_string(title)}.zip"
 
     def get_cover_image_bytes(self, recipe: Recipe) -> bytes | None:
-        cover = get_cover(image_list=recipe.image_list)
-        if cover is None:
-            return None
-        cover_url = recipe.get_image_url(api_key=get_settings().kptncook_api_key)
-        if cover_url is None:
-            return None
-        try:
-            response = httpx.get(
-                cover_url,
-                follow_redirects=True,
-                timeout=IMAGE_DOWNLOAD_TIMEOUT,
-            )
-            response.raise_for_status()
-        except httpx.HTTPStatusError as exc:
-            if exc.response.status_code == 404:
-                logger.info(
-                    'Cover image for "%s" not found online any more.',
-                    localized_fallback(recipe.localized_title) or "kptncook-recipe",
-                )
-            else:
-                logger.warning(
-                    "While trying to fetch the cover img a HTTP error occurred: %s: %s",
-                    exc.response.status_code,
-                    exc,
-                )
-            return None
-        except httpx.RequestError as exc:
-            logger.warning(
-                "While trying to fetch the cover img a network error occurred: %s",
-                exc,
-            )
-            return None
-        return response.content
+        return self.get_view(recipe).cover_bytes()
 
-    def get_recipe_payload(self, recipe: Recipe) -> dict[str, Any]:
+    def get_recipe_payload(
+        self, recipe: Recipe, view: RecipeView | None = None
+    ) -> dict[str, Any]:
+        view = view or self.get_view(recipe)
         return {
-            "name": localized_fallback(recipe.localized_title) or "",
+            "name": view.title or "",
             "description": localized_fallback(recipe.author_comment) or "",
             "servings": 3,
             "source_url": self.get_source_url(recipe=recipe),
             "working_time": recipe.preparation_time,
             "waiting_time": recipe.cooking_time,
             "keywords": self.get_keywords(recipe=recipe),
-            "steps": self.get_steps(recipe=recipe),
-            "ingredients": self.get_ingredients(recipe=recipe),
+            "steps": self.get_steps(recipe=recipe, view=view),
+            "ingredients": self.get_ingredients(recipe=recipe, view=view),
         }
 
     def get_source_url(self, recipe: Recipe) -> str:
@@ -130,12 +255,15 @@ class TandoorExporter:
     def _filter_active_tags(active_tags: list[str]) -> list[str]:
         return [tag for tag in active_tags if tag != "kptncook"]
 
-    def get_steps(self, recipe: Recipe) -> list[dict[str, Any]]:
+    def get_steps(
+        self, recipe: Recipe, view: RecipeView | None = None
+    ) -> list[dict[str, Any]]:
+        view = view or self.get_view(recipe)
         steps = []
-        for step in recipe.steps:
+        for step, text in zip(recipe.steps, view.step_texts):
             steps.append(
                 {
-                    "instruction": get_step_text(step),
+                    "instruction": text,
                     "ingredients": self.get_step_ingredients(step=step),
                 }
             )
@@ -199,11 +327,12 @@ class TandoorExporter:
                 return {"name": candidate}
         return None
 
-    def get_ingredients(self, recipe: Recipe) -> list[dict[str, Any]]:
+    def get_ingredients(
+        self, recipe: Recipe, view: RecipeView | None = None
+    ) -> list[dict[str, Any]]:
+        view = view or self.get_view(recipe)
         ingredients = []
-        for group_label, group_ingredients in iter_ingredient_groups(
-            recipe.ingredients
-        ):
+        for group_label, group_ingredients in view.ingredient_groups:
             if group_label:
                 ingredients.append(self.get_group_header_payload(label=group_label))
             for ingredient in group_ingredients:
@@ -234,3 +363,22 @@ class TandoorExporter:
         if measure is None:
             return None
         return {"name": measure}
+
+
+def unique_name(filename: str, used_names: set[str]) -> str:
+    """Return ``filename``, numbered if it is already in ``used_names``."""
+    stem, suffix = os.path.splitext(filename)
+    name, number = filename, 1
+    while name in used_names:
+        number += 1
+        name = f"{stem}_{number}{suffix}"
+    used_names.add(name)
+    return name
+
+
+def build_zip(entries: list[tuple[str, bytes]]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+        for name, content in entries:
+            zip_file.writestr(name, content)
+    return buffer.getvalue()
@@ -58,3 +58,22 @@ def test_resolve_recipe_summaries_uses_bounded_timeout(monkeypatch):
 )
 def test_looks_like_uid(uid, expected_valid):
     assert looks_like_uid(uid) == expected_valid
+
+
+def test_resolve_recipe_summaries_posts_in_chunks(monkeypatch):
+    batches = []
+    client = KptnCookClient(base_url="https://mobile.kptncook.com", api_key="test-key")
+
+    def fake_post(path, **kwargs):
+        batches.append(kwargs["json"])
+        request = httpx.Request("POST", client.to_url(path))
+        data = [{"_id": {"$oid": item["identifier"]}} for item in kwargs["json"]]
+        return httpx.Response(200, request=request, json=data)
+
+    monkeypatch.setattr(client, "post", fake_post)
+    ids = [("oid", f"{index:024x}") for index in range(5)]
+
+    recipes = client.resolve_recipe_summaries(ids, chunk_size=2)
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [recipe.id for recipe in recipes] == [oid for _, oid in ids]
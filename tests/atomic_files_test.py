@@ -0,0 +1,50 @@
+import os
+import stat
+
+import pytest
+
+from kptncook.atomic_files import replacing, write_atomically
+
+
+def _mode(path):
+    return stat.S_IMODE(path.stat().st_mode)
+
+
+@pytest.fixture
+def umask():
+    previous = os.umask(0o022)
+    yield 0o022
+    os.umask(previous)
+
+
+def test_write_atomically_creates_files_with_umask_mode(tmp_path, umask):
+    path = tmp_path / "recipe.md"
+
+    write_atomically(path, "Pasta")
+
+    assert path.read_text() == "Pasta"
+    assert _mode(path) == 0o666 & ~umask
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_replacing_keeps_old_file_on_error(tmp_path):
+    path = tmp_path / "recipes.zip"
+    path.write_bytes(b"old")
+
+    with pytest.raises(RuntimeError), replacing(path) as temp_path:
+        temp_path.write_bytes(b"half")
+        raise RuntimeError("interrupted")
+
+    assert path.read_bytes() == b"old"
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_replacing_keeps_old_file_when_temporary_file_is_removed(tmp_path):
+    path = tmp_path / "recipes.zip"
+    path.write_bytes(b"old")
+
+    with replacing(path) as temp_path:
+        temp_path.write_bytes(b"same")
+        temp_path.unlink()
+
+    assert path.read_bytes() == b"old"
@@ -0,0 +1,108 @@
+import json
+
+import httpx
+import pytest
+from typer.testing import CliRunner
+
+import kptncook
+from kptncook.cassette import (
+    Cassette,
+    CassetteMissError,
+    RecordingTransport,
+    ReplayTransport,
+    normalize_url,
+)
+from kptncook.config import clear_settings_cache
+from kptncook.fake_api import FakeApiConfig, FakeKptnCookApi
+from kptncook.http_client import get_default_transport
+
+
+def _echo_transport(calls):
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(
+            200, json={"path": request.url.path, "body": request.content.decode()}
+        )
+
+    return httpx.MockTransport(handler)
+
+
+def test_normalize_url_drops_api_key_and_timestamps():
+    url = "https://mobile.kptncook.com/recipes/de/1718000000.123?kptnkey=secret&b=2&a=1"
+
+    assert (
+        normalize_url(url)
+        == "https://mobile.kptncook.com/recipes/de/{timestamp}?a=1&b=2"
+    )
+
+
+def test_recorded_traffic_replays_without_network(tmp_path):
+    calls = []
+    cassette = Cassette(tmp_path / "cassette", "record")
+    with httpx.Client(
+        transport=RecordingTransport(cassette, _echo_transport(calls))
+    ) as client:
+        first = client.get("https://api.example/items?kptnkey=secret").json()
+        client.get("https://api.example/items?kptnkey=secret")
+
+    interactions = (tmp_path / "cassette" / "interactions.jsonl").read_text()
+    assert "secret" not in interactions
+    assert len(interactions.splitlines()) == 2
+    # identical bodies are stored once
+    assert len(list((tmp_path / "cassette" / "bodies").iterdir())) == 1
+
+    replay = Cassette(tmp_path / "cassette", "replay")
+    with httpx.Client(transport=ReplayTransport(replay)) as client:
+        replayed = client.get("https://api.example/items?kptnkey=other").json()
+
+    assert replayed == first
+    assert len(calls) == 2
+
+
+def test_replay_prefers_interaction_with_matching_request_body(tmp_path):
+    cassette = Cassette(tmp_path, "record")
+    with httpx.Client(
+        transport=RecordingTransport(cassette, _echo_transport([]))
+    ) as client:
+        client.post("https://api.example/recipes", json={"name": "first"})
+        client.post("https://api.example/recipes", json={"name": "second"})
+
+    replay = Cassette(tmp_path, "replay")
+    with httpx.Client(transport=ReplayTransport(replay)) as client:
+        second = client.post("https://api.example/recipes", json={"name": "second"})
+        first = client.post("https://api.example/recipes", json={"name": "first"})
+
+    assert json.loads(second.json()["body"]) == {"name": "second"}
+    assert json.loads(first.json()["body"]) == {"name": "first"}
+
+
+def test_replay_raises_transport_error_for_unknown_request(tmp_path):
+    Cassette(tmp_path, "record")
+    replay = Cassette(tmp_path, "replay")
+
+    with (
+        httpx.Client(transport=ReplayTransport(replay)) as client,
+        pytest.raises(CassetteMissError),
+    ):
+        client.get("https://api.example/unknown")
+
+
+def test_cli_records_and_replays_a_command(tmp_path, monkeypatch):
+    runner = CliRunner()
+    cassette_dir = tmp_path / "cassette"
+    with FakeKptnCookApi(FakeApiConfig(catalog_size=20)) as api:
+        monkeypatch.setenv("KPTNCOOK_API_URL", api.url)
+        clear_settings_cache()
+        recorded = runner.invoke(
+            kptncook.cli, ["--record", str(cassette_dir), "discovery-screen"]
+        )
+
+    replayed = runner.invoke(
+        kptncook.cli, ["--replay", str(cassette_dir), "discovery-screen"]
+    )
+
+    assert recorded.exit_code == 0, recorded.output
+    assert replayed.exit_code == 0, replayed.output
+    assert "fake-list-0" in replayed.output
+    assert replayed.output == recorded.output
+    assert get_default_transport() is None
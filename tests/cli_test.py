@@ -1,6 +1,7 @@
 import subprocess
 import sys
 from datetime import date
+from types import SimpleNamespace
 from pathlib import Path
 from importlib import import_module
 
@@ -61,10 +62,38 @@ def test_search_by_id_share_url_handles_http_error(monkeypatch):
 
     with pytest.raises(SystemExit):
         kptncook.search_kptncook_recipe_by_id(
-            "https://share.kptncook.com/Dh4a/351k4802"
+            "https://share.kptncook.com/Dh4a/351k4802", from_file=None
         )
 
 
+def test_search_by_id_reads_ids_from_stdin(monkeypatch):
+    cli_module = import_module("kptncook.cli")
+    captured = {}
+
+    def fake_search(ids, *, concurrency):
+        captured["ids"] = ids
+        captured["concurrency"] = concurrency
+        return SimpleNamespace(
+            found=[], not_found=["c" * 24], invalid=[("junk", "bad")], saved_count=2
+        )
+
+    monkeypatch.setattr(cli_module, "search_recipes_by_ids_workflow", fake_search)
+
+    result = runner.invoke(
+        kptncook.cli,
+        ["search-by-id", "--from-file", "-", "--concurrency", "3"],
+        input="# favourites\nhttps://share.kptncook.com/abc\n" + "a" * 24 + "\n",
+    )
+
+    assert result.exit_code == 0, result.output
+    assert captured == {
+        "ids": ["https://share.kptncook.com/abc", "a" * 24],
+        "concurrency": 3,
+    }
+    assert "Skipped junk: bad" in result.output
+    assert "Added 2 recipes to local repository" in result.output
+
+
 def test_command_renders_config_errors_at_cli_boundary(monkeypatch, capsys):
     cli_module = import_module("kptncook.cli")
 
@@ -144,6 +173,24 @@ def test_sync_with_mealie_command_smoke_renders_warning_summary(monkeypatch):
     assert "Created 2 recipes" in result.output
 
 
+def test_mealie_purge_without_recipes_does_not_ask(monkeypatch):
+    cli_module = import_module("kptncook.cli")
+    calls = []
+
+    def fake_purge(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(slugs=[], deleted=[], failed=[], deleted_items={})
+
+    monkeypatch.setattr(cli_module, "purge_mealie_recipes", fake_purge)
+
+    result = runner.invoke(cli_module.app, ["mealie-purge", "--orphans"])
+
+    assert result.exit_code == 0
+    assert "nothing to purge" in result.output
+    assert "Delete these recipes" not in result.output
+    assert calls == [{"dry_run": True}]
+
+
 def test_access_token_command_saves_token_without_printing_it(monkeypatch, tmp_path):
     cli_module = import_module("kptncook.cli")
     env_path = tmp_path / ".env"
@@ -225,3 +272,28 @@ def test_discovery_list_save_command_smoke_uses_service_result(monkeypatch, mini
     assert result.exit_code == 0
     assert captured["recipes"] == [recipe]
     assert "Added 1 recipes to local repository" in result.output
+
+
+def test_export_command_runs_selected_targets(monkeypatch):
+    cli_module = import_module("kptncook.cli")
+    captured = {}
+
+    def fake_export(targets, *, prune):
+        captured.update(targets=targets, prune=prune)
+        return SimpleNamespace(
+            results=[
+                SimpleNamespace(target="tandoor", written=1, skipped=2, removed=0)
+            ],
+            invalid_repository_entries=[],
+        )
+
+    monkeypatch.setattr(cli_module, "export_recipes_to_targets", fake_export)
+
+    result = runner.invoke(kptncook.cli, ["export", "--to", "tandoor,md", "--prune"])
+    assert result.exit_code != 0
+    assert "Unknown export format" in result.output
+
+    result = runner.invoke(kptncook.cli, ["export", "--to", "tandoor", "--prune"])
+    assert result.exit_code == 0, result.output
+    assert captured == {"targets": ["tandoor"], "prune": True}
+    assert "tandoor: written 1, unchanged 2, removed 0" in result.output
@@ -0,0 +1,105 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+from kptncook.daemon import (
+    CronSchedule,
+    DaemonConfigError,
+    DaemonJob,
+    DaemonScheduler,
+    parse_daemon_jobs,
+    read_daemon_status,
+)
+
+
+@pytest.mark.parametrize(
+    "expression, moment, expected",
+    [
+        ("0 6 * * *", datetime(2026, 10, 19, 7, 0), datetime(2026, 10, 20, 6, 0)),
+        ("0 6 * * *", datetime(2026, 10, 19, 5, 59, 30), datetime(2026, 10, 19, 6, 0)),
+        # Saturday -> next weekday is Monday
+        ("*/15 * * * 1-5", datetime(2026, 10, 24, 12, 0), datetime(2026, 10, 26, 0, 0)),
+        ("30 2 1 */3 *", datetime(2026, 10, 19, 0, 0), datetime(2027, 1, 1, 2, 30)),
+        # both day fields restricted: either one matches (Sunday the 25th)
+        ("0 0 1 * 7", datetime(2026, 10, 19, 0, 0), datetime(2026, 10, 25, 0, 0)),
+        # a stepped "*/2" is not restricted: odd days that are Mondays
+        ("0 3 */2 * 1", datetime(2026, 10, 20, 0, 0), datetime(2026, 11, 9, 3, 0)),
+    ],
+)
+def test_cron_schedule_next_after(expression, moment, expected):
+    assert CronSchedule.parse(expression).next_after(moment) == expected
+
+
+@pytest.mark.parametrize(
+    "expression", ["* * *", "61 * * * *", "a * * * *", "0 0 31 2 *"]
+)
+def test_cron_schedule_rejects_invalid_expressions(expression):
+    with pytest.raises(DaemonConfigError):
+        CronSchedule.parse(expression).next_after(datetime(2026, 1, 1))
+
+
+def test_parse_daemon_jobs_reads_jitter():
+    jobs = parse_daemon_jobs(
+        "sync=0 6 * * *~300; backup-favorites=30 6 * * 0", default_jitter=10
+    )
+
+    assert [(job.name, job.schedule.expression, job.jitter) for job in jobs] == [
+        ("sync", "0 6 * * *", 300.0),
+        ("backup-favorites", "30 6 * * 0", 10.0),
+    ]
+    with pytest.raises(DaemonConfigError, match="Unknown daemon job"):
+        parse_daemon_jobs("nope=* * * * *")
+
+
+def test_scheduler_skips_overlapping_runs_and_writes_status(tmp_path):
+    now = [datetime(2026, 10, 19, 6, 0, 30).timestamp()]
+    release = threading.Event()
+    calls = []
+
+    def slow_job():
+        calls.append(now[0])
+        release.wait(5)
+
+    job = DaemonJob(
+        name="sync", schedule=CronSchedule.parse("* * * * *"), action=slow_job
+    )
+    status_path = tmp_path / "daemon_status.json"
+    scheduler = DaemonScheduler([job], status_path=status_path, clock=lambda: now[0])
+
+    assert scheduler.run_pending() == []  # first tick only schedules
+    now[0] += 60
+    assert scheduler.run_pending() == ["sync"]
+    now[0] += 60
+    assert scheduler.run_pending() == []  # still running
+    release.set()
+    scheduler.wait_for_running_jobs(timeout=5)
+
+    status = read_daemon_status(status_path)
+    assert len(calls) == 1
+    assert status["jobs"]["sync"]["runs"] == 1
+    assert status["jobs"]["sync"]["skipped_overlaps"] == 1
+    assert status["jobs"]["sync"]["last_status"] == "ok"
+    assert status["jobs"]["sync"]["running"] is False
+
+
+def test_scheduler_records_failures(tmp_path):
+    now = [datetime(2026, 10, 19, 6, 0).timestamp()]
+
+    def failing_job():
+        raise RuntimeError("boom")
+
+    job = DaemonJob(
+        name="sync", schedule=CronSchedule.parse("* * * * *"), action=failing_job
+    )
+    scheduler = DaemonScheduler(
+        [job], status_path=tmp_path / "status.json", clock=lambda: now[0]
+    )
+    scheduler.run_pending()
+    now[0] += 60
+    scheduler.run_pending()
+    scheduler.wait_for_running_jobs(timeout=5)
+
+    assert job.failures == 1
+    assert job.last_error == "boom"
+    assert job.next_run is not None and job.next_run > now[0]
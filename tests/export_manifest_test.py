@@ -0,0 +1,42 @@
+from kptncook.export_manifest import ExportManifest, content_hash
+
+
+def test_content_hash_separates_parts():
+    assert content_hash("ab", "c") != content_hash("a", "bc")
+    assert content_hash("a", b"b") == content_hash(b"a", "b")
+
+
+def test_manifest_round_trip_and_unchanged_check(tmp_path):
+    path = tmp_path / "recipe.md"
+    path.write_text("recipe", encoding="utf-8")
+    manifest = ExportManifest(tmp_path, ".manifest.json")
+    manifest.record("1", path, "hash")
+    manifest.save()
+
+    loaded = ExportManifest(tmp_path, ".manifest.json")
+
+    assert loaded.is_unchanged("1", path, "hash")
+    assert not loaded.is_unchanged("1", path, "other")
+    assert not loaded.is_unchanged("1", tmp_path / "renamed.md", "hash")
+    path.unlink()
+    assert not loaded.is_unchanged("1", path, "hash")
+
+
+def test_renamed_file_is_kept_when_another_recipe_uses_it(tmp_path):
+    old, new = tmp_path / "old.md", tmp_path / "new.md"
+    old.write_text("old", encoding="utf-8")
+    manifest = ExportManifest(tmp_path, ".manifest.json")
+    manifest.record("1", old, "hash")
+
+    previous = manifest.record("1", new, "hash")
+    manifest.record("2", old, "hash")
+
+    assert previous == old
+    assert manifest.remove_renamed([previous]) == 0
+    assert old.exists()
+
+
+def test_unreadable_manifest_starts_empty(tmp_path):
+    (tmp_path / ".manifest.json").write_text("{", encoding="utf-8")
+
+    assert ExportManifest(tmp_path, ".manifest.json").entries == {}
@@ -1,7 +1,10 @@
+import threading
+
 from kptncook.exporter_utils import (
     expand_timer_placeholders,
     format_timer,
     get_step_text,
+    iter_prefetched,
 )
 from kptncook.models import Image, LocalizedString, RecipeStep, StepTimer
 
@@ -81,3 +84,29 @@ class TestGetStepText:
             image=Image(name="x.jpg", url="https://example.com/x.jpg"),
         )
         assert get_step_text(step) == "Ca. 2-3 min. braten."
+
+
+class TestIterPrefetched:
+    def test_yields_results_in_input_order(self):
+        results = [
+            (item, future.result())
+            for item, future in iter_prefetched(range(10), str, concurrency=3)
+        ]
+        assert results == [(i, str(i)) for i in range(10)]
+
+    def test_fetches_concurrently_and_bounds_lookahead(self):
+        barrier = threading.Barrier(2, timeout=5)
+        started = []
+
+        def fetch(item):
+            started.append(item)
+            if item < 2:
+                barrier.wait()
+            return item
+
+        prefetched = iter_prefetched(range(100), fetch, concurrency=2)
+        first, future = next(prefetched)
+
+        assert (first, future.result()) == (0, 0)
+        assert len(started) <= 4
+        prefetched.close()
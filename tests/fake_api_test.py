@@ -0,0 +1,81 @@
+import httpx
+import pytest
+
+from kptncook.api import KptnCookClient
+from kptncook.fake_api import (
+    FAKE_IMAGE_BYTES,
+    FakeApiConfig,
+    FakeKptnCookApi,
+    recipe_oid,
+    recipe_uid,
+)
+from kptncook.models import Recipe
+from kptncook.services.discovery import parse_discovery_screen
+
+
+@pytest.fixture
+def fake_api():
+    with FakeKptnCookApi(FakeApiConfig(catalog_size=50, list_size=5)) as api:
+        yield api
+
+
+def test_fake_api_resolves_recipes_that_validate(fake_api):
+    client = KptnCookClient(base_url=fake_api.url, api_key="test-key")
+
+    recipes = client.get_by_ids([("oid", recipe_oid(3)), ("uid", recipe_uid(7))])
+
+    assert [recipe.id for recipe in recipes] == [recipe_oid(3), recipe_oid(7)]
+    for recipe in recipes:
+        parsed = Recipe.model_validate(recipe.data)
+        assert parsed.get_image_url("test-key") is not None
+
+
+def test_fake_api_catalog_is_deterministic(fake_api):
+    client = KptnCookClient(base_url=fake_api.url, api_key="test-key")
+
+    first = client.get_by_ids([("oid", recipe_oid(1))])
+    second = client.get_by_ids([("oid", recipe_oid(1))])
+
+    assert first[0].data == second[0].data
+
+
+def test_fake_api_serves_discovery_lists(fake_api):
+    client = KptnCookClient(base_url=fake_api.url, api_key="test-key")
+
+    screen = parse_discovery_screen(client.get_discovery_screen())
+    first_list = screen.lists[0]
+    items = client.get_discovery_list(
+        list_type=first_list.list_type or "", list_id=first_list.list_id
+    )
+
+    assert len(screen.lists) == 6
+    assert len(items) == 5
+    assert len(client.resolve_recipe_summaries(items)) == 5
+
+
+def test_fake_api_favorites_require_token(fake_api):
+    anonymous = KptnCookClient(base_url=fake_api.url, api_key="test-key")
+    with pytest.raises(httpx.HTTPStatusError):
+        anonymous.list_favorites()
+
+    client = KptnCookClient(
+        base_url=fake_api.url, api_key="test-key", access_token="token"
+    )
+    assert len(client.list_favorites()) == 25
+
+
+def test_fake_api_serves_images(fake_api):
+    response = httpx.get(f"{fake_api.url}/image/abc")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.content == FAKE_IMAGE_BYTES
+
+
+def test_fake_api_injects_errors():
+    with FakeKptnCookApi(FakeApiConfig(catalog_size=5, error_rate=1.0)) as api:
+        client = KptnCookClient(base_url=api.url, api_key="test-key")
+        with pytest.raises(httpx.HTTPStatusError) as exc_info:
+            client.list_dailies()
+
+    assert exc_info.value.response.status_code == 503
@@ -0,0 +1,22 @@
+from kptncook.http_client import RateLimiter
+
+
+def test_rate_limiter_spaces_out_calls():
+    now = [100.0]
+    sleeps: list[float] = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+
+    limiter = RateLimiter(4, clock=lambda: now[0], sleep=sleep)
+    for _ in range(3):
+        limiter.wait()
+
+    assert sleeps == [0.25, 0.5]
+
+
+def test_rate_limiter_without_rate_never_sleeps():
+    limiter = RateLimiter(None, sleep=lambda _seconds: 1 / 0)
+
+    limiter.wait()
+    limiter.wait()
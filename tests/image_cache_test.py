@@ -0,0 +1,249 @@
+import threading
+
+import httpx
+import pytest
+
+from kptncook.image_cache import ImageCache, cache_key, get_image_cache
+from kptncook.step_images import StepImageDownloader
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _cache(tmp_path, handler, *, max_size=1024, max_age=60, clock=None):
+    return ImageCache(
+        tmp_path / "image_cache",
+        max_size=max_size,
+        max_age=max_age,
+        client=httpx.Client(transport=httpx.MockTransport(handler)),
+        clock=clock or Clock(),
+    )
+
+
+def test_cache_key_drops_api_key():
+    assert (
+        cache_key("https://img.kptncook.com/a.jpg?kptnkey=secret&w=200")
+        == "https://img.kptncook.com/a.jpg?w=200"
+    )
+    assert cache_key("https://img.kptncook.com/a.jpg?kptnkey=x") == (
+        "https://img.kptncook.com/a.jpg"
+    )
+
+
+def test_fresh_images_are_served_without_requests_across_runs(tmp_path):
+    requested = []
+
+    def handler(request):
+        requested.append(str(request.url))
+        return httpx.Response(200, content=b"cover")
+
+    cache = _cache(tmp_path, handler)
+    assert cache.get("https://img/a.jpg?kptnkey=one") == b"cover"
+    assert cache.get("https://img/a.jpg?kptnkey=two") == b"cover"
+    cache.close()
+
+    again = _cache(tmp_path, handler)
+    assert again.get("https://img/a.jpg?kptnkey=three") == b"cover"
+    assert requested == ["https://img/a.jpg?kptnkey=one"]
+
+
+def test_stale_images_are_revalidated_conditionally(tmp_path):
+    clock = Clock()
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, content=b"cover", headers={"ETag": '"v1"'})
+
+    cache = _cache(tmp_path, handler, clock=clock)
+    first = cache.fetch("https://img/a.jpg")
+    clock.now += 120
+
+    second = cache.fetch("https://img/a.jpg")
+    cache.fetch("https://img/a.jpg")
+
+    assert seen == [None, '"v1"']
+    assert second == first
+    assert second.read_bytes() == b"cover"
+
+
+def test_stale_images_are_served_when_offline(tmp_path):
+    clock = Clock()
+    online = True
+
+    def handler(request):
+        if not online:
+            raise httpx.ConnectError("offline", request=request)
+        return httpx.Response(200, content=b"cover")
+
+    cache = _cache(tmp_path, handler, clock=clock)
+    cache.get("https://img/a.jpg")
+    clock.now += 120
+    online = False
+
+    assert cache.get("https://img/a.jpg") == b"cover"
+    with pytest.raises(httpx.ConnectError):
+        cache.get("https://img/b.jpg")
+
+
+def test_least_recently_used_images_are_evicted(tmp_path):
+    clock = Clock()
+
+    def handler(request):
+        return httpx.Response(200, content=request.url.path.encode() * 10)
+
+    cache = _cache(tmp_path, handler, max_size=150, clock=clock)
+    a = cache.fetch("https://img/a.jpg")
+    clock.now += 1
+    cache.fetch("https://img/b.jpg")
+    clock.now += 1
+    cache.fetch("https://img/a.jpg")
+    clock.now += 1
+    cache.fetch("https://img/c.jpg")
+
+    assert set(cache.entries) == {"https://img/a.jpg", "https://img/c.jpg"}
+    assert a.path.is_file()
+    blobs = (tmp_path / "image_cache" / "blobs").rglob("*")
+    assert len([blob for blob in blobs if blob.is_file()]) == 2
+
+
+def test_pinned_images_are_not_evicted_until_unpinned(tmp_path):
+    clock = Clock()
+
+    def handler(request):
+        return httpx.Response(200, content=request.url.path.encode() * 10)
+
+    cache = _cache(tmp_path, handler, max_size=150, clock=clock)
+    pinned = cache.fetch("https://img/a.jpg", pin=True)
+    for name in "bcd":
+        clock.now += 1
+        cache.fetch(f"https://img/{name}.jpg")
+
+    assert pinned.read_bytes() == b"/a.jpg" * 10
+    assert "https://img/a.jpg" in cache.entries
+
+    cache.unpin(pinned.digest)
+    clock.now += 1
+    cache.fetch("https://img/e.jpg")
+
+    assert "https://img/a.jpg" not in cache.entries
+    assert not pinned.path.exists()
+
+
+def test_images_being_revalidated_are_not_evicted(tmp_path):
+    clock = Clock()
+    revalidating = threading.Event()
+    answer = threading.Event()
+
+    def handler(request):
+        if request.headers.get("If-None-Match"):
+            revalidating.set()
+            answer.wait(5)
+            return httpx.Response(304)
+        return httpx.Response(
+            200, content=request.url.path.encode() * 10, headers={"ETag": '"v1"'}
+        )
+
+    cache = _cache(tmp_path, handler, max_size=70, clock=clock)
+    cache.fetch("https://img/a.jpg")
+    clock.now += 120
+    results = []
+    reader = threading.Thread(
+        target=lambda: results.append(cache.get("https://img/a.jpg"))
+    )
+    reader.start()
+    assert revalidating.wait(5)
+    # Overflows the cache while "a" waits for its 304.
+    cache.fetch("https://img/b.jpg")
+    answer.set()
+    reader.join(5)
+
+    assert results == [b"/a.jpg" * 10]
+    assert cache._pins == {}
+
+
+def test_index_is_saved_in_batches_and_on_close(tmp_path, monkeypatch):
+    monkeypatch.setattr("kptncook.image_cache.INDEX_SAVE_INTERVAL", 2)
+
+    def handler(request):
+        return httpx.Response(200, content=request.url.path.encode())
+
+    cache = _cache(tmp_path, handler)
+    cache.fetch("https://img/a.jpg")
+    assert not cache.index_path.exists()
+
+    cache.fetch("https://img/b.jpg")
+    assert cache.index_path.exists()
+
+    cache.fetch("https://img/c.jpg")
+    cache.close()
+    assert len(_cache(tmp_path, handler).entries) == 3
+
+
+def test_identical_images_share_one_blob(tmp_path):
+    def handler(request):
+        return httpx.Response(200, content=b"same")
+
+    cache = _cache(tmp_path, handler)
+
+    first = cache.fetch("https://img/a.jpg")
+    second = cache.fetch("https://img/b.jpg")
+
+    assert first.path == second.path
+
+
+def test_step_image_downloader_reads_through_cache(tmp_path):
+    requested = []
+
+    def handler(request):
+        requested.append(request.url.path)
+        return httpx.Response(200, content=b"step")
+
+    for _ in range(2):
+        cache = _cache(tmp_path, handler)
+        downloader = StepImageDownloader(cache=cache)
+        with downloader.get("https://img/step.jpg").open() as body:
+            assert body.read() == b"step"
+        downloader.close()
+        cache.close()
+
+    assert requested == ["/step.jpg"]
+
+
+def test_step_images_keep_cached_blobs_until_released(tmp_path):
+    clock = Clock()
+
+    def handler(request):
+        return httpx.Response(200, content=request.url.path.encode() * 10)
+
+    cache = _cache(tmp_path, handler, max_size=150, clock=clock)
+    downloader = StepImageDownloader(cache=cache)
+    image = downloader.acquire("https://img/step.jpg").result()
+    for name in "bcd":
+        clock.now += 1
+        cache.fetch(f"https://img/{name}.jpg")
+
+    # Each upload opens the blob itself; nothing stays open in between.
+    for _ in range(2):
+        with image.open() as body:
+            assert body.read() == b"/step.jpg" * 10
+    downloader.release("https://img/step.jpg")
+    clock.now += 1
+    cache.fetch("https://img/e.jpg")
+
+    assert "https://img/step.jpg" not in cache.entries
+    downloader.close()
+
+
+def test_get_image_cache_lives_below_home_directory(tmp_path):
+    cache = get_image_cache()
+
+    assert cache is get_image_cache()
+    assert cache.directory == tmp_path / "kptncook-home" / "image_cache"
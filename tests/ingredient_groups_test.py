@@ -1,5 +1,7 @@
 from kptncook.config import settings
 from kptncook.ingredient_groups import (
+    get_ingredient_group_labels,
+    group_ingredients,
     iter_ingredient_groups,
     parse_ingredient_group_labels,
 )
@@ -40,3 +42,14 @@ def test_iter_ingredient_groups_enabled(full_recipe, monkeypatch):
     assert labels[:2] == ["Need", "Pantry"]
     assert any(ingredient.ingredient.typ == "regular" for ingredient in groups[0][1])
     assert any(ingredient.ingredient.typ == "basic" for ingredient in groups[1][1])
+
+
+def test_group_ingredients_uses_given_labels(full_recipe, monkeypatch):
+    recipe = Recipe.model_validate(full_recipe)
+    monkeypatch.setattr(settings, "kptncook_group_ingredients_by_typ", True)
+
+    assert get_ingredient_group_labels() is not None
+    groups = group_ingredients(recipe.ingredients, {"basic": "Vorrat"})
+
+    assert groups[0][0] == "Vorrat"
+    assert group_ingredients(recipe.ingredients, None) == [(None, recipe.ingredients)]
@@ -1,7 +1,10 @@
+import threading
+
 import pytest
 
+from kptncook import markdown_exporter
 from kptncook.config import get_settings, settings
-from kptncook.markdown_exporter import MarkdownExporter
+from kptncook.markdown_exporter import MarkdownExporter, RenderContext
 from kptncook.models import Recipe
 
 
@@ -89,6 +92,17 @@ def test_quantity_is_not_scaled_by_servings(exporter):
     assert "160" not in md
 
 
+def test_context_without_group_labels_is_not_regrouped(exporter, monkeypatch):
+    recipe = build_recipe(ingredients=[ingredient(40.0, "g", "Mehl")])
+    context = RenderContext.from_settings()
+    monkeypatch.setattr(settings, "kptncook_group_ingredients_by_typ", True)
+
+    md = exporter.render_recipe(recipe, context)
+
+    assert "- 40 g Mehl" in md
+    assert "You need" not in md
+
+
 def test_cooktime_omitted_when_missing(exporter):
     recipe = build_recipe()
     recipe.cooking_time = None
@@ -180,3 +194,90 @@ def test_export_handles_secondary_filename_collisions():
 
     assert len({str(path) for path in written}) == 3
     assert all(path.exists() for path in written)
+
+
+def test_export_changes_skips_unchanged_recipes():
+    get_settings()
+    recipe = build_recipe()
+
+    first = MarkdownExporter().export_changes([recipe])
+    path = first.paths[0]
+    path.write_text("edited", encoding="utf-8")
+    second = MarkdownExporter().export_changes([recipe])
+
+    assert (first.written, first.skipped) == (1, 0)
+    assert (second.written, second.skipped, second.removed) == (0, 1, 0)
+    assert path.read_text(encoding="utf-8") == "edited"
+
+
+def test_export_changes_removes_file_of_renamed_recipe():
+    get_settings()
+    MarkdownExporter().export_changes([build_recipe()])
+    old_path = next((settings.root / "export_md").glob("*.md"))
+
+    report = MarkdownExporter().export_changes(
+        [build_recipe(localizedTitle={"de": "Neuer Titel"})]
+    )
+
+    assert (report.written, report.removed) == (1, 1)
+    assert not old_path.exists()
+    assert report.paths[0].exists()
+
+
+def test_export_changes_rewrites_recipe_whose_file_was_taken_over():
+    get_settings()
+    first = build_recipe(_id={"$oid": "1"}, uid="first")
+    second = build_recipe(_id={"$oid": "2"}, uid="second")
+    MarkdownExporter().export_changes([first, second])
+    # Alone, the second recipe gets the unsuffixed name of the first one.
+    MarkdownExporter().export_changes([second])
+
+    report = MarkdownExporter().export_changes([first, second])
+
+    assert report.written == 2
+    contents = [path.read_text(encoding="utf-8") for path in report.paths]
+    assert "first" in contents[0] and "second" not in contents[0]
+    assert "second" in contents[1]
+
+
+def test_export_changes_prunes_only_when_asked():
+    get_settings()
+    first = build_recipe(_id={"$oid": "1"}, localizedTitle={"de": "Eins"})
+    second = build_recipe(_id={"$oid": "2"}, localizedTitle={"de": "Zwei"})
+    written = MarkdownExporter().export([first, second])
+
+    kept = MarkdownExporter().export_changes([first])
+    pruned = MarkdownExporter().export_changes([first], prune=True)
+
+    assert kept.removed == 0
+    assert pruned.removed == 1
+    assert written[0].exists()
+    assert not written[1].exists()
+
+
+def test_export_reads_settings_once_and_writes_concurrently(mocker):
+    get_settings()
+    recipes = [
+        build_recipe(_id={"$oid": str(index)}, localizedTitle={"de": "Gleich"})
+        for index in range(3)
+    ]
+    from_settings = mocker.spy(RenderContext, "from_settings")
+    # Two files have to be written at once for either write to finish.
+    barrier = threading.Barrier(2, timeout=5)
+    write = markdown_exporter.write_atomically
+
+    def write_atomically(path, text):
+        if path.name != "Gleich.md":
+            barrier.wait()
+        write(path, text)
+
+    mocker.patch.object(markdown_exporter, "write_atomically", write_atomically)
+
+    written = MarkdownExporter().export(recipes, concurrency=3)
+
+    assert from_settings.call_count == 1
+    assert [path.name for path in written] == [
+        "Gleich.md",
+        "Gleich-1.md",
+        "Gleich-2.md",
+    ]
@@ -0,0 +1,73 @@
+import json
+import zipfile
+
+import httpx
+
+from kptncook.mealie import RecipeStep, RecipeWithImage
+from kptncook.mealie_archive import (
+    archive_recipe_payload,
+    build_import_archive,
+    mealie_slug,
+)
+from kptncook.models import Image
+from kptncook.step_images import StepImageDownloader
+
+
+def _recipe(name, oid, image_url=None):
+    return RecipeWithImage(
+        name=name,
+        image_url=image_url,
+        recipe_instructions=[
+            RecipeStep(
+                text="Chop", image=Image(name="step.jpg", url="http://img/step.jpg")
+            )
+        ],
+        extras={"kptncook_id": oid, "source": "kptncook", "kptncook_hash": "abc"},
+    )
+
+
+def test_mealie_slug_matches_mealie_naming():
+    assert mealie_slug("Crème brûlée mit Beeren!") == "creme-brulee-mit-beeren"
+    assert mealie_slug("Mom's Pasta") == "moms-pasta"
+
+
+def test_archive_payload_leaves_out_hash_and_step_images():
+    payload = archive_recipe_payload(_recipe("Pasta", "oid-1"))
+
+    assert payload["slug"] == "pasta"
+    assert payload["extras"] == {"kptncook_id": "oid-1", "source": "kptncook"}
+    assert "image" not in payload["recipe_instructions"][0]
+    assert "image_url" not in payload
+
+
+def test_build_import_archive_embeds_cover_images(tmp_path):
+    downloads = []
+
+    def handler(request):
+        downloads.append(str(request.url))
+        if request.url.path == "/broken.jpg":
+            return httpx.Response(404)
+        return httpx.Response(200, content=b"cover")
+
+    images = StepImageDownloader(
+        client=httpx.Client(transport=httpx.MockTransport(handler))
+    )
+    recipes = [
+        _recipe("Pasta", "oid-1", "http://img/cover.jpg"),
+        _recipe("Soup", "oid-2", "http://img/broken.jpg"),
+        _recipe("Pasta", "oid-3"),
+    ]
+    path = tmp_path / "import.zip"
+
+    assert build_import_archive(path, recipes, images) == 2
+    images.close()
+
+    with zipfile.ZipFile(path) as archive:
+        assert sorted(archive.namelist()) == [
+            "recipes/pasta/images/original.webp",
+            "recipes/pasta/pasta.json",
+            "recipes/soup/soup.json",
+        ]
+        assert archive.read("recipes/pasta/images/original.webp") == b"cover"
+        stored = json.loads(archive.read("recipes/pasta/pasta.json"))
+    assert stored["extras"]["kptncook_id"] == "oid-1"
@@ -0,0 +1,133 @@
+import threading
+from types import SimpleNamespace
+
+import httpx
+
+from kptncook.mealie import RecipeAsset
+from kptncook.mealie_ledger import (
+    MealieJournal,
+    MealieLedger,
+    discard_orphan_trunks,
+    reconcile_ledger,
+)
+
+MEALIE_URL = "http://mealie.local/api"
+
+
+class FakeMealie:
+    def __init__(self, recipes):
+        self.recipes = recipes
+        self.detail_fetches: list[str] = []
+
+    def get_recipes_with_tag(self, tag_name):
+        assert tag_name == "kptncook"
+        return [SimpleNamespace(slug=slug) for slug in self.recipes], False
+
+    def get_via_slug(self, slug):
+        self.detail_fetches.append(slug)
+        extras = self.recipes[slug]
+        if extras is None:
+            request = httpx.Request("GET", f"{MEALIE_URL}/recipes/{slug}")
+            raise httpx.ConnectError("boom", request=request)
+        return SimpleNamespace(slug=slug, id=f"id-{slug}", extras=extras)
+
+
+def test_reconcile_only_fetches_unknown_slugs(tmp_path):
+    path = tmp_path / "mealie_ledger.json"
+    mealie = FakeMealie(
+        {
+            "pasta": {"source": "kptncook", "kptncook_id": "oid-1"},
+            "family-cake": {},
+            "flaky": None,
+        }
+    )
+
+    ledger = MealieLedger(path, MEALIE_URL)
+    assert reconcile_ledger(ledger, mealie) == {"oid-1"}
+    assert sorted(mealie.detail_fetches) == ["family-cake", "flaky", "pasta"]
+    ledger.save()
+    mealie.detail_fetches.clear()
+
+    del mealie.recipes["pasta"]
+    mealie.recipes["soup"] = {"source": "kptncook", "kptncook_id": "oid-2"}
+
+    ledger = MealieLedger(path, MEALIE_URL)
+    assert reconcile_ledger(ledger, mealie) == {"oid-2"}
+    # the failed lookup is retried, known slugs are not fetched again
+    assert sorted(mealie.detail_fetches) == ["flaky", "soup"]
+    assert ledger.get("oid-2").recipe_id == "id-soup"
+
+
+def test_ledger_for_other_instance_or_broken_file_is_ignored(tmp_path):
+    path = tmp_path / "mealie_ledger.json"
+    ledger = MealieLedger(path, MEALIE_URL)
+    ledger.record("oid-1", "pasta", recipe_id="id", content_hash="abc")
+    ledger.save()
+
+    assert MealieLedger(path, MEALIE_URL).get("oid-1").content_hash == "abc"
+    assert MealieLedger(path, "http://other/api").entries == {}
+
+    path.write_text("{not json", encoding="utf-8")
+    assert MealieLedger(path, MEALIE_URL).entries == {}
+
+
+def test_journal_persists_every_checkpoint(tmp_path):
+    path = tmp_path / "mealie_journal.json"
+    journal = MealieJournal(path, MEALIE_URL)
+    checkpoint = journal.checkpoint("oid-1")
+    checkpoint.advance("trunk", "pasta")
+    checkpoint.add_asset(
+        RecipeAsset(name="step1", icon="mdi-file-image", file_name="step1.jpg")
+    )
+
+    restored = MealieJournal(path, MEALIE_URL).checkpoint("oid-1")
+    assert restored.slug == "pasta"
+    assert restored.reached("trunk") and not restored.reached("image")
+    assert [asset.file_name for asset in restored.assets] == ["step1.jpg"]
+
+    journal.finish("oid-1")
+    assert MealieJournal(path, MEALIE_URL).entries == {}
+
+
+def test_journal_never_overwrites_newer_snapshot(tmp_path):
+    path = tmp_path / "mealie_journal.json"
+    journal = MealieJournal(path, MEALIE_URL)
+    checkpoint = journal.checkpoint("oid-1")
+    checkpoint.advance("trunk", "pasta")
+    newer_written = threading.Event()
+    write_lock = journal._write_lock
+
+    class DelayStaleWriter:
+        # Holds back the stale thread until the newer snapshot is on disk.
+        def __enter__(self):
+            if threading.current_thread().name == "stale":
+                newer_written.wait(timeout=5)
+            return write_lock.__enter__()
+
+        def __exit__(self, *exc_info):
+            return write_lock.__exit__(*exc_info)
+
+    journal._write_lock = DelayStaleWriter()
+    stale = threading.Thread(target=journal.save, name="stale")
+    stale.start()
+    checkpoint.advance("image", "pasta")
+    newer_written.set()
+    stale.join()
+
+    restored = MealieJournal(path, MEALIE_URL).checkpoint("oid-1")
+    assert restored.reached("image")
+
+
+def test_discard_orphan_trunks_deletes_only_abandoned_recipes(tmp_path):
+    journal = MealieJournal(tmp_path / "mealie_journal.json", MEALIE_URL)
+    ledger = MealieLedger(tmp_path / "mealie_ledger.json", MEALIE_URL)
+    for oid, slug in [("resume", "r"), ("gone", "g"), ("done", "d")]:
+        journal.checkpoint(oid).advance("trunk", slug)
+    # Completed after its last checkpoint: must not be deleted.
+    ledger.record("done", "d")
+    deleted_slugs = []
+    client = SimpleNamespace(delete_via_slug=deleted_slugs.append)
+
+    assert discard_orphan_trunks(journal, ledger, client, {"resume"}) == 1
+    assert deleted_slugs == ["g"]
+    assert set(journal.entries) == {"resume"}
@@ -1,4 +1,7 @@
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from types import SimpleNamespace
 from uuid import uuid4
 
@@ -10,16 +13,23 @@ from kptncook import _extract_mealie_detail_message
 from kptncook.config import settings
 from kptncook.http_errors import UserFacingError
 from kptncook.mealie import (
-    ASSET_DOWNLOAD_TIMEOUT,
+    CreateCheckpoint,
     MealieApiClient,
     Recipe,
+    RecipeAsset,
+    RecipeFood,
+    RecipeIngredient,
     RecipeTag,
+    RecipeUnit,
     RecipeStep,
     RecipeWithImage,
     kptncook_to_mealie,
+    mealie_recipe_hash,
 )
 from kptncook.models import Image, LocalizedString, RecipeId
+from kptncook.models import Recipe as KptnCookRecipe
 from kptncook.services import workflows
+from kptncook.step_images import ASSET_DOWNLOAD_TIMEOUT, StepImageDownloader
 
 
 def test_parse_empty_mealie_recipe_is_valid():
@@ -82,18 +92,32 @@ def test_skip_validation_errors():
     assert MealieApiClient.validate_recipes(invalid_recipes) == []
 
 
-def test_upload_asset_follows_redirects(monkeypatch):
-    client = MealieApiClient("http://mealie.local/api")
+def test_client_looks_up_image_cache_on_first_use(monkeypatch):
+    def fail():
+        raise AssertionError("image cache looked up")
+
+    monkeypatch.setattr("kptncook.mealie.get_image_cache", fail)
+
+    MealieApiClient("http://mealie.local/api").close()
+
+
+def test_upload_asset_follows_redirects():
+    def handler(request):
+        if request.url.path == "/step.jpg":
+            return httpx.Response(302, headers={"location": "/cdn/step.jpg"})
+        return httpx.Response(200, content=b"image-bytes")
+
+    downloader = StepImageDownloader(
+        client=httpx.Client(
+            transport=httpx.MockTransport(handler), follow_redirects=True
+        )
+    )
+    client = MealieApiClient("http://mealie.local/api", step_images=downloader)
     image = Image(name="step.jpg", url="http://images.kptncook.com/step.jpg")
     seen = {}
 
-    def fake_get(url, follow_redirects=False, **kwargs):
-        seen["follow_redirects"] = follow_redirects
-        seen["timeout"] = kwargs.get("timeout")
-        request = httpx.Request("GET", url)
-        return httpx.Response(200, request=request, content=b"image-bytes")
-
     def fake_post(path, data=None, files=None, **kwargs):
+        seen["upload"] = files["file"][1].read()
         request = httpx.Request("POST", f"http://mealie.local/api{path}")
         return httpx.Response(
             200,
@@ -101,14 +125,104 @@ def test_upload_asset_follows_redirects(monkeypatch):
             json={"fileName": "step.jpg", "name": "step", "icon": "mdi-file-image"},
         )
 
-    monkeypatch.setattr(httpx, "get", fake_get)
     client.post = fake_post
 
     result = client.upload_asset("recipe-slug", image)
 
-    assert seen["follow_redirects"] is True
-    assert seen["timeout"] == ASSET_DOWNLOAD_TIMEOUT
+    assert seen["upload"] == b"image-bytes"
     assert result["fileName"] == "step.jpg"
+    downloader.close()
+
+
+def test_step_image_downloader_defaults_to_pooled_redirecting_client():
+    downloader = StepImageDownloader()
+
+    assert downloader._client.follow_redirects is True
+    assert downloader._client.timeout == ASSET_DOWNLOAD_TIMEOUT
+    downloader.close()
+
+
+def test_step_images_are_downloaded_once_and_deduplicated_by_content():
+    requested = []
+
+    def handler(request):
+        requested.append(request.url.path)
+        return httpx.Response(200, content=b"same picture")
+
+    downloader = StepImageDownloader(
+        client=httpx.Client(transport=httpx.MockTransport(handler))
+    )
+    urls = ["http://img/a.jpg", "http://img/a.jpg", "http://img/b.jpg"]
+
+    first, again, other = (downloader.get(url) for url in urls)
+
+    assert sorted(requested) == ["/a.jpg", "/b.jpg"]
+    assert first is again is other
+    with other.open() as body:
+        assert body.read() == b"same picture"
+    downloader.close()
+
+
+def test_step_images_are_closed_after_their_last_release():
+    requested = []
+
+    def handler(request):
+        requested.append(request.url.path)
+        return httpx.Response(200, content=b"same picture")
+
+    downloader = StepImageDownloader(
+        client=httpx.Client(transport=httpx.MockTransport(handler))
+    )
+    image = downloader.acquire("http://img/a.jpg").result()
+    downloader.acquire("http://img/b.jpg").result()
+    downloader.acquire("http://img/a.jpg")
+
+    downloader.release("http://img/a.jpg")
+    downloader.release("http://img/a.jpg")
+    with image.open() as body:
+        assert body.read() == b"same picture"
+    downloader.release("http://img/b.jpg")
+
+    assert downloader._by_digest == {}
+    assert image._file.closed
+    downloader.get("http://img/a.jpg")
+    assert requested == ["/a.jpg", "/b.jpg", "/a.jpg"]
+    downloader.close()
+
+
+def test_enrich_recipe_uploads_step_images_concurrently(monkeypatch):
+    client = MealieApiClient("http://mealie.local/api", upload_concurrency=2)
+    recipe = RecipeWithImage(
+        name="Test recipe",
+        slug="recipe-slug",
+        recipe_instructions=[
+            RecipeStep(
+                text=f"Step {i}",
+                image=Image(name=f"step{i}.jpg", url=f"http://img/step{i}.jpg"),
+            )
+            for i in range(3)
+        ],
+    )
+    # Only passes if two uploads are in flight at the same time.
+    barrier = threading.Barrier(2, timeout=5)
+    monkeypatch.setattr(client.step_images, "fetch", lambda url: None)
+
+    def fake_upload_asset(_slug, image):
+        if image.name != "step2.jpg":
+            barrier.wait()
+        stem = image.name.removesuffix(".jpg")
+        return {"name": stem, "icon": "mdi-file-image", "fileName": image.name}
+
+    monkeypatch.setattr(client, "upload_asset", fake_upload_asset)
+
+    result = client.enrich_recipe_with_step_images(recipe)
+
+    assert [asset.file_name for asset in result.assets] == [
+        "step0.jpg",
+        "step1.jpg",
+        "step2.jpg",
+    ]
+    assert "step0.jpg" in result.recipe_instructions[0].text
 
 
 def test_mealie_client_reuses_injected_httpx_client():
@@ -120,6 +234,73 @@ def test_mealie_client_reuses_injected_httpx_client():
     shared_client.close()
 
 
+def test_get_all_recipes_fetches_remaining_pages_concurrently():
+    seen_pages = []
+    # Pages 2 and 3 only finish if both are requested at the same time.
+    barrier = threading.Barrier(2, timeout=5)
+
+    def handler(request):
+        page = int(request.url.params["page"])
+        seen_pages.append((page, request.url.params["perPage"]))
+        if page > 1:
+            barrier.wait()
+        items = [{"name": f"recipe-{page}", "slug": f"recipe-{page}"}]
+        return httpx.Response(200, json={"items": items, "total_pages": 3})
+
+    shared_client = httpx.Client(transport=httpx.MockTransport(handler))
+    client = MealieApiClient(
+        "http://mealie.local/api", client=shared_client, page_size=10
+    )
+
+    recipes = client.get_all_recipes()
+
+    assert [recipe.slug for recipe in recipes] == ["recipe-1", "recipe-2", "recipe-3"]
+    assert sorted(seen_pages) == [(1, "10"), (2, "10"), (3, "10")]
+    shared_client.close()
+
+
+def _tagged(slug, *tag_names):
+    return {"name": slug, "slug": slug, "tags": [{"name": n} for n in tag_names]}
+
+
+def test_get_recipes_with_tag_uses_server_side_filter():
+    seen_params = []
+
+    def handler(request):
+        seen_params.append(request.url.params)
+        items = [_tagged("pasta", "kptncook", "Vegan")]
+        return httpx.Response(200, json={"items": items, "total_pages": 1})
+
+    with httpx.Client(transport=httpx.MockTransport(handler)) as shared_client:
+        client = MealieApiClient("http://mealie.local/api", client=shared_client)
+        recipes, filtered = client.get_recipes_with_tag("kptncook")
+
+    assert filtered is True
+    assert [recipe.slug for recipe in recipes] == ["pasta"]
+    assert seen_params[0]["tags"] == "kptncook"
+    assert "kptncook" in seen_params[0]["queryFilter"]
+
+
+def test_get_recipes_with_tag_falls_back_to_full_listing():
+    everything = [_tagged("pasta", "kptncook"), _tagged("family-cake")]
+
+    def ignoring_handler(request):
+        return httpx.Response(200, json={"items": everything, "total_pages": 1})
+
+    def rejecting_handler(request):
+        if "queryFilter" in request.url.params:
+            return httpx.Response(400, json={"detail": "bad filter"})
+        return httpx.Response(200, json={"items": everything, "total_pages": 1})
+
+    for handler in (ignoring_handler, rejecting_handler):
+        with httpx.Client(transport=httpx.MockTransport(handler)) as shared_client:
+            client = MealieApiClient("http://mealie.local/api", client=shared_client)
+            recipes, filtered = client.get_recipes_with_tag("kptncook")
+
+        assert filtered is False
+        assert [recipe.slug for recipe in recipes] == ["pasta", "family-cake"]
+
+
 def test_login_with_token_preserves_existing_headers():
     client = MealieApiClient("http://mealie.local/api")
     client.headers["Accept"] = "application/json"
@@ -227,6 +408,119 @@ def test_update_tag_ids_reuses_existing_tags_case_insensitively(monkeypatch):
     assert updated.tags[0].name == "Dessert"
 
 
+def test_item_lookups_are_loaded_once_per_client(monkeypatch):
+    client = MealieApiClient("http://mealie.local/api")
+    listed = []
+    created = []
+
+    def fake_get_all_items(endpoint_name):
+        listed.append(endpoint_name)
+        if endpoint_name == "foods":
+            return [{"id": str(uuid4()), "name": "Salt"}]
+        return []
+
+    def fake_create_item(endpoint_name, item):
+        created.append((endpoint_name, item.name))
+        return {"id": str(uuid4()), "name": item.name}
+
+    monkeypatch.setattr(client, "_get_all_items", fake_get_all_items)
+    monkeypatch.setattr(client, "_create_item", fake_create_item)
+
+    for _ in range(3):
+        recipe = Recipe(
+            tags=[RecipeTag(name="kptncook")],
+            recipe_ingredient=[
+                RecipeIngredient(
+                    unit=RecipeUnit(name="g"), food=RecipeFood(name="Salt")
+                ),
+                RecipeIngredient(unit=None, food=RecipeFood(name="Pepper")),
+            ],
+        )
+        recipe = client._update_item_ids(recipe, "units", RecipeUnit, "unit")
+        recipe = client._update_item_ids(recipe, "foods", RecipeFood, "food")
+        recipe = client._update_tag_ids(recipe)
+        assert all(ingredient.food.id for ingredient in recipe.recipe_ingredient)
+        assert recipe.tags[0].id is not None
+
+    assert sorted(listed) == ["foods", "organizers/tags", "units"]
+    assert sorted(created) == [
+        ("foods", "Pepper"),
+        ("organizers/tags", "kptncook"),
+        ("units", "g"),
+    ]
+
+    client.clear_item_lookups()
+    client._update_tag_ids(Recipe(tags=[RecipeTag(name="kptncook")]))
+    assert listed.count("organizers/tags") == 2
+
+
+def test_update_item_ids_matches_spelling_variants_of_existing_foods(monkeypatch):
+    client = MealieApiClient(
+        "http://mealie.local/api", item_aliases={"Lauchzwiebel": "Frühlingszwiebel"}
+    )
+    onion_id, spring_onion_id = uuid4(), uuid4()
+    created = []
+
+    def fake_get_all_items(endpoint_name):
+        assert endpoint_name == "foods"
+        return [
+            {"id": str(onion_id), "name": "Zwiebel"},
+            {"id": str(spring_onion_id), "name": "Frühlingszwiebel"},
+        ]
+
+    def fake_create_item(endpoint_name, item):
+        created.append(item.name)
+        return {"id": str(uuid4()), "name": item.name}
+
+    monkeypatch.setattr(client, "_get_all_items", fake_get_all_items)
+    monkeypatch.setattr(client, "_create_item", fake_create_item)
+    names = ["Zwiebeln", "Frühlings-Zwiebeln", "Lauchzwiebel", "Knoblauch"]
+    recipe = Recipe(
+        recipe_ingredient=[
+            RecipeIngredient(unit=None, food=RecipeFood(name=name)) for name in names
+        ]
+    )
+
+    recipe = client._update_item_ids(recipe, "foods", RecipeFood, "food")
+
+    assert [ingredient.food.id for ingredient in recipe.recipe_ingredient[:3]] == [
+        onion_id,
+        spring_onion_id,
+        spring_onion_id,
+    ]
+    assert created == ["Knoblauch"]
+
+
+def test_concurrent_tag_updates_create_shared_tags_once(monkeypatch):
+    client = MealieApiClient("http://mealie.local/api")
+    created = []
+
+    def fake_get_all_items(endpoint_name):
+        time.sleep(0.01)
+        return []
+
+    def fake_create_item(endpoint_name, item):
+        created.append(item.name)
+        time.sleep(0.01)
+        return {"id": str(uuid4()), "name": item.name}
+
+    monkeypatch.setattr(client, "_get_all_items", fake_get_all_items)
+    monkeypatch.setattr(client, "_create_item", fake_create_item)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        recipes = list(
+            executor.map(
+                lambda _: client._update_tag_ids(
+                    Recipe(tags=[RecipeTag(name="kptncook")])
+                ),
+                range(8),
+            )
+        )
+
+    assert created == ["kptncook"]
+    assert len({recipe.tags[0].id for recipe in recipes}) == 1
+
+
 def test_update_recipe_uses_json_content_type():
     client = MealieApiClient("http://mealie.local/api")
     recipe = Recipe(name="Test recipe", slug="recipe-slug")
@@ -257,8 +551,9 @@ def test_get_mealie_client_uses_token(monkeypatch):
     called = {}
 
     class FakeClient:
-        def __init__(self, base_url):
+        def __init__(self, base_url, **options):
             self.base_url = base_url
+            self.options = options
 
         def login_with_token(self, token):
             called["token"] = token
@@ -281,8 +576,9 @@ def test_get_mealie_client_uses_username_password(monkeypatch):
     called = {}
 
     class FakeClient:
-        def __init__(self, base_url):
+        def __init__(self, base_url, **options):
             self.base_url = base_url
+            self.options = options
 
         def login_with_token(self, token):
             called["token"] = token
@@ -433,3 +729,131 @@ def test_create_recipe_continues_when_step_images_fail(monkeypatch):
     assert called["update"] is True
     assert result.slug == "recipe-slug"
     assert result.extras["kptncook_id"] == "abc123"
+
+
+def test_create_recipe_resumes_from_checkpoint(monkeypatch):
+    client = MealieApiClient("http://mealie.local/api")
+    recipe = RecipeWithImage(
+        name="Test recipe",
+        image_url="http://images.kptncook.com/cover.jpg",
+        recipe_instructions=[
+            RecipeStep(
+                text=f"Step {i}",
+                image=Image(name=f"step{i}.jpg", url=f"http://img/step{i}.jpg"),
+            )
+            for i in (1, 2)
+        ],
+    )
+    checkpoint = CreateCheckpoint(
+        slug="recipe-slug",
+        phase="image",
+        assets=[
+            RecipeAsset(name="step1", icon="mdi-file-image", file_name="step1.jpg")
+        ],
+    )
+    uploaded = []
+
+    def fail(*_args):
+        raise AssertionError("finished phases must not run again")
+
+    def fake_upload_asset(_slug, image):
+        uploaded.append(image.name)
+        return {"name": "step2", "icon": "mdi-file-image", "fileName": "step2.jpg"}
+
+    monkeypatch.setattr(client, "_post_recipe_trunk_and_get_slug", fail)
+    monkeypatch.setattr(client, "_scrape_image_for_recipe", fail)
+    monkeypatch.setattr(client, "_update_user_and_group_id", lambda r, _slug: r)
+    monkeypatch.setattr(client, "_update_item_ids", lambda recipe_obj, *_: recipe_obj)
+    monkeypatch.setattr(client, "_update_tag_ids", lambda recipe_obj: recipe_obj)
+    monkeypatch.setattr(client, "upload_asset", fake_upload_asset)
+    monkeypatch.setattr(client, "_update_recipe", lambda recipe_obj, _slug: recipe_obj)
+
+    result = client.create_recipe(recipe, checkpoint=checkpoint)
+
+    assert result.slug == "recipe-slug"
+    assert uploaded == ["step2.jpg"]
+    assert checkpoint.reached("assets")
+    assert [asset.file_name for asset in checkpoint.assets] == [
+        "step1.jpg",
+        "step2.jpg",
+    ]
+
+
+def test_update_recipe_reuses_uploaded_step_images(monkeypatch):
+    client = MealieApiClient("http://mealie.local/api")
+    recipe_id = uuid4()
+    existing = Recipe(
+        id=recipe_id,
+        slug="recipe-slug",
+        image="cached-image",
+        assets=[
+            RecipeAsset(name="step1", icon="mdi-file-image", file_name="step1.jpg")
+        ],
+    )
+    recipe = RecipeWithImage(
+        name="Test recipe",
+        image_url="http://images.kptncook.com/cover.jpg",
+        recipe_instructions=[
+            RecipeStep(
+                text=f"Step {i}",
+                image=Image(name=f"step{i}.jpg", url=f"http://img/step{i}.jpg"),
+            )
+            for i in (1, 2)
+        ],
+    )
+    uploaded = []
+
+    def fake_upload_asset(_slug, image):
+        uploaded.append(image.name)
+        return {"name": "step2", "icon": "mdi-file-image", "fileName": "step2.jpg"}
+
+    def fail_scrape(*_args):
+        raise AssertionError("the existing image must be kept")
+
+    monkeypatch.setattr(client, "get_via_slug", lambda _slug: existing)
+    monkeypatch.setattr(client, "_scrape_image_for_recipe", fail_scrape)
+    monkeypatch.setattr(client, "_update_item_ids", lambda recipe_obj, *_: recipe_obj)
+    monkeypatch.setattr(client, "_update_tag_ids", lambda recipe_obj: recipe_obj)
+    monkeypatch.setattr(client, "upload_asset", fake_upload_asset)
+    monkeypatch.setattr(client, "_update_recipe", lambda recipe_obj, _slug: recipe_obj)
+
+    result = client.update_recipe(recipe, "recipe-slug")
+
+    assert uploaded == ["step2.jpg"]
+    assert result.id == recipe_id
+    assert result.image == "cached-image"
+    assert [asset.file_name for asset in result.assets] == ["step1.jpg", "step2.jpg"]
+    assert "step1.jpg" in result.recipe_instructions[0].text
+
+
+def test_kptncook_to_mealie_stores_content_hash(full_recipe):
+    recipe = kptncook_to_mealie(KptnCookRecipe.model_validate(full_recipe))
+
+    assert recipe.extras["kptncook_hash"] == mealie_recipe_hash(recipe)
+
+
+def test_mealie_recipe_hash_ignores_random_reference_ids(full_recipe):
+    recipe = KptnCookRecipe.model_validate(full_recipe)
+
+    first = kptncook_to_mealie(recipe, api_key="test")
+    second = kptncook_to_mealie(recipe, api_key="test")
+    second.extras["kptncook_hash"] = "ignored"
+
+    assert (
+        first.recipe_ingredient[0].referenceId
+        != second.recipe_ingredient[0].referenceId
+    )
+    assert mealie_recipe_hash(first) == mealie_recipe_hash(second)
+
+    second.name = "Renamed"
+    assert mealie_recipe_hash(first) != mealie_recipe_hash(second)
+
+
+def test_mealie_recipe_hash_ignores_api_key(full_recipe):
+    recipe = KptnCookRecipe.model_validate(full_recipe)
+
+    first = kptncook_to_mealie(recipe, api_key="old-key")
+    second = kptncook_to_mealie(recipe, api_key="new-key")
+
+    assert first.image_url != second.image_url
+    assert mealie_recipe_hash(first) == mealie_recipe_hash(second)
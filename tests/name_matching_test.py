@@ -0,0 +1,76 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from kptncook.name_matching import (
+    AliasFileError,
+    NameMatchingIndex,
+    load_aliases,
+    match_key,
+)
+
+
+def _index(*names, **kwargs):
+    return NameMatchingIndex([SimpleNamespace(name=name) for name in names], **kwargs)
+
+
+def test_match_key_ignores_case_accents_punctuation_and_plurals():
+    assert match_key("Frühlings-Zwiebeln") == match_key("Frühlingszwiebel")
+    assert match_key("Tomaten") == match_key("tomate")
+    for singular in ("Champignon", "Onion", "Lemon", "Parmesan"):
+        assert match_key(f"{singular}s") == match_key(singular)
+    assert match_key("") == ""
+
+
+def test_match_finds_variants_of_existing_names():
+    index = _index("Zwiebel", "Knoblauchzehe", "Olivenöl", "EL")
+
+    assert index.match("Zwiebeln").name == "Zwiebel"
+    assert index.match("Knoblauch-Zehen").name == "Knoblauchzehe"
+    assert index.match("Oliven-Öl").name == "Olivenöl"
+    assert index.match("El").name == "EL"
+
+
+def test_match_keeps_different_names_apart():
+    index = _index("Zwiebel", "Salz", "Butter", "TL")
+
+    assert index.match("rote Zwiebel") is None
+    assert index.match("Salzwasser") is None
+    assert index.match("Butterschmalz") is None
+    assert index.match("Tl.") is not None
+    assert index.match("T") is None
+
+
+def test_threshold_controls_fuzzy_matches():
+    assert _index("Hähnchenbrustfilet").match("Hähnchenbrustfilett") is not None
+    strict = _index("Hähnchenbrustfilet", threshold=0.95)
+    assert strict.match("Hähnchenbrustfilett") is None
+    assert strict.match("Hähnchen-Brustfilets") is not None
+
+
+def test_aliases_map_to_canonical_names():
+    index = _index("Frühlingszwiebel", aliases={"Lauchzwiebeln": "Frühlingszwiebel"})
+
+    assert index.match("Lauchzwiebel").name == "Frühlingszwiebel"
+    assert index.canonical_name("Lauchzwiebel") == "Frühlingszwiebel"
+    assert index.canonical_name("Lauch") == "Lauch"
+
+
+def test_added_items_are_matched():
+    index = _index()
+    index.add(SimpleNamespace(name="Petersilie"))
+
+    assert index.match("petersilie").name == "Petersilie"
+
+
+def test_load_aliases_rejects_invalid_files(tmp_path):
+    path = tmp_path / "aliases.json"
+    path.write_text(json.dumps({"Lauchzwiebel": "Frühlingszwiebel"}), "utf-8")
+    assert load_aliases(path) == {"Lauchzwiebel": "Frühlingszwiebel"}
+
+    path.write_text(json.dumps(["Lauchzwiebel"]), "utf-8")
+    with pytest.raises(AliasFileError):
+        load_aliases(path)
+    with pytest.raises(AliasFileError):
+        load_aliases(tmp_path / "missing.json")
@@ -1,10 +1,16 @@
+import gzip
 import json
+import os
+import stat
+import threading
+import zipfile
 
 import httpx
 import pytest
 
+from kptncook.image_cache import ImageCache
 from kptncook.models import Recipe
-from kptncook.paprika import GeneratedData, PaprikaExporter
+from kptncook.paprika import MANIFEST_FILENAME, GeneratedData, PaprikaExporter
 
 
 def test_asciify_string():
@@ -19,10 +25,7 @@ def test_asciify_string():
 def test_get_cover_img_as_base64_string(full_recipe, mocker):
     p = PaprikaExporter()
     recipe = Recipe.model_validate(full_recipe)
-    mocker.patch(
-        "kptncook.paprika.httpx.get",
-        return_value=mocker.Mock(content=b"foobar", status_code=200),
-    )
+    mocker.patch.object(ImageCache, "get", return_value=b"foobar")
     cover_info = p.get_cover_img_as_base64_string(recipe=recipe)
     assert isinstance(cover_info, tuple) is True
     assert len(cover_info) == 2
@@ -36,19 +39,14 @@ def test_get_cover_img_as_base64_string(full_recipe, mocker):
 def test_get_cover_img_as_base64_string_can_handle_404(full_recipe, mocker):
     p = PaprikaExporter()
     recipe = Recipe.model_validate(full_recipe)
-    mocker.patch(
-        "kptncook.paprika.httpx.get",
-        return_value=mocker.Mock(content=b"foobar", status_code=404),
-    )
-    # hm, looks weird, but works.
-    m = mocker.patch("kptncook.paprika.httpx.get")
-    mock_response = mocker.Mock()
-    mock_response.raise_for_status = mocker.Mock(
+    mock_response = mocker.Mock(status_code=404)
+    mocker.patch.object(
+        ImageCache,
+        "get",
         side_effect=httpx.HTTPStatusError(
             message="404 File not found", response=mock_response, request=mocker.Mock()
-        )
+        ),
     )
-    m.return_value = mock_response
     assert p.get_cover_img_as_base64_string(recipe=recipe) == (None, None)
 
 
@@ -56,10 +54,7 @@ def test_export_single_recipe(full_recipe, mocker, tmp_path, monkeypatch):
     p = PaprikaExporter()
     recipe = Recipe.model_validate(full_recipe)
     monkeypatch.chdir(tmp_path)
-    mocker.patch(
-        "kptncook.paprika.httpx.get",
-        return_value=mocker.Mock(content=b"foobar", status_code=200),
-    )
+    mocker.patch.object(ImageCache, "get", return_value=b"foobar")
     p.export(recipes=[recipe])
     expected_file = (
         "Uberbackene_Muschelnudeln_mit_Lachs___Senf_Dill_Sauce.paprikarecipes"
@@ -73,16 +68,129 @@ def test_export_all_recipes(full_recipe, minimal, mocker, tmp_path, monkeypatch)
     recipe1 = Recipe.model_validate(full_recipe)
     recipe2 = Recipe.model_validate(minimal)
     monkeypatch.chdir(tmp_path)
-    mocker.patch(
-        "kptncook.paprika.httpx.get",
-        return_value=mocker.Mock(content=b"foobar", status_code=200),
-    )
+    mocker.patch.object(ImageCache, "get", return_value=b"foobar")
     p.export(recipes=[recipe1, recipe2])
     expected_file = "allrecipes.paprikarecipes"
     expected_path = tmp_path / expected_file
     assert expected_path.is_file() is True
 
 
+def test_export_streams_gzipped_recipes_into_archive(
+    full_recipe, minimal, mocker, tmp_path, monkeypatch
+):
+    p = PaprikaExporter()
+    recipes = [Recipe.model_validate(full_recipe), Recipe.model_validate(minimal)]
+    out = tmp_path / "out"
+    out.mkdir()
+    monkeypatch.chdir(out)
+    mocker.patch.object(ImageCache, "get", return_value=b"foobar")
+
+    filename = p.export(recipes=recipes + recipes[:1])
+
+    assert sorted(path.name for path in out.iterdir()) == [
+        MANIFEST_FILENAME,
+        filename,
+    ]
+    with zipfile.ZipFile(out / filename) as archive:
+        names = archive.namelist()
+        recipe = json.loads(gzip.decompress(archive.read(names[0])))
+    assert names == [f"recipe_{r.id.oid}.paprikarecipe" for r in recipes]
+    assert recipe["uid"] == str(recipes[0].id.oid)
+    assert recipe["photo_data"] == "Zm9vYmFy"
+
+
+def test_export_changes_keeps_unchanged_archive(
+    full_recipe, minimal, mocker, tmp_path, monkeypatch
+):
+    p = PaprikaExporter()
+    other = dict(minimal, _id={"$oid": "5e5390e2740000cdf1381c65"})
+    recipes = [Recipe.model_validate(data) for data in (full_recipe, minimal, other)]
+    monkeypatch.chdir(tmp_path)
+    mocker.patch.object(ImageCache, "get", return_value=b"foobar")
+
+    first = p.export_changes(recipes=recipes)
+    archive = first.paths[0]
+    archive.write_bytes(b"marker")
+    second = p.export_changes(recipes=recipes)
+    unchanged = archive.read_bytes()
+    recipes[1].localized_title.de = "Neuer Titel"
+    third = p.export_changes(recipes=recipes[:2])
+
+    assert (first.written, first.skipped, first.removed) == (3, 0, 0)
+    assert (second.written, second.skipped, second.removed) == (0, 3, 0)
+    assert unchanged == b"marker"
+    assert (third.written, third.skipped, third.removed) == (1, 1, 1)
+    with zipfile.ZipFile(archive) as exported:
+        assert len(exported.namelist()) == 2
+
+
+def test_save_recipes_keeps_previous_archive_when_export_fails(tmp_path):
+    p = PaprikaExporter()
+    (tmp_path / "out").mkdir()
+    target = tmp_path / "out" / "allrecipes.paprikarecipes"
+    target.write_bytes(b"previous export")
+
+    def export_data():
+        yield "1", "{}"
+        raise ValueError("No cover image found")
+
+    with pytest.raises(ValueError):
+        p.save_recipes(export_data(), target)
+
+    assert target.read_bytes() == b"previous export"
+    assert [path.name for path in target.parent.iterdir()] == [target.name]
+
+
+def test_save_recipes_creates_archive_with_umask_mode(tmp_path):
+    target = tmp_path / "allrecipes.paprikarecipes"
+    umask = os.umask(0o022)
+    try:
+        PaprikaExporter().save_recipes(iter([("1", "{}")]), target)
+    finally:
+        os.umask(umask)
+
+    assert stat.S_IMODE(target.stat().st_mode) == 0o644
+
+
+def test_export_data_fetches_covers_concurrently(full_recipe, minimal, mocker):
+    p = PaprikaExporter()
+    recipes = [Recipe.model_validate(full_recipe), Recipe.model_validate(minimal)]
+    # Both downloads have to be in flight at once for either to finish.
+    barrier = threading.Barrier(len(recipes), timeout=5)
+
+    def get_generated_data(recipe):
+        barrier.wait()
+        return GeneratedData(None, None, "", str(recipe.id.oid))
+
+    mocker.patch.object(p, "get_generated_data", side_effect=get_generated_data)
+
+    export_data = p.get_export_data(recipes=recipes)
+
+    assert list(export_data) == [str(recipe.id.oid) for recipe in recipes]
+
+
+def test_recipe_data_is_prefetched_within_window(full_recipe, mocker):
+    p = PaprikaExporter()
+    recipes = [
+        Recipe.model_validate(full_recipe | {"_id": {"$oid": f"{i:024x}"}})
+        for i in range(6)
+    ]
+    generated: list[str] = []
+
+    def get_generated_data(recipe):
+        generated.append(str(recipe.id.oid))
+        return GeneratedData(None, None, "", str(recipe.id.oid))
+
+    mocker.patch.object(p, "get_generated_data", side_effect=get_generated_data)
+
+    recipe_data = p.iter_recipe_data(recipes=recipes, concurrency=1)
+    next(recipe_data)
+
+    # One download in flight and one more queued ahead of the consumer.
+    assert len(generated) <= 2
+    recipe_data.close()
+
+
 def test_get_cover(minimal):
     p = PaprikaExporter()
     recipe = Recipe.model_validate(minimal)
@@ -108,36 +216,45 @@ def test_render(minimal, mocker):
     )
     export_data = paprika_exporter.get_export_data(recipes=[recipe])
     [actual] = list(export_data.values())
-    print("actual: ", actual)
-    expected = (
-        "{\n"
-        '   "uid":"5e5390e2740000cdf1381c64",\n'
-        '   "name":"Minimal Recipe",\n'
-        '   "directions": "Alles parat?\\n",\n'
-        '   "servings":"2",\n'
-        '   "rating":0,\n'
-        '   "difficulty":"",\n'
-        '   "ingredients":"",\n'
-        '   "notes":"",\n'
-        '   "created":"",\n'
-        '   "image_url":null,\n'
-        '   "cook_time":"",\n'
-        '   "prep_time":"20",\n'
-        '   "source":"Kptncook",\n'
-        '   "source_url":"",\n'
-        '   "hash" : "",\n'
-        '   "photo_hash":null,\n'
-        '   "photos":[],\n'
-        '   "photo": "",\n'
-        '   "nutritional_info":"calories: 100\\nprotein: 30\\nfat: 10\\ncarbohydrate: '
-        '20\\n",\n'
-        '   "photo_data":"",\n'
-        '   "photo_large":null,\n'
-        '   "categories":["Kptncook"]\n'
-        "}"
-    )
-    expected = PaprikaExporter.unescaped_newline.sub(" ", expected)
-    assert actual == expected
+    expected = {
+        "uid": "5e5390e2740000cdf1381c64",
+        "name": "Minimal Recipe",
+        "directions": "Alles parat?\n",
+        "servings": "2",
+        "rating": 0,
+        "difficulty": "",
+        "ingredients": "",
+        "notes": "",
+        "created": "",
+        "image_url": None,
+        "cook_time": "",
+        "prep_time": "20",
+        "source": "Kptncook",
+        "source_url": "",
+        "hash": "",
+        "photo_hash": None,
+        "photos": [],
+        "photo": "",
+        "nutritional_info": ("calories: 100\nprotein: 30\nfat: 10\ncarbohydrate: 20\n"),
+        "photo_data": "",
+        "photo_large": None,
+        "categories": ["Kptncook"],
+    }
+    assert json.loads(actual) == expected
+
+
+def test_render_keeps_quotes_and_control_characters_valid(minimal):
+    recipe = Recipe.model_validate(minimal)
+    recipe.localized_title.de = 'Omas "beste" Suppe\x07'
+    recipe.steps[0].title.de = 'Mit \\ und "Zitat"\nkochen'
+    paprika_exporter = PaprikaExporter()
+    generated = GeneratedData(None, None, "", "")
+
+    data = json.loads(paprika_exporter.get_recipe_as_json_string(recipe, generated))
+
+    assert data["name"] == 'Omas "beste" Suppe'
+    assert data["directions"] == 'Mit \\ und "Zitat" kochen\n'
+    assert data["photo"] is None
 
 
 def test_render_expands_timer_placeholders(minimal, mocker):
@@ -0,0 +1,115 @@
+import httpx
+
+from kptncook.image_cache import ImageCache
+from kptncook.models import Recipe
+from kptncook.recipe_view import (
+    RecipeView,
+    build_recipe_views,
+    find_view,
+    release_recipe_views,
+)
+
+
+def _cache(tmp_path, handler, max_size=1024 * 1024):
+    return ImageCache(
+        tmp_path / "image_cache",
+        max_size=max_size,
+        max_age=60,
+        client=httpx.Client(transport=httpx.MockTransport(handler)),
+    )
+
+
+def _recipes(minimal, count):
+    return [
+        Recipe.model_validate(dict(minimal, _id={"$oid": f"recipe-{i}"}))
+        for i in range(count)
+    ]
+
+
+def test_build_recipe_views_derives_values_once(full_recipe, minimal, tmp_path):
+    requested = []
+
+    def handler(request):
+        requested.append(request.url.path)
+        return httpx.Response(200, content=b"cover")
+
+    recipes = [Recipe.model_validate(full_recipe), Recipe.model_validate(minimal)]
+
+    views = build_recipe_views(recipes, _cache(tmp_path, handler))
+
+    view = views[str(recipes[1].id.oid)]
+    assert view.title == "Minimal Recipe"
+    assert len(view.step_texts) == len(recipes[1].steps)
+    assert view.cover_bytes() == b"cover"
+    assert len(requested) == 2
+
+
+def test_missing_cover_leaves_view_without_cover(minimal, tmp_path):
+    recipe = Recipe.model_validate(minimal)
+
+    views = build_recipe_views(
+        [recipe], _cache(tmp_path, lambda request: httpx.Response(404))
+    )
+
+    assert views[str(recipe.id.oid)].cover_bytes() is None
+
+
+def test_find_view_ignores_other_recipe_objects_with_same_id(minimal, tmp_path):
+    recipe = Recipe.model_validate(minimal)
+    views = build_recipe_views(
+        [recipe], _cache(tmp_path, lambda request: httpx.Response(200))
+    )
+
+    assert find_view(views, recipe) is views[str(recipe.id.oid)]
+    assert find_view(views, recipe.model_copy()) is None
+    assert find_view(None, recipe) is None
+
+
+def test_view_covers_are_not_evicted_until_released(minimal, tmp_path, mocker):
+    mocker.patch.object(
+        Recipe,
+        "get_image_url",
+        autospec=True,
+        side_effect=lambda recipe, api_key: f"https://img/{recipe.id.oid}.jpg",
+    )
+    recipes = _recipes(minimal, 5)
+    cache = _cache(
+        tmp_path,
+        lambda request: httpx.Response(200, content=request.url.path.encode() * 200),
+        max_size=5000,
+    )
+
+    views = build_recipe_views(recipes, cache)
+
+    assert all(view.cover_bytes() is not None for view in views.values())
+    release_recipe_views(views, cache)
+    cache.fetch("https://img/later.jpg")
+    assert len(cache.entries) < len(recipes)
+
+
+def test_unreadable_cover_is_skipped(minimal, tmp_path):
+    recipe = Recipe.model_validate(minimal)
+    views = build_recipe_views(
+        [recipe], _cache(tmp_path, lambda request: httpx.Response(200, content=b"c"))
+    )
+    view = views[str(recipe.id.oid)]
+    view.cover.path.unlink()
+
+    assert view.cover_bytes() is None
+
+
+def test_view_built_on_demand_loads_cover_when_read(minimal, tmp_path):
+    requested = []
+
+    def handler(request):
+        requested.append(request.url.path)
+        return httpx.Response(200, content=b"cover")
+
+    recipe = Recipe.model_validate(minimal)
+
+    view = RecipeView.from_recipe(recipe, None, _cache(tmp_path, handler))
+
+    assert view.title == "Minimal Recipe"
+    assert view.ingredient_groups == [(None, recipe.ingredients)]
+    assert requested == []
+    assert view.cover_bytes() == b"cover"
@@ -50,6 +50,29 @@ def test_add_recipe_list_to_repository(tmpdir):
     assert len(repo.list()) == 2
 
 
+def test_add_list_merges_discovery_lists(tmpdir):
+    repo = RecipeRepository(tmpdir)
+    data = {"_id": {"$oid": "1"}}
+    repo.add_list(
+        [RecipeInDb(date=date.today(), data=data, discovery_lists=["latest"])]
+    )
+    repo.add_list(
+        [
+            RecipeInDb(
+                date=date.today(), data=data, discovery_lists=["curated/a", "latest"]
+            ),
+            RecipeInDb(date=date.today(), data={"_id": {"$oid": "2"}}),
+        ]
+    )
+    repo.add(RecipeInDb(date=date.today(), data=data))
+
+    by_id = repo.list_by_id()
+    assert by_id["1"].discovery_lists == ["latest", "curated/a"]
+    assert by_id["2"].discovery_lists is None
+    stored = json.loads(repo.path.read_text(encoding="utf-8"))
+    assert "discovery_lists" not in stored[1]
+
+
 def test_needs_to_be_synced(tmpdir):
     repo = RecipeRepository(tmpdir)
     today = date.today()
@@ -191,3 +214,30 @@ def test_add_recipe_uses_advisory_lock(tmpdir, monkeypatch):
 
     assert repositories_module.fcntl.LOCK_EX in calls
     assert repositories_module.fcntl.LOCK_UN in calls
+
+
+def test_repository_cache_reuses_parsed_file_until_it_changes(tmpdir, monkeypatch):
+    cache = repositories_module.RepositoryCache()
+    repo = RecipeRepository(tmpdir, cache=cache)
+    repo.add(RecipeInDb(date=date.today(), data={"_id": {"$oid": "1"}}))
+    parsed = []
+    original = repositories_module.RecipeListInDb.model_validate_json
+
+    def counting_validate(raw):
+        parsed.append(raw)
+        return original(raw)
+
+    monkeypatch.setattr(
+        repositories_module.RecipeListInDb, "model_validate_json", counting_validate
+    )
+
+    assert len(repo.list()) == 1
+    assert len(RecipeRepository(tmpdir, cache=cache).list()) == 1
+    assert parsed == []
+
+    other_writer = RecipeRepository(tmpdir)
+    other_writer.add(RecipeInDb(date=date.today(), data={"_id": {"$oid": "2"}}))
+    parsed.clear()
+
+    assert len(repo.list()) == 2
+    assert len(parsed) == 1
@@ -1,10 +1,20 @@
+import io
 import json
+import os
+import stat
+import threading
 import zipfile
 
 import httpx
 
+from kptncook.image_cache import ImageCache
 from kptncook.models import Recipe
-from kptncook.tandoor import IMAGE_DOWNLOAD_TIMEOUT, TandoorExporter
+from kptncook.tandoor import (
+    ARCHIVE_FILENAME,
+    ARCHIVE_MANIFEST_FILENAME,
+    MANIFEST_FILENAME,
+    TandoorExporter,
+)
 
 
 def test_export_recipe_writes_zip_with_image(
@@ -19,10 +29,7 @@ def test_export_recipe_writes_zip_with_image(
         autospec=True,
         return_value="https://example.com/cover.jpg",
     )
-    mock_response = mocker.Mock()
-    mock_response.content = b"image-bytes"
-    mock_response.raise_for_status = mocker.Mock()
-    httpx_get = mocker.patch("kptncook.tandoor.httpx.get", return_value=mock_response)
+    cache_get = mocker.patch.object(ImageCache, "get", return_value=b"image-bytes")
 
     filename = exporter.export_recipe(recipe=recipe)
 
@@ -39,11 +46,7 @@ def test_export_recipe_writes_zip_with_image(
     assert "waiting_time" in payload
     assert "prep_time" not in payload
     assert "cook_time" not in payload
-    httpx_get.assert_called_once_with(
-        "https://example.com/cover.jpg",
-        follow_redirects=True,
-        timeout=IMAGE_DOWNLOAD_TIMEOUT,
-    )
+    cache_get.assert_called_once_with("https://example.com/cover.jpg")
 
 
 def test_export_recipe_skips_missing_cover_image(
@@ -67,7 +70,9 @@ def test_export_recipe_skips_missing_cover_image(
             response=mock_response,
         )
     )
-    mocker.patch("kptncook.tandoor.httpx.get", return_value=mock_response)
+    mocker.patch.object(
+        ImageCache, "get", side_effect=mock_response.raise_for_status.side_effect
+    )
 
     filename = exporter.export_recipe(recipe=recipe)
 
@@ -85,7 +90,7 @@ def test_export_recipe_skips_when_no_cover_image(
     recipe = Recipe.model_validate(full_recipe)
     recipe.image_list = []
     monkeypatch.chdir(tmp_path)
-    httpx_get = mocker.patch("kptncook.tandoor.httpx.get")
+    cache_get = mocker.patch.object(ImageCache, "get")
     get_image_url = mocker.patch.object(Recipe, "get_image_url", autospec=True)
 
     filename = exporter.export_recipe(recipe=recipe)
@@ -95,10 +100,123 @@ def test_export_recipe_skips_when_no_cover_image(
     with zipfile.ZipFile(zip_path) as zip_file:
         assert "recipe.json" in zip_file.namelist()
         assert "image.jpg" not in zip_file.namelist()
-    httpx_get.assert_not_called()
+    cache_get.assert_not_called()
     get_image_url.assert_not_called()
 
 
+def test_export_fetches_covers_concurrently_and_keeps_last_duplicate(
+    full_recipe, minimal, mocker, tmp_path, monkeypatch
+):
+    exporter = TandoorExporter()
+    first, second = Recipe.model_validate(full_recipe), Recipe.model_validate(minimal)
+    duplicate = first.model_copy(update={"author_comment": second.author_comment})
+    out = tmp_path / "out"
+    out.mkdir()
+    monkeypatch.chdir(out)
+    # Both covers have to be requested at once for either download to finish.
+    barrier = threading.Barrier(2, timeout=5)
+
+    def get(url):
+        barrier.wait()
+        return b"image"
+
+    mocker.patch.object(ImageCache, "get", side_effect=get)
+
+    filenames = exporter.export(recipes=[first, second, duplicate])
+
+    assert filenames == [
+        exporter.get_export_filename(first),
+        exporter.get_export_filename(second),
+        exporter.get_export_filename(first),
+    ]
+    assert sorted(path.name for path in out.iterdir()) == sorted(
+        {*filenames, MANIFEST_FILENAME}
+    )
+    with zipfile.ZipFile(out / filenames[0]) as zip_file:
+        payload = json.loads(zip_file.read("recipe.json"))
+    assert payload["description"] == second.author_comment.de
+
+
+def test_export_archive_bundles_recipe_zips(
+    full_recipe, minimal, mocker, tmp_path, monkeypatch
+):
+    exporter = TandoorExporter()
+    recipes = [Recipe.model_validate(full_recipe), Recipe.model_validate(minimal)]
+    recipes.append(recipes[1])
+    out = tmp_path / "out"
+    out.mkdir()
+    monkeypatch.chdir(out)
+    mocker.patch.object(ImageCache, "get", return_value=b"image")
+
+    umask = os.umask(0o022)
+    try:
+        filename = exporter.export_archive(recipes=recipes)
+    finally:
+        os.umask(umask)
+
+    assert filename == ARCHIVE_FILENAME
+    assert sorted(path.name for path in out.iterdir()) == [
+        ARCHIVE_MANIFEST_FILENAME,
+        filename,
+    ]
+    assert stat.S_IMODE((out / filename).stat().st_mode) == 0o644
+    with zipfile.ZipFile(out / filename) as archive:
+        names = archive.namelist()
+        inner = zipfile.ZipFile(io.BytesIO(archive.read(names[1])))
+    assert names == [
+        exporter.get_export_filename(recipes[0]),
+        "Minimal_Recipe.zip",
+        "Minimal_Recipe_2.zip",
+    ]
+    assert set(inner.namelist()) == {"recipe.json", "image.jpg"}
+    assert json.loads(inner.read("recipe.json"))["name"] == "Minimal Recipe"
+
+
+def test_export_archive_changes_keeps_unchanged_archive(
+    full_recipe, minimal, mocker, tmp_path, monkeypatch
+):
+    exporter = TandoorExporter()
+    recipes = [Recipe.model_validate(full_recipe), Recipe.model_validate(minimal)]
+    monkeypatch.chdir(tmp_path)
+    mocker.patch.object(ImageCache, "get", return_value=b"image")
+
+    first = exporter.export_archive_changes(recipes=recipes)
+    inode = (tmp_path / ARCHIVE_FILENAME).stat().st_ino
+    second = exporter.export_archive_changes(recipes=recipes)
+
+    assert (first.written, first.skipped, first.removed) == (2, 0, 0)
+    assert (second.written, second.skipped, second.removed) == (0, 2, 0)
+    assert (tmp_path / ARCHIVE_FILENAME).stat().st_ino == inode
+
+    third = exporter.export_archive_changes(recipes=recipes[:1])
+
+    assert (third.written, third.skipped, third.removed) == (0, 1, 1)
+    assert (tmp_path / ARCHIVE_FILENAME).stat().st_ino != inode
+    with zipfile.ZipFile(tmp_path / ARCHIVE_FILENAME) as archive:
+        assert archive.namelist() == [exporter.get_export_filename(recipes[0])]
+
+
+def test_export_changes_skips_unchanged_and_prunes_stale_zips(
+    full_recipe, minimal, mocker, tmp_path, monkeypatch
+):
+    exporter = TandoorExporter()
+    recipes = [Recipe.model_validate(full_recipe), Recipe.model_validate(minimal)]
+    monkeypatch.chdir(tmp_path)
+    mocker.patch.object(ImageCache, "get", return_value=b"image")
+
+    first = exporter.export_changes(recipes=recipes)
+    mtimes = [path.stat().st_mtime_ns for path in first.paths]
+    second = exporter.export_changes(recipes=recipes)
+    unchanged = [path.stat().st_mtime_ns for path in second.paths]
+    pruned = exporter.export_changes(recipes=recipes[:1], prune=True)
+
+    assert (first.written, first.skipped) == (2, 0)
+    assert (second.written, second.skipped) == (0, 2)
+    assert unchanged == mtimes
+    assert (pruned.skipped, pruned.removed) == (1, 1)
+    assert not first.paths[1].exists()
+
+
 def test_get_source_url_prefers_uid(full_recipe, minimal):
     exporter = TandoorExporter()
     with_uid = Recipe.model_validate(full_recipe)
@@ -196,10 +314,7 @@ def test_export_expands_timer_placeholders(minimal, mocker, tmp_path, monkeypatc
         autospec=True,
         return_value="https://example.com/cover.jpg",
     )
-    mocker.patch(
-        "kptncook.tandoor.httpx.get",
-        return_value=mocker.Mock(content=b"image", raise_for_status=mocker.Mock()),
-    )
+    mocker.patch.object(ImageCache, "get", return_value=b"image")
 
     filename = exporter.export_recipe(recipe=recipe)
 
@@ -1,10 +1,28 @@
 import copy
+import json
 import logging
+import threading
+import zipfile
+from pathlib import Path
 from types import SimpleNamespace
+from uuid import uuid4
 
 import httpx
 import pytest
 
+from kptncook.api import KptnCookClient
+from kptncook.config import settings
+from kptncook.export_manifest import ExportReport
+from kptncook.fake_api import FakeApiConfig, FakeKptnCookApi
+from kptncook.image_cache import ImageCache
+from kptncook.mealie import (
+    RecipeFood,
+    RecipeIngredient,
+    RecipeTag,
+    RecipeUnit,
+    RecipeWithImage,
+    kptncook_source_hash,
+)
 from kptncook.models import Recipe
 from kptncook.repositories import RecipeInDb
 from kptncook.services import repository as repository_service
@@ -122,7 +140,7 @@ def test_sync_with_mealie_skips_duplicates_and_logs_other_failures(
         _recipe(minimal, oid="recipe-3"),
     ]
     mealie_recipes = [
-        SimpleNamespace(
+        RecipeWithImage(
             name=f"Minimal Recipe {index}",
             extras={"kptncook_id": recipe.id.oid},
         )
@@ -131,22 +149,25 @@ def test_sync_with_mealie_skips_duplicates_and_logs_other_failures(
     seen_ids: list[str] = []
 
     class FakeClient:
-        def create_recipe(self, recipe_to_create):
+        def close(self):
+            pass
+
+        def create_recipe(self, recipe_to_create, checkpoint=None):
             recipe_id = recipe_to_create.extras["kptncook_id"]
             seen_ids.append(recipe_id)
             if recipe_id == "recipe-1":
                 raise _status_error(409, detail_message="Recipe already exists")
             if recipe_id == "recipe-2":
                 raise _status_error(500, detail_message="upstream exploded")
-            return SimpleNamespace(slug=f"created-{recipe_id}")
+            return SimpleNamespace(slug=f"created-{recipe_id}", id=None)
 
     fake_client = FakeClient()
 
     monkeypatch.setattr(workflows, "get_mealie_client", lambda: fake_client)
     monkeypatch.setattr(
         workflows,
-        "get_kptncook_recipes_from_mealie",
-        lambda _client: [],
+        "get_kptncook_ids_in_mealie",
+        lambda _client, _ledger: set(),
     )
     monkeypatch.setattr(
         workflows,
@@ -167,7 +188,7 @@ def test_sync_with_mealie_skips_duplicates_and_logs_other_failures(
 
     assert result.created_count == 1
     assert result.invalid_repository_entries == [warning]
-    assert seen_ids == ["recipe-1", "recipe-2", "recipe-3"]
+    assert sorted(seen_ids) == ["recipe-1", "recipe-2", "recipe-3"]
     assert "Minimal Recipe 2" in caplog.text
     assert "upstream exploded" in caplog.text
     assert "Recipe already exists" not in caplog.text
@@ -181,7 +202,7 @@ def test_sync_with_mealie_prefilters_recipes_already_present_in_mealie(
         _recipe(minimal, oid="recipe-2"),
     ]
     mealie_recipes = [
-        SimpleNamespace(
+        RecipeWithImage(
             name=f"Minimal Recipe {index}",
             extras={"kptncook_id": recipe.id.oid},
         )
@@ -190,18 +211,21 @@ def test_sync_with_mealie_prefilters_recipes_already_present_in_mealie(
     seen_ids: list[str] = []
 
     class FakeClient:
-        def create_recipe(self, recipe_to_create):
+        def close(self):
+            pass
+
+        def create_recipe(self, recipe_to_create, checkpoint=None):
             recipe_id = recipe_to_create.extras["kptncook_id"]
             seen_ids.append(recipe_id)
-            return SimpleNamespace(slug=f"created-{recipe_id}")
+            return SimpleNamespace(slug=f"created-{recipe_id}", id=None)
 
     fake_client = FakeClient()
 
     monkeypatch.setattr(workflows, "get_mealie_client", lambda: fake_client)
     monkeypatch.setattr(
         workflows,
-        "get_kptncook_recipes_from_mealie",
-        lambda _client: [mealie_recipes[0]],
+        "get_kptncook_ids_in_mealie",
+        lambda _client, _ledger: {"recipe-1"},
     )
     monkeypatch.setattr(
         workflows,
@@ -224,6 +248,456 @@ def test_sync_with_mealie_prefilters_recipes_already_present_in_mealie(
     assert seen_ids == ["recipe-2"]
 
 
+def test_sync_with_mealie_creates_recipes_in_parallel(monkeypatch, minimal):
+    repository_recipes = [_recipe(minimal, oid=f"recipe-{i}") for i in range(4)]
+    mealie_recipes = [
+        RecipeWithImage(name=f"Recipe {i}", extras={"kptncook_id": f"recipe-{i}"})
+        for i in range(4)
+    ]
+    # Only passes if two creations are in flight at the same time.
+    barrier = threading.Barrier(2, timeout=5)
+
+    class FakeClient:
+        def close(self):
+            pass
+
+        def create_recipe(self, recipe_to_create, checkpoint=None):
+            barrier.wait()
+            recipe_id = recipe_to_create.extras["kptncook_id"]
+            if recipe_id == "recipe-3":
+                raise httpx.ConnectError("boom")
+            return SimpleNamespace(slug=f"created-{recipe_id}", id=None)
+
+    monkeypatch.setattr(settings, "mealie_sync_concurrency", 2)
+    monkeypatch.setattr(workflows, "get_mealie_client", lambda: FakeClient())
+    monkeypatch.setattr(
+        workflows, "get_kptncook_ids_in_mealie", lambda _client, _ledger: set()
+    )
+    monkeypatch.setattr(
+        workflows,
+        "load_kptncook_recipes_from_repository",
+        lambda: RepositoryRecipesResult(recipes=repository_recipes, invalid_entries=[]),
+    )
+    monkeypatch.setattr(
+        workflows,
+        "kptncook_to_mealie",
+        lambda recipe: mealie_recipes[repository_recipes.index(recipe)],
+    )
+
+    result = workflows.sync_with_mealie_result()
+
+    assert result.created_count == 3
+    ledger = workflows.get_mealie_ledger()
+    assert sorted(ledger.entries) == ["recipe-0", "recipe-1", "recipe-2"]
+
+
+def test_sync_with_mealie_saves_ledger_when_creation_crashes(monkeypatch, minimal):
+    repository_recipes = [_recipe(minimal, oid=f"recipe-{i}") for i in range(2)]
+    mealie_recipes = [
+        RecipeWithImage(name=f"Recipe {i}", extras={"kptncook_id": f"recipe-{i}"})
+        for i in range(2)
+    ]
+
+    class FakeClient:
+        def close(self):
+            pass
+
+        def create_recipe(self, recipe_to_create, checkpoint=None):
+            recipe_id = recipe_to_create.extras["kptncook_id"]
+            if recipe_id == "recipe-1":
+                raise RuntimeError("unexpected")
+            return SimpleNamespace(slug=f"created-{recipe_id}", id=None)
+
+    monkeypatch.setattr(settings, "mealie_sync_concurrency", 1)
+    monkeypatch.setattr(workflows, "get_mealie_client", lambda: FakeClient())
+    monkeypatch.setattr(
+        workflows, "get_kptncook_ids_in_mealie", lambda _client, _ledger: set()
+    )
+    monkeypatch.setattr(
+        workflows,
+        "load_kptncook_recipes_from_repository",
+        lambda: RepositoryRecipesResult(recipes=repository_recipes, invalid_entries=[]),
+    )
+    monkeypatch.setattr(
+        workflows,
+        "kptncook_to_mealie",
+        lambda recipe: mealie_recipes[repository_recipes.index(recipe)],
+    )
+
+    with pytest.raises(RuntimeError):
+        workflows.sync_with_mealie_result()
+
+    assert sorted(workflows.get_mealie_ledger().entries) == ["recipe-0"]
+
+
+def test_sync_with_mealie_resumes_interrupted_recipes(monkeypatch, minimal):
+    repository_recipes = [_recipe(minimal, oid="recipe-1")]
+    mealie_recipe = RecipeWithImage(name="Recipe", extras={"kptncook_id": "recipe-1"})
+    resumed_slugs = []
+
+    class FakeClient:
+        def close(self):
+            pass
+
+        def __init__(self, fail):
+            self.fail = fail
+
+        def create_recipe(self, recipe_to_create, checkpoint=None):
+            resumed_slugs.append(checkpoint.slug)
+            checkpoint.advance("trunk", "recipe-slug")
+            if self.fail:
+                raise httpx.ConnectError("connection dropped")
+            return SimpleNamespace(slug=checkpoint.slug, id=None)
+
+    monkeypatch.setattr(
+        workflows, "get_kptncook_ids_in_mealie", lambda _client, _ledger: set()
+    )
+    monkeypatch.setattr(
+        workflows,
+        "load_kptncook_recipes_from_repository",
+        lambda: RepositoryRecipesResult(recipes=repository_recipes, invalid_entries=[]),
+    )
+    monkeypatch.setattr(workflows, "kptncook_to_mealie", lambda _recipe: mealie_recipe)
+
+    monkeypatch.setattr(workflows, "get_mealie_client", lambda: FakeClient(True))
+    assert workflows.sync_with_mealie_result().created_count == 0
+    assert set(workflows.get_mealie_journal().entries) == {"recipe-1"}
+
+    monkeypatch.setattr(workflows, "get_mealie_client", lambda: FakeClient(False))
+    assert workflows.sync_with_mealie_result().created_count == 1
+
+    assert resumed_slugs == [None, "recipe-slug"]
+    assert workflows.get_mealie_journal().entries == {}
+
+
+def test_sync_with_mealie_updates_only_changed_recipes(monkeypatch, minimal):
+    repository_recipes = [
+        _recipe(minimal, oid="unchanged"),
+        _recipe(minimal, oid="changed"),
+        _recipe(minimal, oid="legacy"),
+    ]
+    mealie_recipes = [
+        RecipeWithImage(
+            name=f"Recipe {recipe.id.oid}",
+            extras={"kptncook_id": recipe.id.oid, "kptncook_hash": "new-hash"},
+        )
+        for recipe in repository_recipes
+    ]
+    ledger = workflows.get_mealie_ledger()
+    ledger.record("unchanged", "unchanged-slug", content_hash="new-hash")
+    ledger.record("changed", "changed-slug", content_hash="old-hash")
+    ledger.record("legacy", "legacy-slug")
+    ledger.save()
+    updated_slugs: list[str] = []
+
+    class FakeClient:
+        def close(self):
+            pass
+
+        def create_recipe(self, recipe_to_create, checkpoint=None):
+            raise AssertionError("nothing should be created")
+
+        def update_recipe(self, recipe_to_update, slug):
+            updated_slugs.append(slug)
+            return SimpleNamespace(slug=slug, id="mealie-id")
+
+    monkeypatch.setattr(workflows, "get_mealie_client", lambda: FakeClient())
+    monkeypatch.setattr(
+        workflows,
+        "get_kptncook_ids_in_mealie",
+        lambda _client, _ledger: {"unchanged", "changed", "legacy"},
+    )
+    monkeypatch.setattr(
+        workflows,
+        "load_kptncook_recipes_from_repository",
+        lambda: RepositoryRecipesResult(recipes=repository_recipes, invalid_entries=[]),
+    )
+    monkeypatch.setattr(
+        workflows,
+        "kptncook_to_mealie",
+        lambda recipe: mealie_recipes[repository_recipes.index(recipe)],
+    )
+
+    result = workflows.sync_with_mealie_result()
+
+    assert result.created_count == 0
+    assert result.updated_count == 2
+    # Nothing says what a recipe recorded without a hash looks like in Mealie.
+    assert sorted(updated_slugs) == ["changed-slug", "legacy-slug"]
+    entry = workflows.get_mealie_ledger().get("changed")
+    assert entry.content_hash == "new-hash"
+    assert entry.recipe_id == "mealie-id"
+    assert workflows.get_mealie_ledger().get("legacy").content_hash == "new-hash"
+
+
+def test_sync_with_mealie_converts_only_missing_or_changed_recipes(
+    monkeypatch, minimal
+):
+    unchanged = _recipe(minimal, oid="unchanged")
+    missing = _recipe(minimal, oid="missing")
+    ledger = workflows.get_mealie_ledger()
+    ledger.record("unchanged", "unchanged-slug", content_hash="hash")
+    ledger.set_source_hash("unchanged", kptncook_source_hash(unchanged))
+    ledger.save()
+    converted: list[str] = []
+
+    def fake_kptncook_to_mealie(recipe):
+        converted.append(recipe.id.oid)
+        return RecipeWithImage(name="Recipe", extras={"kptncook_id": recipe.id.oid})
+
+    class FakeClient:
+        def create_recipe(self, recipe_to_create, checkpoint=None):
+            return SimpleNamespace(slug="missing-slug", id=None)
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(workflows, "get_mealie_client", lambda: FakeClient())
+    monkeypatch.setattr(
+        workflows, "get_kptncook_ids_in_mealie", lambda _client, _ledger: {"unchanged"}
+    )
+    monkeypatch.setattr(
+        workflows,
+        "load_kptncook_recipes_from_repository",
+        lambda: RepositoryRecipesResult(
+            recipes=[unchanged, missing], invalid_entries=[]
+        ),
+    )
+    monkeypatch.setattr(workflows, "kptncook_to_mealie", fake_kptncook_to_mealie)
+
+    result = workflows.sync_with_mealie_result()
+
+    assert result.created_count == 1
+    assert converted == ["missing"]
+    entry = workflows.get_mealie_ledger().get("missing")
+    assert entry.source_hash == kptncook_source_hash(missing)
+
+
+def test_convert_recipes_to_mealie_uses_process_pool_for_large_batches(
+    monkeypatch, full_recipe
+):
+    recipes = [
+        Recipe.model_validate(_recipe_data(full_recipe, oid=f"recipe-{i}"))
+        for i in range(3)
+    ]
+    monkeypatch.setattr(workflows, "MEALIE_CONVERSION_PROCESS_THRESHOLD", 2)
+    monkeypatch.setattr(workflows, "MEALIE_CONVERSION_CHUNK_SIZE", 2)
+
+    converted = workflows.convert_recipes_to_mealie(recipes)
+
+    assert [recipe.extras["kptncook_id"] for recipe in converted] == [
+        "recipe-0",
+        "recipe-1",
+        "recipe-2",
+    ]
+    assert converted[0].recipe_ingredient
+
+
+def test_bulk_import_to_mealie_uploads_one_archive(monkeypatch, minimal):
+    repository_recipes = [
+        _recipe(minimal, oid="recipe-1"),
+        _recipe(minimal, oid="recipe-2"),
+    ]
+    mealie_recipes = [
+        RecipeWithImage(name=f"Recipe {i}", extras={"kptncook_id": f"recipe-{i}"})
+        for i in (1, 2)
+    ]
+    uploads = []
+
+    class FakeClient:
+        step_images = None
+
+        def start_migration(self, archive_path, migration_type):
+            with zipfile.ZipFile(archive_path) as archive:
+                uploads.append((migration_type, sorted(archive.namelist())))
+            return "report-1"
+
+        def wait_for_report(self, report_id, *, timeout):
+            return {"status": "partial", "entries": [{"success": True}]}
+
+        def close(self):
+            pass
+
+    ids_in_mealie = iter([{"recipe-1"}, {"recipe-1", "recipe-2"}])
+    monkeypatch.setattr(workflows, "get_mealie_client", lambda: FakeClient())
+    monkeypatch.setattr(
+        workflows,
+        "get_kptncook_ids_in_mealie",
+        lambda _client, _ledger: next(ids_in_mealie),
+    )
+    monkeypatch.setattr(
+        workflows,
+        "load_kptncook_recipes_from_repository",
+        lambda: RepositoryRecipesResult(recipes=repository_recipes, invalid_entries=[]),
+    )
+    monkeypatch.setattr(
+        workflows,
+        "kptncook_to_mealie",
+        lambda recipe: mealie_recipes[repository_recipes.index(recipe)],
+    )
+
+    result = workflows.bulk_import_to_mealie_result()
+
+    assert result.created_count == 1
+    assert uploads == [("mealie_alpha", ["recipes/recipe-2/recipe-2.json"])]
+
+
+def test_sync_with_mealie_updates_bulk_imported_recipes(monkeypatch, minimal):
+    repository_recipes = [_recipe(minimal, oid="recipe-1")]
+    mealie_recipe = RecipeWithImage(
+        name="Recipe 1",
+        extras={
+            "kptncook_id": "recipe-1",
+            "source": "kptncook",
+            "kptncook_hash": "hash-1",
+        },
+    )
+    imported: dict[str, dict] = {}
+    updated_slugs: list[str] = []
+
+    class FakeClient:
+        step_images = None
+
+        def get_recipes_with_tag(self, tag_name):
+            return [SimpleNamespace(slug=slug) for slug in imported], True
+
+        def get_via_slug(self, slug):
+            return SimpleNamespace(slug=slug, id=None, extras=imported[slug])
+
+        def start_migration(self, archive_path, migration_type):
+            with zipfile.ZipFile(archive_path) as archive:
+                for name in archive.namelist():
+                    payload = json.loads(archive.read(name))
+                    imported[payload["slug"]] = payload["extras"]
+            return "report-1"
+
+        def wait_for_report(self, report_id, *, timeout):
+            return {"status": "success", "entries": []}
+
+        def create_recipe(self, recipe_to_create, checkpoint=None):
+            raise AssertionError("imported recipes should not be created again")
+
+        def update_recipe(self, recipe_to_update, slug):
+            updated_slugs.append(slug)
+            return SimpleNamespace(slug=slug, id="mealie-id")
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(workflows, "get_mealie_client", lambda: FakeClient())
+    monkeypatch.setattr(
+        workflows,
+        "load_kptncook_recipes_from_repository",
+        lambda: RepositoryRecipesResult(recipes=repository_recipes, invalid_entries=[]),
+    )
+    monkeypatch.setattr(workflows, "kptncook_to_mealie", lambda _recipe: mealie_recipe)
+
+    assert workflows.bulk_import_to_mealie_result().created_count == 1
+    assert workflows.get_mealie_ledger().get("recipe-1").pending_update
+
+    result = workflows.sync_with_mealie_result()
+
+    assert result.updated_count == 1
+    assert updated_slugs == ["recipe-1"]
+    entry = workflows.get_mealie_ledger().get("recipe-1")
+    assert entry.content_hash == "hash-1"
+    assert not entry.pending_update
+
+    # Once written, the recipe is up to date.
+    assert workflows.sync_with_mealie_result().updated_count == 0
+
+
+def test_purge_mealie_recipes_deletes_ledger_and_unfinished_recipes(
+    monkeypatch, minimal
+):
+    ledger = workflows.get_mealie_ledger()
+    ledger.record("recipe-1", "pasta")
+    ledger.record("recipe-2", "soup")
+    ledger.save()
+    workflows.get_mealie_journal().checkpoint("recipe-3").advance("trunk", "trunk")
+    deleted_slugs: list[str] = []
+    deleted_items: list[tuple[str, str]] = []
+    unit_id, food_id, tag_id = uuid4(), uuid4(), uuid4()
+
+    class FakeClient:
+        def delete_via_slug(self, slug):
+            if slug == "soup":
+                raise _status_error(500, detail_message="locked")
+            deleted_slugs.append(slug)
+
+        def get_all_recipes(self):
+            return [SimpleNamespace(slug="family-cake")]
+
+        def get_via_slug(self, slug):
+            # The remaining recipe still uses the "Salz" food.
+            return SimpleNamespace(
+                recipe_ingredient=[
+                    SimpleNamespace(unit=None, food=SimpleNamespace(name="Salz"))
+                ],
+                tags=[],
+            )
+
+        def get_items(self, endpoint, model_class):
+            return {
+                "units": [RecipeUnit(id=unit_id, name="g")],
+                "foods": [
+                    RecipeFood(id=food_id, name="Nudeln"),
+                    RecipeFood(id=uuid4(), name="Salz"),
+                ],
+                "organizers/tags": [RecipeTag(id=tag_id, name="kptncook")],
+            }[endpoint]
+
+        def delete_item(self, endpoint, item_id):
+            deleted_items.append((endpoint, item_id))
+
+        def close(self):
+            pass
+
+    converted = RecipeWithImage(
+        name="Pasta",
+        recipe_ingredient=[
+            RecipeIngredient(unit=RecipeUnit(name="g"), food=RecipeFood(name="Nudeln")),
+            RecipeIngredient(unit=None, food=RecipeFood(name="Salz")),
+        ],
+        tags=[RecipeTag(name="kptncook")],
+    )
+    monkeypatch.setattr(workflows, "get_mealie_client", lambda: FakeClient())
+    monkeypatch.setattr(
+        workflows, "get_kptncook_ids_in_mealie", lambda _client, _ledger: set()
+    )
+    monkeypatch.setattr(
+        workflows,
+        "load_kptncook_recipes_from_repository",
+        lambda: RepositoryRecipesResult(
+            recipes=[_recipe(minimal, oid="recipe-1")], invalid_entries=[]
+        ),
+    )
+    monkeypatch.setattr(workflows, "kptncook_to_mealie", lambda _recipe: converted)
+
+    listing = workflows.purge_mealie_recipes(dry_run=True)
+    assert listing.slugs == ["pasta", "soup", "trunk"]
+    assert deleted_slugs == []
+    # Recorded after the listing was confirmed: must survive the purge.
+    ledger = workflows.get_mealie_ledger()
+    ledger.record("recipe-4", "late")
+    ledger.save()
+
+    result = workflows.purge_mealie_recipes(
+        delete_orphans=True, rate=None, slugs=listing.slugs
+    )
+
+    assert sorted(result.deleted) == ["pasta", "trunk"]
+    assert result.failed == ["soup"]
+    assert "late" not in deleted_slugs
+    assert sorted(workflows.get_mealie_ledger().entries) == ["recipe-2", "recipe-4"]
+    assert workflows.get_mealie_journal().entries == {}
+    assert result.deleted_items == {"units": 1, "foods": 1, "tags": 1}
+    assert sorted(deleted_items, key=str) == sorted(
+        [("units", unit_id), ("foods", food_id), ("organizers/tags", tag_id)],
+        key=str,
+    )
+
+
 def test_backup_kptncook_favorites_resolves_and_saves_recipes(monkeypatch, minimal):
     expected_recipes = [
         _recipe_in_db(minimal, oid="favorite-1"),
@@ -429,15 +903,18 @@ def test_export_recipes_to_paprika_accepts_parseable_repository_url(
     )
     monkeypatch.setattr(
         workflows.PaprikaExporter,
-        "export",
-        lambda self, recipes: "/tmp/export.paprikarecipes",
+        "export_changes",
+        lambda self, recipes: ExportReport(
+            paths=[Path("/tmp/export.paprikarecipes")], written=1
+        ),
     )
 
     result = workflows.export_recipes_to_paprika_result(
         f"https://share.kptncook.com/{recipe.id.oid}"
     )
 
-    assert result.filename == "/tmp/export.paprikarecipes"
+    assert result.filename == "export.paprikarecipes"
+    assert result.written == 1
     assert result.invalid_repository_entries == []
 
 
@@ -464,3 +941,181 @@ def test_get_discovery_screen_returns_structured_entries(monkeypatch):
     assert data.lists[0].title == "Trending"
     assert data.lists[0].list_type == "curated"
     assert data.quick_search == ["Winter"]
+
+
+def test_crawl_discovery_lists_saves_deduplicated_recipes_once(monkeypatch):
+    saved: list[list[RecipeInDb]] = []
+    monkeypatch.setattr(
+        workflows,
+        "_save_repository_entries",
+        lambda recipes: saved.append(recipes) or len(recipes),
+    )
+    config = FakeApiConfig(catalog_size=12, list_count=4, list_size=6)
+    with FakeKptnCookApi(config) as api:
+        monkeypatch.setattr(
+            workflows,
+            "KptnCookClient",
+            lambda: KptnCookClient(base_url=api.url, api_key="test-key"),
+        )
+        result = workflows.crawl_discovery_lists(concurrency=2)
+
+    [recipes] = saved
+    oids = [recipe.id for recipe in recipes]
+    assert len(result.crawled_lists) == 4
+    assert result.failed_lists == []
+    assert result.saved_count == len(recipes) == result.identifier_count
+    assert len(set(oids)) == len(oids)
+    assert sum(len(recipe.discovery_lists or []) for recipe in recipes) == 4 * 6
+    assert all(
+        set(recipe.discovery_lists or []) <= set(result.crawled_lists)
+        for recipe in recipes
+    )
+
+
+def test_crawl_discovery_lists_skips_failed_lists(monkeypatch, minimal):
+    request = httpx.Request("GET", "https://mobile.kptncook.com/discovery/list")
+
+    class FakeClient:
+        def get_discovery_screen(self):
+            return {
+                "lists": [
+                    {"id": "ok", "listType": "curated"},
+                    {"id": "broken", "listType": "curated"},
+                    {"listType": "automated"},
+                ]
+            }
+
+        def get_discovery_list(self, *, list_type, list_id):
+            if list_id == "broken":
+                raise httpx.ConnectError("boom", request=request)
+            return [{"id": "5e5390e2740000cdf1381c64"}]
+
+    def fake_resolve(client, items, *, action, chunk_size=None):
+        assert items == [("oid", "5e5390e2740000cdf1381c64")]
+        return [_recipe_in_db(minimal)]
+
+    monkeypatch.setattr(workflows, "KptnCookClient", FakeClient)
+    monkeypatch.setattr(workflows, "_resolve_recipe_summaries", fake_resolve)
+    monkeypatch.setattr(
+        workflows, "_save_repository_entries", lambda recipes: len(recipes)
+    )
+
+    result = workflows.crawl_discovery_lists()
+
+    assert result.crawled_lists == ["curated/ok"]
+    assert result.failed_lists == ["curated/broken"]
+    assert result.skipped_lists == ["automated"]
+    assert result.saved_count == 1
+
+
+def test_search_recipes_by_ids_resolves_everything_in_one_batch(monkeypatch, minimal):
+    oid_a, oid_b, oid_unknown = "a" * 24, "b" * 24, "c" * 24
+    searches: list[list[dict]] = []
+
+    def handler(request):
+        if request.url.host == "share.kptncook.com":
+            if request.url.path == "/good":
+                location = f"https://www.kptncook.com/recipe/pinterest/x/{oid_a}"
+                return httpx.Response(302, headers={"location": location})
+            return httpx.Response(404)
+        payload = json.loads(request.content)
+        searches.append(payload)
+        return httpx.Response(
+            200,
+            json=[
+                _recipe_data(minimal, oid=item["identifier"])
+                for item in payload
+                if item["identifier"] != oid_unknown
+            ],
+        )
+
+    http_client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(
+        workflows, "get_default_transport", lambda: httpx.MockTransport(handler)
+    )
+    monkeypatch.setattr(
+        workflows,
+        "KptnCookClient",
+        lambda: KptnCookClient(
+            base_url="https://mobile.kptncook.com",
+            api_key="test-key",
+            client=http_client,
+        ),
+    )
+    saved: list[list[RecipeInDb]] = []
+    monkeypatch.setattr(
+        workflows,
+        "_save_repository_entries",
+        lambda recipes: saved.append(recipes) or len(recipes),
+    )
+
+    result = workflows.search_recipes_by_ids(
+        [
+            "https://share.kptncook.com/good",
+            oid_b,
+            f" {oid_b} ",
+            "",
+            "not-an-id",
+            "https://share.kptncook.com/missing",
+            oid_unknown,
+        ]
+    )
+
+    assert len(searches) == 1
+    assert [item.id_value for item in result.found] == [oid_a, oid_b]
+    assert result.not_found == [oid_unknown]
+    assert [id_ for id_, _ in result.invalid] == [
+        "https://share.kptncook.com/missing",
+        "not-an-id",
+    ]
+    assert result.saved_count == 2
+    assert len(saved) == 1
+
+
+def test_parse_export_targets_drops_repeats_and_rejects_unknown():
+    assert workflows.parse_export_targets("Markdown, paprika,markdown") == [
+        "markdown",
+        "paprika",
+    ]
+    with pytest.raises(ValueError, match="pdf"):
+        workflows.parse_export_targets("markdown,pdf")
+
+
+def test_export_recipes_to_targets_downloads_each_cover_once(
+    monkeypatch, tmp_path, full_recipe, minimal
+):
+    recipes = [Recipe.model_validate(full_recipe), Recipe.model_validate(minimal)]
+    requested = []
+
+    def handler(request):
+        requested.append(request.url.path)
+        return httpx.Response(200, content=b"cover")
+
+    cache = ImageCache(
+        tmp_path / "image_cache",
+        max_size=1024 * 1024,
+        max_age=0,
+        client=httpx.Client(transport=httpx.MockTransport(handler)),
+    )
+    monkeypatch.setattr(workflows, "get_image_cache", lambda: cache)
+    monkeypatch.setattr(
+        workflows,
+        "load_kptncook_recipes_from_repository",
+        lambda: RepositoryRecipesResult(recipes=recipes, invalid_entries=[]),
+    )
+    out = tmp_path / "out"
+    out.mkdir()
+    monkeypatch.chdir(out)
+
+    result = workflows.export_recipes_to_targets(["markdown", "tandoor", "paprika"])
+
+    assert [target.target for target in result.results] == [
+        "markdown",
+        "tandoor",
+        "paprika",
+    ]
+    assert all(target.written == 2 for target in result.results)
+    # max_age=0 revalidates on every lookup, so this counts lookups too.
+    assert len(requested) == 2
+    assert (out / "allrecipes.paprikarecipes").exists()
+    assert len(list(out.glob("*.zip"))) == 2